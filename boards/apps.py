@@ -11,3 +11,4 @@ class BoardsConfig(AppConfig):
     def ready(self):
         with contextlib.suppress(ImportError):
             import_module(f"{self.name}.signals")
+        import_module(f"{self.name}.local_cache").install()
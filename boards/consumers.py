@@ -2,9 +2,11 @@ import contextlib
 import logging
 
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.core.cache import cache
+from django.conf import settings
 from websockets.legacy.protocol import ConnectionClosedError, ConnectionClosedOK
 
+from .presence import BoardPresence
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,45 +14,44 @@ class BoardConsumer(AsyncJsonWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         self.board_slug = None
         self.board_group_name = None
+        self.session_key = None
+        self.presence = None
         super().__init__(*args, **kwargs)
 
     async def connect(self):
         self.board_slug = self.scope["url_route"]["kwargs"]["slug"]
         self.board_group_name = f"board-{self.board_slug}"
+        session = self.scope.get("session")
+        self.session_key = (session.session_key if session is not None else None) or self.channel_name
+        self.presence = BoardPresence(self.board_slug)
 
-        await cache.aget_or_set(self.board_group_name, 0)
-        await cache.aincr(self.board_group_name)
-        await cache.atouch(self.board_group_name, 7200)
+        await self.presence.heartbeat(self.session_key, self.channel_name)
+        sessions = await self.presence.get_session_count()
+        # sent before joining the group, as the new connection gets the count directly
+        await self.send_sessions("session_connected", sessions)
 
         await self.channel_layer.group_add(
             self.board_group_name,
             self.channel_name,
         )
 
-        await self.channel_layer.group_send(
-            self.board_group_name,
+        await self.accept()
+        await self.send_event(
             {
                 "type": "session_connected",
-                "sessions": await cache.aget(self.board_group_name),
-            },
+                "sessions": sessions,
+                "heartbeat_interval": settings.BOARD_PRESENCE_HEARTBEAT_INTERVAL,
+            }
         )
 
-        await self.accept()
-
     async def disconnect(self, code):
         try:
-            await cache.adecr(self.board_group_name)
-            await cache.atouch(self.board_group_name, 7200)
-            if await cache.aget(self.board_group_name) == 0:
-                await cache.adelete(self.board_group_name)
+            await self.presence.leave(self.session_key, self.channel_name)
+            sessions = await self.presence.get_session_count()
+            if sessions == 0:
+                await self.presence.clear()
             else:
-                await self.channel_layer.group_send(
-                    self.board_group_name,
-                    {
-                        "type": "session_disconnected",
-                        "sessions": await cache.aget(self.board_group_name),
-                    },
-                )
+                await self.send_sessions("session_disconnected", sessions)
         except Exception:
             logger.exception("Error disconnecting from board consumer")
         finally:
@@ -58,6 +59,23 @@ class BoardConsumer(AsyncJsonWebsocketConsumer):
                 self.board_group_name,
                 self.channel_name,
             )
+            if self.presence is not None:
+                await self.presence.close()
+
+    async def receive_json(self, content, **kwargs):
+        if content.get("type") == "heartbeat":
+            await self.presence.heartbeat(self.session_key, self.channel_name)
+            await self.send_sessions("sessions_updated", await self.presence.get_session_count())
+
+    async def send_sessions(self, event_type, sessions):
+        if await self.presence.should_broadcast(sessions):
+            await self.channel_layer.group_send(
+                self.board_group_name,
+                {
+                    "type": event_type,
+                    "sessions": sessions,
+                },
+            )
 
     async def send_event(self, event):
         with contextlib.suppress(ConnectionClosedError, ConnectionClosedOK):
@@ -69,6 +87,9 @@ class BoardConsumer(AsyncJsonWebsocketConsumer):
     async def session_disconnected(self, event):
         await self.send_event(event)
 
+    async def sessions_updated(self, event):
+        await self.send_event(event)
+
     async def board_preferences_changed(self, event):
         await self.send_event(event)
 
@@ -95,3 +116,9 @@ class BoardConsumer(AsyncJsonWebsocketConsumer):
 
     async def reaction_updated(self, event):
         await self.send_event(event)
+
+    async def export_progress(self, event):
+        await self.send_event(event)
+
+    async def board_events(self, event):
+        await self.send_event(event)
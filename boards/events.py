@@ -0,0 +1,168 @@
+import atexit
+import threading
+from contextlib import ContextDecorator
+from itertools import count
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+# events that only tell clients to refetch something: only the latest one per key needs to be sent
+COALESCED_EVENTS = {
+    "board_preferences_changed": None,
+    "board_updated": None,
+    "topic_updated": "topic_pk",
+    "post_updated": "post_pk",
+    "reaction_updated": "post_pk",
+    "export_progress": "export_pk",
+}
+
+
+class BoardEventBuffer:
+    """
+    Groups the events sent to each board group over a short window, and sends them as a single `board_events` message.
+
+    Events listed in COALESCED_EVENTS are deduplicated: a later event replaces an earlier one with the same key (e.g.
+    several `reaction_updated` for the same post), keeping its position in the batch. Any other event is always sent.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.timer = None
+        self.sequence = count()
+
+    def get_key(self, event):
+        event_type = event["type"]
+        if event_type in COALESCED_EVENTS:
+            field = COALESCED_EVENTS[event_type]
+            return event_type, event.get(field) if field else None
+        return event_type, next(self.sequence)
+
+    def add(self, group_name, event):
+        with self.lock:
+            self.groups.setdefault(group_name, {})[self.get_key(event)] = event
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            groups, self.groups = self.groups, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        for group_name, events in groups.items():
+            send_board_events(group_name, list(events.values()))
+
+
+class OutboundEventQueue:
+    """
+    Events sent during a transaction, held in memory and published together once it commits.
+
+    A queue is registered with `on_commit` for the savepoint its events were sent in, so that the events of a
+    transaction or savepoint that is rolled back are dropped along with its `on_commit` callbacks, and never sent.
+    The callbacks run in the order they were registered, so a queue only takes events until another one is started:
+    events sent after a savepoint go to a new queue, published after the savepoint's own events.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.savepoint_ids = tuple(connection.savepoint_ids)
+        self.events = []
+        self.flushed = False
+        connection.on_commit(self.flush)
+
+    def is_pending(self):
+        # the callback is discarded if the transaction is rolled back
+        return not self.flushed and any(func == self.flush for _, func, _ in self.connection.run_on_commit)
+
+    def flush(self):
+        self.flushed = True
+        events, self.events = self.events, []
+        publish_board_events(events)
+
+
+local = threading.local()
+
+
+def get_outbound_event_queue(connection):
+    """The queue of the current transaction and savepoint of `connection`, None if it is in autocommit mode."""
+    if not connection.in_atomic_block:
+        return None
+    queues = local.__dict__.setdefault("outbound_event_queues", {})
+    queue = queues.get(connection.alias)
+    if queue is None or queue.savepoint_ids != tuple(connection.savepoint_ids) or not queue.is_pending():
+        queues[connection.alias] = queue = OutboundEventQueue(connection)
+    return queue
+
+
+class NoBoardEvents(ContextDecorator):
+    """
+    Drops the board events sent in its block, e.g. by the signals of each object of a bulk operation that sends a
+    single event for all of them itself.
+    """
+
+    def __enter__(self):
+        local.no_board_events_depth = self.depth + 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        local.no_board_events_depth -= 1
+
+    @property
+    def depth(self):
+        return getattr(local, "no_board_events_depth", 0)
+
+    @property
+    def active(self):
+        return self.depth > 0
+
+
+no_board_events = NoBoardEvents()
+
+
+async def group_send_all(messages):
+    channel_layer = get_channel_layer()
+    for group_name, message in messages:
+        await channel_layer.group_send(group_name, message)
+
+
+def group_send(group_name, message):
+    async_to_sync(group_send_all)([(group_name, message)])
+
+
+def publish_board_events(events):
+    """Publish (group name, event) pairs: through the coalescing window if one is set, else in one round trip."""
+    if board_event_buffer is not None:
+        for group_name, event in events:
+            board_event_buffer.add(group_name, event)
+    elif events:
+        async_to_sync(group_send_all)(events)
+
+
+def send_board_events(group_name, events):
+    group_send(group_name, {"type": "board_events", "events": events})
+
+
+def send_board_event(group_name, event):
+    """
+    Send an event to a board group, once the current transaction (if any) commits, batched with the other events of
+    the transaction and of the coalescing window if one is set.
+    """
+    if no_board_events.active:
+        return
+    queue = get_outbound_event_queue(transaction.get_connection())
+    if queue is None:
+        publish_board_events([(group_name, event)])
+    else:
+        queue.events.append((group_name, event))
+
+
+board_event_buffer = (
+    BoardEventBuffer(settings.BOARD_EVENTS_COALESCE_WINDOW) if settings.BOARD_EVENTS_COALESCE_WINDOW > 0 else None
+)
+if board_event_buffer is not None:
+    atexit.register(board_event_buffer.flush)
@@ -0,0 +1,119 @@
+import csv
+import json
+from io import StringIO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class ExportWriter:
+    """
+    Writes rows (dicts) to a temporary file, one chunk at a time.
+
+    `close` returns the file, ready to be stored in a FileField; the temporary file is deleted once it is closed.
+    """
+
+    extension: str
+    content_type: str
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.file = TemporaryUploadedFile(f"export.{self.extension}", self.content_type, 0, "utf-8")
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.file.size = self.file.tell()
+        self.file.seek(0)
+        return self.file
+
+
+class CSVExportWriter(ExportWriter):
+    extension = "csv"
+    content_type = "text/csv"
+
+    def __init__(self, columns):
+        """`columns` maps each row key to its header."""
+        super().__init__(columns)
+        self.buffer = StringIO(newline="")
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(columns.values())
+
+    def write(self, rows):
+        self.writer.writerows([row[key] for key in self.columns] for row in rows)
+        self.file.write(self.buffer.getvalue().encode("utf-8"))
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def close(self):
+        self.write([])
+        self.buffer.close()
+        return super().close()
+
+
+class JSONLExportWriter(ExportWriter):
+    """`columns` maps each row key to its (name, type) column."""
+
+    extension = "jsonl"
+    content_type = "application/jsonl"
+
+    def write(self, rows):
+        lines = (
+            json.dumps({name: row[key] for key, (name, _) in self.columns.items()}, cls=DjangoJSONEncoder) + "\n"
+            for row in rows
+        )
+        self.file.write("".join(lines).encode("utf-8"))
+
+
+class ParquetExportWriter(ExportWriter):
+    """Every chunk of rows is written as a row group, so the file is never held in memory."""
+
+    extension = "parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(self, columns):
+        """`columns` maps each row key to its (name, type) column."""
+        super().__init__(columns)
+        self.types = {
+            "bool": pa.bool_(),
+            "int": pa.int64(),
+            "string": pa.string(),
+            "timestamp": pa.timestamp("us", tz="UTC"),
+            "uuid": pa.uuid(),
+        }
+        self.schema = pa.schema([(name, self.types[column_type]) for name, column_type in columns.values()])
+        self.writer = pq.ParquetWriter(self.file.file, self.schema)
+
+    def get_value(self, value, column_type):
+        if column_type == "uuid" and value is not None:
+            return value.bytes
+        return value
+
+    def write(self, rows):
+        if not rows:
+            return
+        self.writer.write_table(
+            pa.table(
+                {
+                    name: [self.get_value(row[key], column_type) for row in rows]
+                    for key, (name, column_type) in self.columns.items()
+                },
+                schema=self.schema,
+            )
+        )
+
+    def close(self):
+        self.writer.close()
+        return super().close()
+
+
+def get_export_writers(header, columns):
+    """Writers for every export format, keyed by the name of the Export file field they fill."""
+    return {
+        "file": CSVExportWriter(header),
+        "jsonl_file": JSONLExportWriter(columns),
+        "parquet_file": ParquetExportWriter(columns),
+    }
@@ -157,10 +157,10 @@ class BoardPreferencesForm(forms.ModelForm):
         self.helper = FormHelper()
         self.helper.form_show_labels = False
         self.helper.form_id = "board-preferences-form"
-        webp_url = (
-            self.instance.background_image.get_small_thumbnail_webp.url if self.instance.background_image else ""
-        )
-        jpeg_url = self.instance.background_image.get_small_thumbnail.url if self.instance.background_image else ""
+        background_image = self.instance.background_image
+        webp_srcset = background_image.get_srcset("small_webp") if background_image else ""
+        jpeg_srcset = background_image.get_srcset("small_jpeg") if background_image else ""
+        jpeg_url = background_image.get_small_thumbnail.url if background_image else ""
         self.helper.attrs = {
             "hx-post": reverse("boards:board-preferences", kwargs={"slug": self.initial_board.slug}),
             "hx-target": "#modal-1-body-div",
@@ -169,8 +169,9 @@ class BoardPreferencesForm(forms.ModelForm):
             "x-init": f"""$store.boardPreferences.boardType = '{self.initial["board_type"]}';
             $store.boardPreferences.bg_type = '{self.initial["background_type"]}';
             $store.boardPreferences.img_id = '{self.initial["background_image"]}';
-            $store.boardPreferences.img_srcset_webp = '{webp_url}';
-            $store.boardPreferences.img_srcset_jpeg = '{jpeg_url}';
+            $store.boardPreferences.img_srcset_webp = '{webp_srcset}';
+            $store.boardPreferences.img_srcset_jpeg = '{jpeg_srcset}';
+            $store.boardPreferences.img_src = '{jpeg_url}';
             $store.boardPreferences.bg_opacity = '{self.initial["background_opacity"]}';""",
         }
 
@@ -410,3 +411,14 @@ class PostCreateForm(forms.ModelForm):
                     else:
                         AdditionalData.objects.filter(post=post, data_type="m").delete()
         return post
+
+
+class PostModerationForm(forms.Form):
+    """An action applied to an explicit set of posts of a board at once."""
+
+    action = forms.ChoiceField(choices=[("approve", "Approve"), ("unapprove", "Unapprove"), ("delete", "Delete")])
+    posts: "forms.ModelMultipleChoiceField[Post]" = forms.ModelMultipleChoiceField(queryset=Post.objects.none())
+
+    def __init__(self, *args, board, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["posts"].queryset = Post.objects.without_tree_fields().filter(topic__board=board)
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from cacheops import getset
+from cacheops.redis import redis_client
+from cacheops.signals import cache_invalidated
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = f"{settings.CACHES['default']['KEY_PREFIX']}:cacheops:invalidated"
+
+# cacheops' own read of a cached queryset or `cached_as` result from redis
+redis_read = getset._read  # noqa: SLF001
+
+
+@dataclass
+class LocalCacheEntry:
+    data: bytes
+    conjs: dict
+    expires_at: float | None
+
+
+class LocalCache:
+    """
+    Size-bounded, in-process LRU copy of the cacheops data read from redis, with an optional TTL.
+
+    Entries remember the conjunctions (e.g. `topic_id=1`) their cacheops key depends on, so that an invalidation only
+    drops the entries it affects. Invalidations are published on a redis channel and applied by every process, which
+    is why entries are only stored while that channel is listened to.
+
+    cacheops' invalidate_all (e.g. `manage.py invalidate all`) clears every copy, but redis does not publish anything
+    when its database is flushed directly (FLUSHDB, FLUSHALL): the copies then last until their timeout, or until the
+    processes are restarted.
+    """
+
+    def __init__(self, max_size, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # bumped by every invalidation, so that data read from redis before one is not stored after it
+        self.generation = 0
+        self.listener = None
+        self.listener_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.data
+
+    def set(self, key, data, cond_dnfs, generation):
+        self.ensure_listener()
+        conjs = {
+            table: [{field: str(value) for field, value in conj.items()} for conj in disj]
+            for table, disj in cond_dnfs.items()
+        }
+        expires_at = time.monotonic() + self.timeout if self.timeout else None
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = LocalCacheEntry(data, conjs, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table=None, obj_dict=None):
+        """Drop the entries depending on `table` (all of them if None), or only on the row `obj_dict` if given."""
+
+        def is_stale(entry):
+            if table is None:
+                return True
+            if table not in entry.conjs:
+                return False
+            if obj_dict is None:
+                return True
+            return any(
+                all(obj_dict.get(field) == value for field, value in conj.items()) for conj in entry.conjs[table]
+            )
+
+        with self.lock:
+            self.generation += 1
+            stale_keys = [key for key, entry in self.entries.items() if is_stale(entry)]
+            for key in stale_keys:
+                del self.entries[key]
+            self.invalidations += len(stale_keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def publish_invalidation(self, table=None, obj_dict=None):
+        obj_dict = {field: str(value) for field, value in obj_dict.items()} if obj_dict is not None else None
+        self.invalidate(table, obj_dict)
+        redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"table": table, "obj_dict": obj_dict}))
+
+    def handle_message(self, message):
+        data = json.loads(message["data"])
+        self.invalidate(data["table"], data["obj_dict"])
+
+    def handle_listener_error(self, error, pubsub, thread):
+        # invalidations published while disconnected are lost, so nothing stored until then can be trusted
+        logger.warning("Lost the cacheops invalidation channel: %s", error)
+        self.clear()
+        time.sleep(1)
+
+    def ensure_listener(self):
+        # the listener thread does not survive a fork, so each process starts its own
+        if self.listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self.handle_message})
+            self.listener = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self.handle_listener_error
+            )
+            self.listener_pid = os.getpid()
+            self.entries.clear()
+
+    def stop_listener(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener.join()
+        self.listener = None
+        self.listener_pid = None
+
+    def stats(self):
+        """Hit, miss, eviction and invalidation counts of this process since it started."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def read(key, cond_dnfs, prefix):
+    """Replacement of cacheops' redis read that serves, and keeps, hits from the local cache."""
+    if local_cache is None:
+        return redis_read(key, cond_dnfs, prefix)
+    data = local_cache.get(key)
+    if data is not None:
+        return data
+    generation = local_cache.generation
+    data = redis_read(key, cond_dnfs, prefix)
+    if data is not None and data != b"LOCK":
+        local_cache.set(key, data, cond_dnfs, generation)
+    return data
+
+
+def cache_invalidated_receiver(sender, obj_dict, **kwargs):
+    if local_cache is not None:
+        local_cache.publish_invalidation(sender._meta.db_table if sender is not None else None, obj_dict)
+
+
+def install():
+    """Put the local cache in front of cacheops' redis reads, and keep it in sync with its invalidations."""
+    getset._read = read  # noqa: SLF001
+    cache_invalidated.connect(cache_invalidated_receiver, dispatch_uid="local_cache_invalidated")
+
+
+local_cache = (
+    LocalCache(settings.CACHEOPS_LOCAL_MAX_SIZE, settings.CACHEOPS_LOCAL_TIMEOUT)
+    if settings.CACHEOPS_LOCAL_MAX_SIZE > 0
+    else None
+)
@@ -0,0 +1,88 @@
+import re
+from collections import defaultdict
+from itertools import batched
+
+from cacheops.conf import settings as cacheops_settings
+from cacheops.redis import redis_client
+from cacheops.sharding import get_prefix
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.template.defaultfilters import filesizeformat, pluralize
+
+from boards.models import Post, Topic
+
+# every post and topic fragment has an element with an id starting with the pk of its post or topic
+FRAGMENT_ID_RE = re.compile(r'id="(post|topic)-([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})')
+
+
+class Command(BaseCommand):
+    help = "Report the number of cached template fragments per board, and the redis memory they use."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of keys read per redis round trip.")
+
+    def get_fragments(self, batch_size):
+        """The (model, pk) a cached fragment renders (None if unknown), and its memory usage, for each fragment."""
+        for keys in batched(redis_client.scan_iter(f"{get_prefix()}as:*", count=batch_size), batch_size):
+            pipeline = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.get(key)
+                pipeline.memory_usage(key)
+            for coded, memory in batched(pipeline.execute(), 2):
+                if coded is None or coded == b"LOCK":  # expired since it was scanned, or being computed
+                    continue
+                data = coded.split(b":", 1)[1] if cacheops_settings.CACHEOPS_INSIDEOUT else coded
+                value = cacheops_settings.CACHEOPS_SERIALIZER.loads(data)
+                if not isinstance(value, str):  # the result of a cached_as function, not a fragment
+                    continue
+                match = FRAGMENT_ID_RE.search(value)
+                yield (match.groups() if match else None), memory or 0
+
+    def handle(self, *args, **kwargs):
+        fragments = list(self.get_fragments(kwargs["batch_size"]))
+        sources = {source for source, _ in fragments if source is not None}
+        post_pks = [pk for model, pk in sources if model == "post"]
+        topic_pks = [pk for model, pk in sources if model == "topic"]
+        board_slugs = {
+            ("post", str(pk)): slug
+            for pk, slug in Post.objects.filter(pk__in=post_pks).values_list("pk", "topic__board__slug")
+        }
+        board_slugs.update(
+            {
+                ("topic", str(pk)): slug
+                for pk, slug in Topic.objects.filter(pk__in=topic_pks).values_list("pk", "board__slug")
+            }
+        )
+
+        counts = defaultdict(int)
+        memory = defaultdict(int)
+        for source, fragment_memory in fragments:
+            slug = board_slugs.get(source)  # None for fragments of deleted posts, or not of a post or topic
+            counts[slug] += 1
+            memory[slug] += fragment_memory
+        post_counts = dict(
+            Post.objects.filter(topic__board__slug__in=[slug for slug in counts if slug is not None])
+            .values_list("topic__board__slug")
+            .annotate(count=Count("id"))
+        )
+
+        for slug in sorted(counts, key=lambda slug: memory[slug], reverse=True):
+            if slug is None:
+                continue
+            count = counts[slug]
+            per_post = count / post_counts[slug] if post_counts.get(slug) else 0
+            self.stdout.write(
+                f"{slug}: {count} fragment{pluralize(count)} ({per_post:.1f} per post), "
+                f"{filesizeformat(memory[slug])}."
+            )
+        if counts[None]:
+            self.stdout.write(
+                f"{counts[None]} other fragment{pluralize(counts[None])}, {filesizeformat(memory[None])}."
+            )
+        total_count = len(fragments)
+        total_memory = sum(memory.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total_count} cached fragment{pluralize(total_count)}, {filesizeformat(total_memory)} in total."
+            )
+        )
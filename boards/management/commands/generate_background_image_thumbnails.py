@@ -3,17 +3,28 @@ from django.template.defaultfilters import pluralize
 from huey.contrib.djhuey import HUEY
 
 from boards.models import BgImage
+from boards.renditions import ORIGINAL
 from boards.tasks import create_thumbnails
 
 
 class Command(BaseCommand):
     help = "Generate thumbnails for all background images in the database"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only generate thumbnails for the images without a complete rendition manifest",
+        )
+
     def handle(self, *args, **kwargs):
         HUEY.immediate = True
         self.stdout.write(self.style.SUCCESS("Generating thumbnails..."))
+        images = BgImage.objects.all()
+        if kwargs["missing"]:
+            images = images.exclude(renditions__has_key=ORIGINAL)
         count = 0
-        for image in BgImage.objects.all():
+        for image in images:
             self.stdout.write(f"Generating thumbnail for {image}")
             create_thumbnails(image)()
             count += 1
@@ -1,35 +1,27 @@
 from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
 from django.template.defaultfilters import pluralize
 
-from boards.models import Board, Image, Post
+from boards.models import Post, PostImage
 
 
 class Command(BaseCommand):
     help = "Match post to image and delete orphan images."
 
-    def delete_orphan_image(self, img, count_orphans):
-        img.delete()
-        return count_orphans + 1
-
     def handle(self, *args, **kwargs):
-        matched_count = 0
+        total_image_count = PostImage.objects.count()
+
         orphan_count = 0
-        images = Image.objects.filter(image_type="p").order_by("-board__created_at")
-        total_image_count = images.count()
-        boards = Board.objects.filter(id__in=images.values_list("board_id", flat=True).distinct())
-        for board in boards:
-            posts = Post.objects.filter(topic__board=board).order_by("-created_at")
-            imgs = images.filter(board=board)
-            for img in imgs:
-                if img.post is None:
-                    if matched_posts := [post for post in posts if img.image.url in post.content]:
-                        img.post = matched_posts[0]
-                        img.save()
-                        matched_count += 1
-                    else:
-                        orphan_count = self.delete_orphan_image(img, orphan_count)
-                elif img.image.url not in img.post.content:
-                    orphan_count = self.delete_orphan_image(img, orphan_count)
+        for img in PostImage.objects.filter(referencing_posts=None):
+            img.delete()
+            orphan_count += 1
+
+        latest_referencing_post = Post.referenced_images.through.objects.filter(image_id=OuterRef("pk")).order_by(
+            "-post__created_at"
+        )
+        matched_count = PostImage.objects.filter(post=None).invalidated_update(
+            post=Subquery(latest_referencing_post.values("post_id")[:1])
+        )
 
         self.stdout.write(self.style.SUCCESS(f"{total_image_count} total post image{pluralize(total_image_count)}."))
         self.stdout.write(
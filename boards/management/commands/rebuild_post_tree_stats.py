@@ -0,0 +1,28 @@
+from cacheops import invalidate_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import pluralize
+
+from boards.models import Post
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized descendant counts of all posts from their trees."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of posts updated per query.")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            counts = Post.get_descendant_counts(Post.objects.all())
+            posts = [
+                Post(pk=pk, descendant_count=counts[pk])
+                for pk, descendant_count in Post.objects.without_tree_fields().values_list("pk", "descendant_count")
+                if descendant_count != counts[pk]
+            ]
+            Post.objects.bulk_update(posts, ["descendant_count"], batch_size=kwargs["batch_size"])
+        if posts:
+            invalidate_model(Post)
+
+        count = len(posts)
+        self.stdout.write(self.style.SUCCESS(f"Fixed the descendant count of {count} post{pluralize(count)}."))
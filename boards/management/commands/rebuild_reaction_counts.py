@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import pluralize
+
+from boards.models import Reaction, ReactionCount
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized reaction counts of all posts from their reactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of counts created per query.")
+
+    def handle(self, *args, **kwargs):
+        rows = Reaction.objects.values("post_id", "reaction_type").annotate(**ReactionCount.get_aggregates())
+
+        with transaction.atomic():
+            ReactionCount.objects.all().delete()
+            counts = ReactionCount.objects.bulk_create(
+                (ReactionCount(**row) for row in rows.iterator()), batch_size=kwargs["batch_size"]
+            )
+
+        count = len(counts)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} reaction count{pluralize(count)}."))
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:11
+
+import auto_prefetch
+import django.contrib.postgres.functions
+import django.db.models.deletion
+import django.db.models.manager
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_reaction_counts(apps, schema_editor):
+    Reaction = apps.get_model("boards", "Reaction")
+    ReactionCount = apps.get_model("boards", "ReactionCount")
+    rows = Reaction.objects.values("post_id", "reaction_type").annotate(
+        count=Count("id"),
+        positive_count=Count("id", filter=Q(reaction_score__gt=0)),
+        negative_count=Count("id", filter=Q(reaction_score__lt=0)),
+        score_sum=Coalesce(Sum("reaction_score"), 0),
+    )
+    ReactionCount.objects.bulk_create((ReactionCount(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0079_alter_additionaldata_data_type_alter_board_locked_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReactionCount",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        db_default=django.contrib.postgres.functions.RandomUUID(),
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "reaction_type",
+                    models.CharField(
+                        choices=[("n", "None"), ("l", "Like"), ("v", "Vote"), ("s", "Star")], max_length=1
+                    ),
+                ),
+                ("count", models.IntegerField(db_default=0)),
+                ("positive_count", models.IntegerField(db_default=0)),
+                ("negative_count", models.IntegerField(db_default=0)),
+                ("score_sum", models.IntegerField(db_default=0)),
+                (
+                    "post",
+                    auto_prefetch.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="reaction_counts", to="boards.post"
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "base_manager_name": "prefetch_manager",
+                "constraints": [
+                    models.UniqueConstraint(fields=("post", "reaction_type"), name="unique_post_reaction_count")
+                ],
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunPython(populate_reaction_counts, reverse_code=migrations.RunPython.noop),
+    ]
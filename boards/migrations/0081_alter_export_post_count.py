@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0080_reactioncount"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="export",
+            name="post_count",
+            field=models.PositiveIntegerField(db_default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:24
+
+import boards.utils
+from django.db import migrations, models
+
+
+def set_existing_exports_done(apps, schema_editor):
+    Export = apps.get_model("boards", "Export")
+    Export.objects.update(status="d", progress=100)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0081_alter_export_post_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="export",
+            name="progress",
+            field=models.PositiveSmallIntegerField(db_default=0, help_text="Percentage of posts exported"),
+        ),
+        migrations.AddField(
+            model_name="export",
+            name="status",
+            field=models.CharField(
+                choices=[("p", "Pending"), ("r", "Running"), ("d", "Done"), ("f", "Failed")],
+                db_default="p",
+                max_length=1,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="export",
+            name="file",
+            field=models.FileField(blank=True, upload_to=boards.utils.get_export_upload_path),
+        ),
+        migrations.RunPython(set_existing_exports_done, reverse_code=migrations.RunPython.noop),
+    ]
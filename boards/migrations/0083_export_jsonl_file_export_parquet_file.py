@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 22:37
+
+import boards.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0082_export_status_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="export",
+            name="jsonl_file",
+            field=models.FileField(blank=True, upload_to=boards.utils.get_export_upload_path),
+        ),
+        migrations.AddField(
+            model_name="export",
+            name="parquet_file",
+            field=models.FileField(blank=True, upload_to=boards.utils.get_export_upload_path),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+def populate_descendant_counts(apps, schema_editor):
+    Post = apps.get_model("boards", "Post")
+    parents = dict(Post.objects.values_list("pk", "parent_id").iterator())
+    counts = dict.fromkeys(parents, 0)
+    for parent_id in parents.values():
+        while parent_id is not None:
+            counts[parent_id] += 1
+            parent_id = parents[parent_id]
+    Post.objects.bulk_update(
+        [Post(pk=pk, descendant_count=count) for pk, count in counts.items() if count > 0],
+        ["descendant_count"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0083_export_jsonl_file_export_parquet_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="descendant_count",
+            field=models.PositiveIntegerField(db_default=0, editable=False),
+        ),
+        migrations.RunPython(populate_descendant_counts, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:53
+
+import re
+
+from django.db import migrations, models
+
+
+def populate_referenced_images(apps, schema_editor):
+    Image = apps.get_model("boards", "Image")
+    Post = apps.get_model("boards", "Post")
+    posts = Post.objects.filter(content__contains="images/p/").values_list("pk", "topic__board_id", "content")
+    post_image_names = {
+        (pk, board_id): set(re.findall(r"images/p/[^\s'\"()<>]+", content))
+        for pk, board_id, content in posts.iterator()
+    }
+    image_ids = {
+        (board_id, name): pk
+        for pk, board_id, name in Image.objects.filter(
+            image_type="p", image__in=set().union(*post_image_names.values())
+        ).values_list("pk", "board_id", "image")
+    }
+    Post.referenced_images.through.objects.bulk_create(
+        [
+            Post.referenced_images.through(post_id=pk, image_id=image_ids[board_id, name])
+            for (pk, board_id), names in post_image_names.items()
+            for name in names
+            if (board_id, name) in image_ids
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0084_post_descendant_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="referenced_images",
+            field=models.ManyToManyField(
+                blank=True,
+                editable=False,
+                help_text="Images used in the content",
+                related_name="referencing_posts",
+                to="boards.image",
+            ),
+        ),
+        migrations.RunPython(populate_referenced_images, reverse_code=migrations.RunPython.noop),
+    ]
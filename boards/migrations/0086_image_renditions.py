@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0085_post_referenced_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="renditions",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Resized copies of the image by key, e.g. small_webp@2x",
+            ),
+        ),
+    ]
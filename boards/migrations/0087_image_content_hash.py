@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0086_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="SHA-256 of the uploaded file, shared with the images of the same type and content",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:21
+
+import auto_prefetch
+import django.db.models.deletion
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boards", "0087_image_content_hash"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="image",
+            name="post",
+            field=auto_prefetch.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="images",
+                to="boards.post",
+            ),
+        ),
+    ]
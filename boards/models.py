@@ -1,31 +1,40 @@
+import contextlib
 import uuid
 from hashlib import blake2b
+from itertools import batched
 
 import auto_prefetch
 from cacheops import cached_as
 from django.conf import settings
 from django.contrib.postgres.functions import RandomUUID
 from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
-from django.db import IntegrityError, models
-from django.db.models.functions import Now, Upper
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.expressions import DatabaseDefault
+from django.db.models.functions import Coalesce, Now, Upper
 from django.template.defaultfilters import date
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.html import format_html
-from sorl.thumbnail import get_thumbnail
+from django_cleanup import cleanup
 from tree_queries.models import TreeNode
 from tree_queries.query import TreeQuerySet
 
 from jotlet.mixins.refresh_from_db_invalidates_cached_properties import InvalidateCachedPropertiesMixin
+from jotlet.mixins.track_field_changes import TrackFieldChangesMixin
 
-from .tasks import create_thumbnails, post_image_cleanup
+from .exporters import get_export_writers
+from .renditions import FORMAT_MIME_TYPES, ORIGINAL, Rendition, RenditionSource, get_rendition_key
+from .tasks import create_thumbnails, delete_image_files, post_image_cleanup
 from .utils import (
-    generate_csv,
+    channel_group_send,
+    get_content_hash,
     get_export_upload_path,
     get_image_upload_path,
-    get_is_moderator,
+    get_post_image_names,
     get_random_string,
+    get_reaction_score,
     process_image,
 )
 
@@ -51,6 +60,13 @@ IMAGE_TYPE = (
     ("p", "Post"),
 )
 
+EXPORT_STATUS = (
+    ("p", "Pending"),
+    ("r", "Running"),
+    ("d", "Done"),
+    ("f", "Failed"),
+)
+
 IMAGE_FORMATS = ["png", "jpeg", "bmp", "gif"]
 
 
@@ -166,12 +182,10 @@ class Board(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
     def is_additional_data_allowed(self):
         return self.preferences.enable_chemdoodle  # currently only have chemdoodle additional data
 
-    def is_export_allowed(self, request):
-        @cached_as(self, extra=request.session.session_key, timeout=60 * 60 * 24)
-        def _is_export_allowed(self, request):
-            return request.user.is_staff or request.user == self.owner
-
-        return _is_export_allowed(self, request)
+    def get_identity_hash(self, user=None, session_key=None):
+        """Identity of a poster on this board, shown instead of their username or session."""
+        string = user.username if user is not None else session_key
+        return blake2b(f"{string}{self.id}".encode(), digest_size=32).hexdigest()
 
 
 class BoardPreferences(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
@@ -254,11 +268,8 @@ class Topic(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
     def get_post_count(self):
         @cached_as(self, timeout=60 * 60 * 24)
         def _get_post_count():
-            count = 0
-            for post in self.get_posts:
-                count += 1
-                count += post.descendants().count()
-            return count
+            posts = self.get_posts.without_tree_fields()
+            return posts.aggregate(count=Count("pk") + Coalesce(Sum("descendant_count"), 0))["count"]
 
         return _get_post_count()
 
@@ -284,22 +295,13 @@ class Topic(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
     def is_posting_allowed(self):
         return not self.is_locked and self.board.is_posting_allowed
 
-    def post_create_allowed(self, request):
-        @cached_as(self, extra=request.session.session_key, timeout=60 * 60 * 24)
-        def _post_create_allowed(self, request):
-            is_locked = self.is_locked
-            return ((self.board.is_posting_allowed or request.user == self.board.owner) and not is_locked) or (
-                request.user.is_staff or get_is_moderator(request.user, self.board)
-            )
-
-        return _post_create_allowed(self, request)
-
     def get_absolute_url(self):
         return reverse("boards:board", kwargs={"slug": self.board.slug})
 
 
-class Post(InvalidateCachedPropertiesMixin, auto_prefetch.Model, TreeNode):
+class Post(TrackFieldChangesMixin, InvalidateCachedPropertiesMixin, auto_prefetch.Model, TreeNode):
     objects = TreeQuerySet.as_manager(with_tree_fields=True)
+    tracked_fields = ("content",)
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_default=RandomUUID(), editable=False)
     content = models.TextField(max_length=1000)
     topic = auto_prefetch.ForeignKey(Topic, on_delete=models.CASCADE, null=True, related_name="posts")
@@ -310,6 +312,14 @@ class Post(InvalidateCachedPropertiesMixin, auto_prefetch.Model, TreeNode):
     identity_hash = models.CharField(max_length=64, blank=True)
     approved = models.BooleanField(db_default=True)
     allow_replies = models.BooleanField(db_default=True)  # TODO: use to override single post reply permission
+    descendant_count = models.PositiveIntegerField(db_default=0, editable=False)
+    referenced_images = models.ManyToManyField(
+        "boards.Image",
+        blank=True,
+        editable=False,
+        related_name="referencing_posts",
+        help_text="Images used in the content",
+    )
     created_at = models.DateTimeField(db_default=Now(), editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -324,55 +334,18 @@ class Post(InvalidateCachedPropertiesMixin, auto_prefetch.Model, TreeNode):
         return f"{self.content}"
 
     def save(self, *args, **kwargs):
-        prev_post = None
-        if not self._state.adding:
-            prev_post = Post.objects.get(pk=self.pk)
-        else:
-            string = self.user.username if self.user is not None else self.session_key
-            salt = str(self.topic.board.id)
-            self.identity_hash = blake2b(f"{string}{salt}".encode(), digest_size=32).hexdigest()
+        if self._state.adding:
+            self.identity_hash = self.topic.board.get_identity_hash(self.user, self.session_key)
+        image_names = get_post_image_names(self.content)
+        images_changed = "content" in self.get_changed_fields() and image_names != get_post_image_names(
+            self.get_original_value("content")
+        )
         super().save(*args, **kwargs)
 
-        if self.topic.board.preferences.allow_image_uploads:
-            cleanup_task = prev_post is None or prev_post.content != self.content
-            if cleanup_task:
-                post_image_cleanup(self, PostImage.objects.filter(board=self.topic.board))()
-
-    def update_allowed(self, request):
-        @cached_as(self, extra=request.session.session_key, timeout=60 * 60 * 24)
-        def _update_allowed(self, request):
-            is_locked = (
-                self.topic.locked or self.topic.board.locked or not self.topic.board.preferences.allow_post_editing
-            )
-            return (
-                (
-                    request.session.session_key == self.session_key
-                    or request.user == self.user
-                    or request.user.has_perm("boards.change_post")
-                )
-                and not is_locked
-            ) or get_is_moderator(request.user, self.topic.board)
-
-        return _update_allowed(self, request)
-
-    def reply_create_allowed(self, request):
-        @cached_as(self, extra=request.session.session_key, timeout=60 * 60 * 24)
-        def _reply_create_allowed(self, request):
-            return self.topic.board.preferences.board_type == "r" and (
-                (self.approved and self.topic.board.preferences.allow_guest_replies)
-                or get_is_moderator(request.user, self.topic.board)
-            )
-
-        return _reply_create_allowed(self, request)
-
-    def get_is_owner(self, request):
-        @cached_as(self, extra=request.session.session_key, timeout=60 * 60 * 24)
-        def _get_is_owner():
-            return (self.session_key == request.session.session_key and self.session_key is not None) or (
-                request.user.is_authenticated and self.user == request.user
-            )
-
-        return _get_is_owner()
+        if images_changed:
+            self.referenced_images.set(PostImage.objects.filter(board=self.topic.board_id, image__in=image_names))
+            if self.topic.board.preferences.allow_image_uploads:
+                post_image_cleanup(self)()
 
     def get_reactions(self, reaction_type=None):
         @cached_as(self, extra=reaction_type, timeout=60 * 60 * 24)
@@ -402,43 +375,48 @@ class Post(InvalidateCachedPropertiesMixin, auto_prefetch.Model, TreeNode):
 
         return _get_additional_data(additional_data_type)
 
-    @cached_property
+    @property
     def get_descendant_count(self):
-        @cached_as(self, timeout=60 * 60 * 24)
-        def _get_desdendant_count():
-            return self.descendants().count()
-
-        return _get_desdendant_count()
+        return self.descendant_count
+
+    def update_ancestors_descendant_count(self, delta):
+        """
+        Add `delta` to the descendant count of every ancestor of the post, e.g. when a reply is created or deleted.
+
+        The parents are followed one by one (threads are shallow), as tree queries compute the whole table's tree.
+        """
+        posts = Post.objects.without_tree_fields()
+        ancestor_ids = []
+        parent_id = self.parent_id
+        while parent_id is not None:
+            ancestor_ids.append(parent_id)
+            parent_id = posts.filter(pk=parent_id).values_list("parent_id", flat=True).first()
+        if ancestor_ids:
+            Post.objects.filter(pk__in=ancestor_ids).update(descendant_count=F("descendant_count") + delta)
+
+    @classmethod
+    def get_descendant_counts(cls, queryset):
+        """The number of descendants of every post of the queryset (which must include whole trees), by post pk."""
+        parents = dict(queryset.without_tree_fields().values_list("pk", "parent_id").iterator())
+        counts = dict.fromkeys(parents, 0)
+        for parent_id in parents.values():
+            ancestor_id = parent_id
+            while ancestor_id is not None:
+                counts[ancestor_id] += 1
+                ancestor_id = parents[ancestor_id]
+        return counts
 
     @cached_property
     def get_reaction_type(self):
         return self.topic.board.preferences.reaction_type
 
-    def get_reaction_score(self, reactions=None, reaction_type=None):
+    def get_reaction_score(self, reaction_type=None):
         if reaction_type is None:
             reaction_type = self.get_reaction_type
-        if reactions is None:
-            reactions = self.get_reactions(reaction_type)
-
-        @cached_as(reactions, extra=reaction_type, timeout=60 * 60 * 24)
-        def _get_reaction_score(reactions, reaction_type):
-            count = reactions.count()
-            match reaction_type:
-                case "l":
-                    return count
-                case "v":
-                    positive_count = sum(reaction.reaction_score == 1 for reaction in reactions)
-                    negative_count = sum(reaction.reaction_score == -1 for reaction in reactions)
-                    return positive_count, negative_count
-                case "s":
-                    if count != 0:
-                        sumvar = sum(reaction.reaction_score for reaction in reactions)
-                        return f"{(sumvar / count):.2g}"
-                    return ""
-                case _:
-                    return 0
-
-        return _get_reaction_score(reactions, reaction_type)
+        counts = (
+            self.reaction_counts.filter(reaction_type=reaction_type).values(*ReactionCount.COUNT_FIELDS).first() or {}
+        )
+        return get_reaction_score(reaction_type, **counts)
 
     def get_has_reacted(self, request, post_reactions=None):
         if post_reactions is None:
@@ -489,6 +467,63 @@ class Reaction(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
         ]
 
 
+class ReactionCount(auto_prefetch.Model):
+    """Reaction aggregates of a post, maintained on write so rendering never has to scan the reactions."""
+
+    COUNT_FIELDS = ("count", "positive_count", "negative_count", "score_sum")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_default=RandomUUID(), editable=False)
+    post = auto_prefetch.ForeignKey(Post, on_delete=models.CASCADE, related_name="reaction_counts")
+    reaction_type = models.CharField(max_length=1, choices=REACTION_TYPE)
+    count = models.IntegerField(db_default=0)
+    positive_count = models.IntegerField(db_default=0)
+    negative_count = models.IntegerField(db_default=0)
+    score_sum = models.IntegerField(db_default=0)
+
+    class Meta(auto_prefetch.Model.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["post", "reaction_type"], name="unique_post_reaction_count"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} ({self.reaction_type}): {self.count}"
+
+    @staticmethod
+    def get_aggregates():
+        """Aggregates computing the counts from a reaction queryset."""
+        return {
+            "count": Count("id"),
+            "positive_count": Count("id", filter=Q(reaction_score__gt=0)),
+            "negative_count": Count("id", filter=Q(reaction_score__lt=0)),
+            "score_sum": Coalesce(Sum("reaction_score"), 0),
+        }
+
+    @staticmethod
+    def get_score_counts(score):
+        if score is None:
+            return dict.fromkeys(ReactionCount.COUNT_FIELDS, 0)
+        return {
+            "count": 1,
+            "positive_count": int(score > 0),
+            "negative_count": int(score < 0),
+            "score_sum": score,
+        }
+
+    @classmethod
+    def add(cls, post, reaction_type, **deltas):
+        """Atomically add the given deltas to the counts of a post."""
+        if updates := {field: F(field) + delta for field, delta in deltas.items() if delta != 0}:
+            counts, _ = cls.objects.get_or_create(post=post, reaction_type=reaction_type)
+            cls.objects.filter(pk=counts.pk).update(**updates)
+
+    @classmethod
+    def record(cls, post, reaction_type, old_score=None, new_score=None):
+        """Record a reaction being created (no old score), changed, or deleted (no new score)."""
+        old_counts = cls.get_score_counts(old_score)
+        new_counts = cls.get_score_counts(new_score)
+        cls.add(post, reaction_type, **{field: new_counts[field] - old_counts[field] for field in cls.COUNT_FIELDS})
+
+
 ADDITIONAL_DATA_TYPE = (
     ("c", "chemdoodle"),
     ("f", "file"),
@@ -510,17 +545,31 @@ class AdditionalData(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
         ]
 
 
-class Image(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
+@cleanup.ignore  # files shared by several images are deleted by delete_image_files once no longer used
+class Image(TrackFieldChangesMixin, InvalidateCachedPropertiesMixin, auto_prefetch.Model):
+    tracked_fields = ("image",)
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_default=RandomUUID(), editable=False)
     title = models.CharField(max_length=50, db_index=True)
     attribution = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(db_default=Now(), editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to=get_image_upload_path)
+    renditions = models.JSONField(
+        default=dict, blank=True, editable=False, help_text="Resized copies of the image by key, e.g. small_webp@2x"
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="SHA-256 of the uploaded file, shared with the images of the same type and content",
+    )
 
     image_type = models.CharField(max_length=1, choices=IMAGE_TYPE, db_default="b", help_text="Image type")
     board = auto_prefetch.ForeignKey(Board, on_delete=models.CASCADE, null=True, blank=True, related_name="images")
-    post = auto_prefetch.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name="images")
+    # kept when the post is deleted, as other posts may still reference it; the post_image_cleanup command
+    # deletes the images no post references
+    post = auto_prefetch.ForeignKey(Post, on_delete=models.SET_NULL, null=True, blank=True, related_name="images")
 
     class Meta(auto_prefetch.Model.Meta):
         indexes = [
@@ -533,25 +582,62 @@ class Image(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
 
     def save(self, *args, **kwargs):
         created = self._state.adding
-        if created:
-            self.image = process_image(self.image, self.image_type)
+        if isinstance(self.image_type, DatabaseDefault):
+            # e.g. a background image added in the admin, whose type decides how it is processed below
+            self.image_type = "b"
+        image_changed = "image" in self.get_changed_fields()
+        old_name, old_renditions = str(self.get_original_value("image", "")), self.renditions
+        shared_image = None
+        if image_changed:
+            if not (created and self.content_hash):
+                self.content_hash = get_content_hash(self.image)
+            shared_image = self.get_shared_image()
+            if shared_image is not None:
+                # the same content was uploaded before: its processed file and renditions are used as they are
+                self.image, self.renditions = shared_image.image.name, shared_image.renditions
+            else:
+                self.renditions = {}
+                # background images are processed along with their renditions, outside of the request
+                if self.image_type != "b":
+                    self.image = process_image(self.image, self.image_type)
         super().save(*args, **kwargs)
 
-        if created and self.image_type == "b":
+        if image_changed and not created:
+            transaction.on_commit(lambda: delete_image_files(old_name, old_renditions)())
+        if image_changed and shared_image is None and self.image_type == "b":
             create_thumbnails(self)()
 
+    def get_shared_image(self):
+        """An image of the same type uploaded with the same content, whose file and renditions this one can share."""
+        if not self.content_hash:
+            return None
+        return (
+            Image.objects.filter(image_type=self.image_type, content_hash=self.content_hash)
+            .exclude(pk=self.pk)
+            .exclude(image="")
+            .first()
+        )
+
     @cached_property
     def get_board_usage_count(self):
         return BoardPreferences.objects.filter(background_type="i", background_image=self).count()
 
     get_board_usage_count.short_description = "Board Usage Count"
 
+    @cached_property
+    def get_original(self):
+        return self.get_rendition(ORIGINAL)
+
     @cached_property
     def get_image_dimensions(self):
-        return f"{self.image.width}x{self.image.height}"
+        return f"{self.get_original.width}x{self.get_original.height}"
 
     @cached_property
     def get_image_file_exists(self):
+        # the manifest is only written once the file has been processed
+        if ORIGINAL in self.renditions:
+            return True
+
         @cached_as(self, timeout=60 * 60 * 24)
         def _get_image_file_exists():
             return self.image.storage.exists(self.image.name)
@@ -560,55 +646,64 @@ class Image(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
 
     @cached_property
     def get_half_image_dimensions(self):
-        return f"{self.image.width // 2}x{self.image.height // 2}"
+        return f"{self.get_original.width // 2}x{self.get_original.height // 2}"
 
     @cached_property
     def get_small_thumbnail_dimensions(self):
         return f"{settings.SMALL_THUMBNAIL_WIDTH}x{settings.SMALL_THUMBNAIL_HEIGHT}"
 
+    def get_rendition(self, key):
+        """
+        The rendition `key` of the image (see boards.renditions), or the image itself if it has none, e.g. until the
+        background task creating them has run. Renditions are never created while rendering.
+        """
+        rendition = self.renditions.get(key)
+        if rendition is None:
+            return self.image
+        return Rendition(**rendition, storage=self.image.storage)
+
+    def get_rendition_set(self, key):
+        """
+        The renditions `key` at each resolution, e.g. [(1, small_webp), (2, small_webp@2x)], to build a srcset or an
+        image-set from the manifest alone.
+        """
+        rendition_set = [(1, self.get_rendition(key))]
+        for resolution in settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS:
+            rendition = self.renditions.get(f"{key}@{resolution}x")
+            if rendition is not None:
+                rendition_set.append((int(resolution), Rendition(**rendition, storage=self.image.storage)))
+        return rendition_set
+
+    def get_srcset(self, key):
+        return ", ".join(f"{rendition.url} {resolution}x" for resolution, rendition in self.get_rendition_set(key))
+
+    def get_sources(self, size_name):
+        """The renditions of `size_name` (e.g. `large`) in each format it was rendered in, best compressed first."""
+        return [
+            RenditionSource(FORMAT_MIME_TYPES[output_format], self.get_rendition_set(key))
+            for output_format in FORMAT_MIME_TYPES
+            if (key := get_rendition_key(size_name, output_format)) in self.renditions
+        ]
+
     @cached_property
     def get_webp(self):
-        @cached_as(self)
-        def _get_webp():
-            return get_thumbnail(self.image, self.get_image_dimensions, quality=70, format="WEBP")
-
-        return _get_webp()
+        return self.get_rendition("full_webp")
 
     @cached_property
     def get_large_thumbnail(self):
-        @cached_as(self)
-        def _get_large_thumbnail():
-            return get_thumbnail(self.image, self.get_half_image_dimensions, quality=70, format="JPEG")
-
-        return _get_large_thumbnail()
+        return self.get_rendition("large_jpeg")
 
     @cached_property
     def get_large_thumbnail_webp(self):
-        @cached_as(self)
-        def _get_large_thumbnail_webp():
-            return get_thumbnail(self.image, self.get_half_image_dimensions, quality=70, format="WEBP")
-
-        return _get_large_thumbnail_webp()
+        return self.get_rendition("large_webp")
 
     @cached_property
     def get_small_thumbnail(self):
-        @cached_as(self)
-        def _get_small_thumbnail():
-            return get_thumbnail(
-                self.image, self.get_small_thumbnail_dimensions, crop="center", quality=80, format="JPEG"
-            )
-
-        return _get_small_thumbnail()
+        return self.get_rendition("small_jpeg")
 
     @cached_property
     def get_small_thumbnail_webp(self):
-        @cached_as(self)
-        def _get_small_thumbnail_webp():
-            return get_thumbnail(
-                self.image, self.get_small_thumbnail_dimensions, crop="center", quality=80, format="WEBP"
-            )
-
-        return _get_small_thumbnail_webp()
+        return self.get_rendition("small_webp")
 
     @cached_property
     def image_tag(self):
@@ -638,6 +733,7 @@ class PostImageManager(auto_prefetch.Manager):
         return super().create(*args, **kwargs)
 
 
+@cleanup.ignore
 class BgImage(Image):
     objects = BackgroundImageManager()
 
@@ -646,6 +742,7 @@ class BgImage(Image):
         proxy = True
 
 
+@cleanup.ignore
 class PostImage(Image):
     objects = PostImageManager()
 
@@ -657,12 +754,17 @@ class PostImage(Image):
 class Export(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_default=RandomUUID(), editable=False)
     board = auto_prefetch.ForeignKey(Board, on_delete=models.CASCADE, related_name="exports", null=False)
-    file = models.FileField(upload_to=get_export_upload_path, null=False)
-    post_count = models.PositiveSmallIntegerField(db_default=0, null=False)
+    file = models.FileField(upload_to=get_export_upload_path, null=False, blank=True)
+    jsonl_file = models.FileField(upload_to=get_export_upload_path, blank=True)
+    parquet_file = models.FileField(upload_to=get_export_upload_path, blank=True)
+    post_count = models.PositiveIntegerField(db_default=0, null=False)
+    status = models.CharField(max_length=1, choices=EXPORT_STATUS, db_default="p")
+    progress = models.PositiveSmallIntegerField(db_default=0, help_text="Percentage of posts exported")
     created_at = models.DateTimeField(db_default=Now(), editable=False)
 
     MAX_AGE = 7  # days
     MAX_COUNT = 5
+    CHUNK_SIZE = 2000  # posts fetched (and written) at a time
     HEADER = {
         "id": "post id",
         "content": "post content",
@@ -674,6 +776,26 @@ class Export(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
         "created_at": "post created at",
         "updated_at": "post updated at",
     }
+    COLUMNS = {  # typed columns of the JSONL and Parquet exports, keyed by row key
+        "id": ("id", "uuid"),
+        "content": ("content", "string"),
+        "parent": ("parent_id", "uuid"),
+        "root": ("root_id", "uuid"),
+        "tree_depth": ("depth", "int"),
+        "topic": ("topic_id", "uuid"),
+        "topic__subject": ("topic_subject", "string"),
+        "topic__created_at": ("topic_created_at", "timestamp"),
+        "identity_hash": ("identity_hash", "string"),
+        "approved": ("approved", "bool"),
+        "created_at": ("created_at", "timestamp"),
+        "updated_at": ("updated_at", "timestamp"),
+        "reaction_type": ("reaction_type", "string"),
+        "reaction_count": ("reaction_count", "int"),
+        "reaction_positive_count": ("reaction_positive_count", "int"),
+        "reaction_negative_count": ("reaction_negative_count", "int"),
+        "reaction_score_sum": ("reaction_score_sum", "int"),
+    }
+    FORMATS = {"csv": "file", "jsonl": "jsonl_file", "parquet": "parquet_file"}  # format -> file field
 
     class Meta(auto_prefetch.Model.Meta):
         indexes = [
@@ -685,24 +807,117 @@ class Export(InvalidateCachedPropertiesMixin, auto_prefetch.Model):
         return f"{self.file.name}"
 
     def save(self, *args, **kwargs):
-        if self._state.adding:
-            self.generate_and_set_file()
-            # only want to save the file when it is first created
-            super().save(*args, **kwargs)
+        adding = self._state.adding
+        super().save(*args, **kwargs)
 
+        if adding:
             while self.board.exports.count() > self.MAX_COUNT:
                 self.board.exports.last().delete()
 
-    def generate_and_set_file(self):
-        header, posts = self.get_export_data()
-        self.file = generate_csv(header, posts)
-        self.post_count = len(posts)
+    @property
+    def is_done(self):
+        return self.status == "d"
+
+    @property
+    def available_formats(self):
+        return [export_format for export_format, field in self.FORMATS.items() if getattr(self, field)]
+
+    def get_file(self, export_format="csv"):
+        return getattr(self, self.FORMATS[export_format])
+
+    def set_status(self, status, progress=None):
+        self.status = status
+        if progress is not None:
+            self.progress = progress
+        self.save(update_fields=["status", "progress"])
+        self.send_progress_message()
+
+    def send_progress_message(self):
+        channel_group_send(
+            f"board-{self.board.slug}",
+            {
+                "type": "export_progress",
+                "export_pk": str(self.pk),
+                "status": self.status,
+                "progress": self.progress,
+            },
+        )
 
-    def get_export_data(self):
+    def generate(self):
+        """Generate and store the export files, reporting progress as posts are written. Run by generate_export."""
+        self.set_status("r", progress=0)
+        try:
+            files = self.generate_files()
+            with contextlib.ExitStack() as stack:
+                for field, export_file in files.items():
+                    # the generated files are temporary, they are deleted on close once stored
+                    setattr(self, field, stack.enter_context(export_file))
+                self.status = "d"
+                self.progress = 100
+                self.save(update_fields=[*files, "post_count", "status", "progress"])
+            for field in files:
+                setattr(self, field, getattr(self, field).name)  # later reads go through the storage
+        except Exception:
+            self.set_status("f")
+            raise
+        self.send_progress_message()
+
+    def generate_files(self):
+        """Write every export format in a single pass over the posts, returning the files keyed by field."""
+        writers = get_export_writers(self.HEADER, self.COLUMNS)
+        total_count = Post.objects.filter(topic__board=self.board).count()
+        self.post_count = 0
+
+        for rows in batched(self.get_export_rows(), self.CHUNK_SIZE):
+            self.add_reaction_counts(rows)
+            for writer in writers.values():
+                writer.write(rows)
+            self.post_count += len(rows)
+            if len(rows) == self.CHUNK_SIZE:
+                self.set_status("r", progress=min(99, self.post_count * 100 // total_count))
+
+        return {field: writer.close() for field, writer in writers.items()}
+
+    def get_export_rows(self):
         # As TreeNode cannot order by related fields, we need to sort each topic individually and concatenate them
-        topics = Topic.objects.filter(board=self.board).prefetch_related("posts", "posts__children")
-        posts = []
-
-        for topic in topics:
-            posts.extend(iter(topic.posts.values_list(*self.HEADER.keys())))
-        return self.HEADER, posts
+        topics = list(Topic.objects.filter(board=self.board).values_list("pk", flat=True))
+        for topic_pk in topics:
+            posts = (
+                Post.objects.filter(topic_id=topic_pk)
+                .select_related("topic")
+                .only(*(field for field in self.HEADER if field != "parent"), "parent_id")
+                .nocache()
+            )
+            root_id = None
+            for post in posts.iterator(chunk_size=self.CHUNK_SIZE):
+                if post.parent_id is None:
+                    root_id = post.id  # posts come in depth-first order, so replies follow their root post
+                yield {
+                    "id": post.id,
+                    "content": post.content,
+                    "parent": post.parent_id,
+                    "root": root_id,
+                    "tree_depth": post.tree_depth,
+                    "topic": post.topic_id,
+                    "topic__subject": post.topic.subject,
+                    "topic__created_at": post.topic.created_at,
+                    "identity_hash": post.identity_hash,
+                    "approved": post.approved,
+                    "created_at": post.created_at,
+                    "updated_at": post.updated_at,
+                }
+
+    def add_reaction_counts(self, rows):
+        reaction_type = self.board.preferences.reaction_type
+        counts = {
+            row.pop("post_id"): row
+            for row in ReactionCount.objects.filter(
+                post_id__in=[row["id"] for row in rows], reaction_type=reaction_type
+            ).values("post_id", *ReactionCount.COUNT_FIELDS)
+        }
+        for row in rows:
+            post_counts = counts.get(row["id"], {})
+            row["reaction_type"] = reaction_type
+            for field in ReactionCount.COUNT_FIELDS:
+                key = "reaction_count" if field == "count" else f"reaction_{field}"
+                row[key] = post_counts.get(field, 0)
@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
+
+from .utils import get_is_moderator
+
+
+class BoardPermissionContext:
+    """
+    What the requester is allowed to do on a board, computed once per request and board.
+
+    The moderators of the board and the permissions of the user are looked up once, when first needed, and every
+    decision about a topic or post of the board is then made in memory, not cached per object and session.
+    """
+
+    def __init__(self, board, request, user=None):
+        self.board = board
+        self.request = request
+        self.user = user = request.user if user is None else user
+        self.user_id = user.pk if user.is_authenticated else None
+        self.is_staff = user.is_staff
+        self.is_owner = self.user_id is not None and self.user_id == board.owner_id
+
+    @cached_property
+    def is_moderator(self):
+        return get_is_moderator(self.user, self.board)
+
+    async def aload(self):
+        """Looks up whether the user is a moderator ahead of use, as async views cannot query the database lazily."""
+        board = self.board
+        # the moderators and owner of the board are prefetched, so only a user's own permissions need a query
+        self.is_moderator = (
+            self.is_staff
+            or self.is_owner
+            or self.user in board.preferences.moderators.all()
+            or (self.user.is_authenticated and await sync_to_async(self.user.has_perm)("boards.can_approve_posts"))
+        )
+
+    @cached_property
+    def can_change_posts(self):
+        return self.user.has_perm("boards.change_post")
+
+    @cached_property
+    def can_delete_posts(self):
+        return self.user.has_perm("boards.delete_post")
+
+    @property
+    def session_key(self):
+        # read from the session every time, as views may create the session after the context is computed
+        return self.request.session.session_key
+
+    @property
+    def is_board_manager(self):
+        return self.is_owner or self.is_staff
+
+    @property
+    def export_allowed(self):
+        return self.is_board_manager
+
+    def is_post_owner(self, post):
+        return (post.session_key is not None and post.session_key == self.session_key) or (
+            self.user_id is not None and post.user_id == self.user_id
+        )
+
+    def post_create_allowed(self, topic):
+        return (
+            ((self.board.is_posting_allowed or self.is_owner) and not topic.is_locked)
+            or self.is_staff
+            or self.is_moderator
+        )
+
+    def reply_create_allowed(self, post):
+        preferences = self.board.preferences
+        return preferences.board_type == "r" and (
+            (post.approved and preferences.allow_guest_replies) or self.is_moderator
+        )
+
+    def update_allowed(self, post):
+        is_locked = post.topic.locked or self.board.locked or not self.board.preferences.allow_post_editing
+        if self.is_moderator:
+            return True
+        return not is_locked and (self.is_post_owner(post) or self.can_change_posts)
+
+    def delete_allowed(self, post):
+        return post.session_key == self.session_key or self.can_delete_posts or self.is_moderator
+
+
+def get_board_permissions(request, board):
+    """The BoardPermissionContext of the request for the board, computed on first use."""
+    board_permissions = request.__dict__.setdefault("_board_permissions", {})
+    if board.pk not in board_permissions:
+        board_permissions[board.pk] = BoardPermissionContext(board, request)
+    return board_permissions[board.pk]
+
+
+async def aget_board_permissions(request, board):
+    """Async version of `get_board_permissions`, with `is_moderator` already looked up."""
+    board_permissions = request.__dict__.setdefault("_board_permissions", {})
+    if board.pk not in board_permissions:
+        permissions = BoardPermissionContext(board, request, await request.auser())
+        await permissions.aload()
+        board_permissions[board.pk] = permissions
+    return board_permissions[board.pk]
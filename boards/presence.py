@@ -0,0 +1,64 @@
+import time
+
+import redis.asyncio as redis
+from django.conf import settings
+
+
+class BoardPresence:
+    """
+    Who is connected to a board, as a redis sorted set of `session_key|channel_name` members scored by their expiry.
+
+    Every connection refreshes its expiry with a heartbeat, so the connections of a crashed process expire instead of
+    being counted forever. Several connections (e.g. tabs) of the same session count as one.
+
+    Async redis clients are bound to the event loop they were created in, so each presence (one per websocket
+    connection) has its own client, connected on first use and closed with `close`.
+    """
+
+    def __init__(self, board_slug):
+        self.client = redis.Redis.from_url(settings.REDIS_URL)
+        self.key = f"{settings.CACHES['default']['KEY_PREFIX']}:presence:{board_slug}"
+        self.broadcast_key = f"{self.key}:broadcast"
+        self.sessions_key = f"{self.key}:sessions"
+        self.ttl = settings.BOARD_PRESENCE_HEARTBEAT_INTERVAL * 3
+
+    def get_member(self, session_key, channel_name):
+        return f"{session_key}|{channel_name}"
+
+    async def heartbeat(self, session_key, channel_name):
+        async with self.client.pipeline(transaction=False) as pipeline:
+            pipeline.zadd(self.key, {self.get_member(session_key, channel_name): time.time() + self.ttl})
+            pipeline.expire(self.key, self.ttl)
+            await pipeline.execute()
+
+    async def leave(self, session_key, channel_name):
+        await self.client.zrem(self.key, self.get_member(session_key, channel_name))
+
+    async def get_session_count(self):
+        async with self.client.pipeline(transaction=False) as pipeline:
+            pipeline.zremrangebyscore(self.key, "-inf", time.time())
+            pipeline.zrange(self.key, 0, -1)
+            _, members = await pipeline.execute()
+        return len({member.split(b"|", 1)[0] for member in members})
+
+    async def should_broadcast(self, session_count):
+        """
+        Whether a new session count should be broadcast to the board.
+
+        Only counts that changed since the last broadcast are sent, at most once per
+        BOARD_PRESENCE_BROADCAST_INTERVAL; a change that is throttled is picked up by the next heartbeat.
+        """
+        last_session_count = await self.client.get(self.sessions_key)
+        if last_session_count is not None and int(last_session_count) == session_count:
+            return False
+        interval = settings.BOARD_PRESENCE_BROADCAST_INTERVAL
+        if interval > 0 and not await self.client.set(self.broadcast_key, 1, nx=True, px=int(interval * 1000)):
+            return False
+        await self.client.set(self.sessions_key, session_count, ex=self.ttl)
+        return True
+
+    async def clear(self):
+        await self.client.delete(self.key, self.broadcast_key, self.sessions_key)
+
+    async def close(self):
+        await self.client.aclose()
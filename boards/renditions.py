@@ -0,0 +1,185 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+# kept free of Django models and of the rest of the app: the pool's processes import this module to render sizes
+
+FORMAT_EXTENSIONS = {"AVIF": "avif", "WEBP": "webp", "JPEG": "jpg"}
+FORMAT_MIME_TYPES = {"AVIF": "image/avif", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+PILImage.init()
+# the formats the thumbnails are rendered in, best compressed first: AVIF needs a Pillow build that can encode it
+THUMBNAIL_FORMATS = tuple(output_format for output_format in FORMAT_EXTENSIONS if output_format in PILImage.SAVE)
+
+# manifest key of the image file itself, which is not deleted with the renditions
+ORIGINAL = "original"
+
+
+@dataclass(frozen=True)
+class RenditionSize:
+    name: str
+    width: int
+    height: int
+    crop: bool
+    quality: int
+    formats: tuple
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """A rendition of an image, as stored in its manifest, in the storage of the image file."""
+
+    name: str
+    url: str
+    width: int
+    height: int
+    size: int
+    storage: Storage = field(compare=False, repr=False)
+
+    def open(self, mode="rb"):
+        return self.storage.open(self.name, mode)
+
+
+@dataclass(frozen=True)
+class RenditionSource:
+    """The renditions of a size in one format at each resolution, e.g. a <source> of a <picture>."""
+
+    mime_type: str
+    renditions: list
+
+    @property
+    def srcset(self):
+        return ", ".join(f"{rendition.url} {resolution}x" for resolution, rendition in self.renditions)
+
+
+def get_rendition_sizes(width, height):
+    """
+    The sizes rendered for an image of `width` x `height`, the thumbnails also at each of the
+    THUMBNAIL_ALTERNATIVE_RESOLUTIONS (e.g. `small@2x`).
+
+    The medium thumbnail is the background of narrow (phone) screens, which would otherwise get the large one.
+    """
+    full = RenditionSize("full", width, height, crop=False, quality=70, formats=("WEBP",))
+    medium_height = height * settings.MEDIUM_THUMBNAIL_WIDTH // width
+    base_sizes = [
+        RenditionSize("large", width // 2, height // 2, crop=False, quality=70, formats=THUMBNAIL_FORMATS),
+        RenditionSize(
+            "medium",
+            settings.MEDIUM_THUMBNAIL_WIDTH,
+            medium_height,
+            crop=False,
+            quality=70,
+            formats=THUMBNAIL_FORMATS,
+        ),
+        RenditionSize(
+            "small",
+            settings.SMALL_THUMBNAIL_WIDTH,
+            settings.SMALL_THUMBNAIL_HEIGHT,
+            crop=True,
+            quality=80,
+            formats=THUMBNAIL_FORMATS,
+        ),
+    ]
+    sizes = [full]
+    for size in base_sizes:
+        sizes.append(size)
+        sizes.extend(
+            RenditionSize(
+                f"{size.name}@{resolution}x",
+                size.width * int(resolution),
+                size.height * int(resolution),
+                crop=size.crop,
+                quality=size.quality,
+                formats=size.formats,
+            )
+            for resolution in settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS
+        )
+    return sizes
+
+
+def get_rendition_key(size_name, output_format):
+    # e.g. small_webp@2x
+    name, _, resolution = size_name.partition("@")
+    key = f"{name}_{output_format.lower()}"
+    return f"{key}@{resolution}" if resolution else key
+
+
+def convert_rendition_mode(img):
+    if img.mode not in ("RGB", "RGBA"):
+        return img.convert("RGBA" if img.mode in ("LA", "PA") or "transparency" in img.info else "RGB")
+    return img
+
+
+def render_size(img, size):
+    """Resize the decoded image once to `size` and encode it in each of its formats, as {format: (data, w, h)}."""
+    if size.crop:
+        img = ImageOps.fit(img, (size.width, size.height), PILImage.Resampling.LANCZOS)
+    else:
+        img = img.copy()
+        img.thumbnail((size.width, size.height), PILImage.Resampling.LANCZOS)
+
+    encoded = {}
+    for output_format in size.formats:
+        output = img.convert("RGB") if output_format == "JPEG" and img.mode != "RGB" else img
+        buffer = BytesIO()
+        output.save(buffer, format=output_format, quality=size.quality)
+        encoded[output_format] = (buffer.getvalue(), output.width, output.height)
+    return encoded
+
+
+def render_encoded_size(data, size):
+    """render_size from the encoded image `data`, a JPEG being decoded at the smallest scale that covers `size`."""
+    img = PILImage.open(BytesIO(data))
+    img.draft(img.mode, (size.width, size.height))
+    return render_size(convert_rendition_mode(img), size)
+
+
+@cache
+def get_executor():
+    """The pool rendering the sizes of an image in parallel, None to render them in the calling thread."""
+    if settings.THUMBNAIL_PROCESSES <= 0:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=settings.THUMBNAIL_PROCESSES, mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def get_manifest_entry(storage, name, width, height, size):
+    # everything needed to render the rendition, so that rendering never has to reach the storage
+    return {"name": name, "url": storage.url(name), "width": width, "height": height, "size": size}
+
+
+def create_renditions(img, file, path):
+    """
+    Render every size of the decoded image `img` and save them under `path` in the storage of `file`, returning the
+    manifest of the renditions by key (e.g. `small_webp@2x`), with their URL, dimensions and size in bytes.
+
+    The sizes are resized from `img` in turn if THUMBNAIL_PROCESSES is 0. Otherwise they are rendered in the process
+    pool from `file`, the encoded image `img` was decoded from: each job is sent its few megabytes and decodes them,
+    rather than the tens of megabytes of decoded pixels.
+    """
+    sizes = get_rendition_sizes(img.width, img.height)
+    executor = get_executor()
+    if executor is None:
+        img = convert_rendition_mode(img)
+        results = (render_size(img, size) for size in sizes)
+    else:
+        with file.open("rb") as encoded_file:
+            data = encoded_file.read()
+        results = executor.map(render_encoded_size, [data] * len(sizes), sizes)
+
+    manifest = {}
+    for size, encoded in zip(sizes, results, strict=True):
+        for output_format, (data, width, height) in encoded.items():
+            key = get_rendition_key(size.name, output_format)
+            name = file.storage.save(f"{path}/{key}.{FORMAT_EXTENSIONS[output_format]}", ContentFile(data))
+            manifest[key] = get_manifest_entry(file.storage, name, width, height, len(data))
+    return manifest
@@ -1,17 +1,22 @@
 import contextlib
 import logging
 
-from cacheops import invalidate_obj
+from cacheops import invalidate_obj, no_invalidation
+from django.conf import settings
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django_cleanup.signals import cleanup_pre_delete
 
-from .models import BgImage, Board, BoardPreferences, Post, Reaction, Topic
-from .tasks import delete_thumbnails
+from .events import no_board_events
+from .models import BgImage, Board, BoardPreferences, Image, Post, PostImage, Reaction, Topic
+from .snapshot import BoardSnapshot
+from .tasks import delete_image_files, delete_thumbnails, invalidate_board_tree_cache
 from .utils import channel_group_send
 
 logger = logging.getLogger(__name__)
@@ -84,10 +89,8 @@ def invalidate_board_preferences_cache(sender, instance, **kwargs):
     try:
         invalidate_obj(instance)
         invalidate_obj(instance.board)
-        for topic in instance.board.topics.all():
-            invalidate_obj(topic)
-            for post in topic.posts.all():
-                invalidate_obj(post)
+        # topics and posts are invalidated in bulk, outside of the request
+        transaction.on_commit(lambda: invalidate_board_tree_cache(instance.board_id))
     except ObjectDoesNotExist:
         logger.exception("Could not delete cache: board-%s", str(instance.id))
 
@@ -129,6 +132,18 @@ def invalidate_topic_template_cache(sender, instance, **kwargs):
         logger.exception("Could not delete cache: topic-%s", str(instance.pk))
 
 
+@receiver(post_save, sender=Post)
+def post_created_update_descendant_counts(sender, instance, created, **kwargs):
+    if created:
+        instance.update_ancestors_descendant_count(1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_update_descendant_counts(sender, instance, **kwargs):
+    # replies deleted along with the post have no ancestors left, so only the deleted post's ancestors are updated
+    instance.update_ancestors_descendant_count(-(instance.descendant_count + 1))
+
+
 @receiver(post_save, sender=Post)
 def post_created_invalidate_cache(sender, instance, created, **kwargs):
     if created:
@@ -138,10 +153,38 @@ def post_created_invalidate_cache(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Post)
 def post_deleted_invalidate_cache(sender, instance, **kwargs):
+    # bulk deletes invalidate the whole set of posts at once instead
+    if no_invalidation.active:
+        return
     invalidate_post_cache(instance)
     invalidate_post_tree_cache(instance)
 
 
+def get_shared_post_html(post):
+    """
+    Render a new top-level post as seen by viewers who neither own nor moderate it, or None if it cannot be shared.
+
+    Unapproved posts are only shown to their owner and moderators, and additional data is saved after the post, so
+    those are left for each viewer to fetch.
+    """
+    board = post.topic.board
+    if not settings.BOARD_EVENTS_RENDER_POSTS or not post.approved or board.is_additional_data_allowed:
+        return None
+
+    snapshot = BoardSnapshot(board, topic=post.topic, post=post)
+    return render_to_string(
+        "boards/components/post.html",
+        {
+            "board": board,
+            "topic": post.topic,
+            "snapshot": snapshot,
+            "post": snapshot.get_post(post.pk),
+            "is_owner": False,
+            "is_moderator": False,
+        },
+    )
+
+
 @receiver(post_save, sender=Post)
 def post_send_message(sender, instance, created, **kwargs):
     board_slug = instance.topic.board.slug
@@ -152,6 +195,8 @@ def post_send_message(sender, instance, created, **kwargs):
                 "type": "post_created",
                 "topic_pk": str(instance.topic_id),
                 "post_pk": str(instance.pk),
+                "identity_hash": instance.identity_hash,
+                "html": get_shared_post_html(instance),
                 "fetch_url": reverse(
                     "boards:post-fetch",
                     kwargs={
@@ -175,6 +220,8 @@ def post_send_message(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Post)
 def post_delete_send_message(sender, instance, **kwargs):
+    if no_board_events.active:
+        return
     try:
         if Topic.objects.filter(id=instance.topic_id).exists():
             channel_group_send(
@@ -210,6 +257,13 @@ def invalidate_bg_image_cache(sender, instance, **_kwargs):
         logger.exception("Could not delete cache: image-select-%s", str(instance.image_type))
 
 
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=BgImage)
+@receiver(post_delete, sender=PostImage)
+def image_delete_files(sender, instance, **kwargs):
+    transaction.on_commit(lambda: delete_image_files(instance.image.name, instance.renditions)())
+
+
 @receiver(cleanup_pre_delete)
 def sorl_delete(**kwargs):
     delete_thumbnails(kwargs["file"])()
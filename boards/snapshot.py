@@ -0,0 +1,245 @@
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AdditionalData, Post, Reaction, ReactionCount, Topic
+from .utils import get_reaction_score
+
+
+@dataclass(frozen=True)
+class PostCursor:
+    """
+    Position in the top-level posts of a topic, ordered by (created_at, id).
+
+    `until` is when the first page was rendered: posts created since are pushed to viewers over the websocket, so
+    later pages must not include them again.
+    """
+
+    created_at: object
+    pk: uuid.UUID
+    until: object
+
+    def __str__(self):
+        return f"{self.created_at.isoformat()}~{self.pk}~{self.until.isoformat()}"
+
+    @classmethod
+    def from_string(cls, string):
+        created_at, pk, until = string.split("~")
+        created_at, until = parse_datetime(created_at), parse_datetime(until)
+        if created_at is None or until is None:
+            msg = f"Invalid post cursor: {string}"
+            raise ValueError(msg)
+        return cls(created_at, uuid.UUID(pk), until)
+
+
+@dataclass(frozen=True)
+class ReactionSummary:
+    count: int = 0
+    positive_count: int = 0
+    negative_count: int = 0
+    score_sum: int = 0
+
+
+class BoardSnapshot:
+    """
+    In-memory view of a board (or a single topic) for rendering.
+
+    Topics, the post trees, reaction counts, the requester's own reactions and additional data are each loaded
+    with one bulk query, so the number of queries does not grow with the number of posts.
+
+    Without a request, it is the view of a visitor with no session, e.g. to render fragments shared by all viewers.
+
+    Only the first TOPIC_POSTS_PAGE_SIZE top-level posts of each topic (after `cursor`, if given) are loaded with
+    their replies, or only `post` and its replies if given.
+    """
+
+    def __init__(self, board, request=None, topic=None, post=None, cursor=None):
+        self._setup(board, request, request.user if request is not None else AnonymousUser(), topic, cursor)
+        if topic is None:
+            self.topics = list(Topic.objects.filter(board=board))
+        root_pks = self._add_roots(self._get_roots(cursor)) if post is None else ()
+        posts = self._get_posts(root_pks, subtree_of=post)
+        self._add_posts(list(posts) if posts is not None else [])
+        if self.reaction_type != "n":
+            self._add_reaction_counts(self._get_reaction_counts())
+            self._add_own_reactions(self._get_own_reactions())
+        if board.is_additional_data_allowed:
+            self._add_additional_data(self._get_additional_data())
+
+    @classmethod
+    async def aload(cls, board, request=None, topic=None, post=None, cursor=None):
+        """The same snapshot, loaded with Django's async ORM, for async views."""
+        snapshot = cls.__new__(cls)
+        await snapshot._aload(board, request, topic, post, cursor)  # noqa: SLF001
+        return snapshot
+
+    async def _aload(self, board, request, topic, post, cursor):
+        user = await request.auser() if request is not None else AnonymousUser()
+        self._setup(board, request, user, topic, cursor)
+        if topic is None:
+            self.topics = [topic async for topic in Topic.objects.filter(board=board)]
+        root_pks = ()
+        if post is None:
+            root_pks = self._add_roots([row async for row in self._get_roots(cursor)])
+        posts = self._get_posts(root_pks, subtree_of=post)
+        self._add_posts([post async for post in posts] if posts is not None else [])
+        if self.reaction_type != "n":
+            self._add_reaction_counts([row async for row in self._get_reaction_counts()])
+            self._add_own_reactions([row async for row in self._get_own_reactions()])
+        if board.is_additional_data_allowed:
+            self._add_additional_data([data async for data in self._get_additional_data()])
+
+    def _setup(self, board, request, user, topic, cursor):
+        self.board = board
+        self.reaction_type = board.preferences.reaction_type
+        self.session_key = request.session.session_key if request is not None else None
+        self.user = user
+
+        if topic is None:
+            self.post_lookup = {"topic__board": board}
+        else:
+            self.topics = [topic]
+            self.post_lookup = {"topic": topic}
+
+        self.page_size = settings.TOPIC_POSTS_PAGE_SIZE
+        self.until = cursor.until if cursor is not None else timezone.now()
+        self.cursors = {}
+        self.posts = {}
+        self.topic_posts = defaultdict(list)
+        self.replies = defaultdict(list)
+        self.descendant_counts = defaultdict(int)
+        self.reactions = {}
+        self.has_reacted = {}
+        self.additional_data = defaultdict(dict)
+
+    # Each bulk query is built by a `_get_*` method and its rows consumed by the matching `_add_*` method, so that
+    # the constructor and `aload` only differ in how the rows are fetched.
+
+    def _get_roots(self, cursor):
+        roots = Post.objects.without_tree_fields().filter(parent=None, created_at__lte=self.until, **self.post_lookup)
+        if cursor is not None:
+            roots = roots.filter(
+                Q(created_at__gt=cursor.created_at) | Q(created_at=cursor.created_at, pk__gt=cursor.pk)
+            )
+        roots = roots.annotate(
+            row_number=Window(
+                RowNumber(), partition_by=F("topic_id"), order_by=[F("created_at").asc(), F("id").asc()]
+            )
+        ).filter(row_number__lte=self.page_size + 1)
+        return roots.values_list("topic_id", "pk", "created_at", "row_number")
+
+    def _add_roots(self, rows):
+        """The pks of the top-level posts of the page of each topic, keeping the cursor of the next page if any."""
+        root_pks = []
+        last_roots = {}
+        for topic_id, pk, created_at, row_number in rows:
+            if row_number > self.page_size:
+                self.cursors[topic_id] = PostCursor(*last_roots[topic_id], self.until)
+            else:
+                root_pks.append(pk)
+                last_roots[topic_id] = (created_at, pk)
+        return root_pks
+
+    def _get_posts(self, root_pks, subtree_of=None):
+        posts = Post.objects.tree_filter(**self.post_lookup).filter(**self.post_lookup)
+        if subtree_of is not None:
+            return posts.descendants(subtree_of, include_self=True)
+        if root_pks:
+            return posts.extra(where=["__tree.tree_path[1] = ANY(%s)"], params=[root_pks])
+        return None
+
+    def _add_posts(self, posts):
+        for post in posts:
+            self.posts[post.pk] = post
+            if post.parent_id is None:
+                self.topic_posts[post.topic_id].append(post)
+            else:
+                self.replies[post.parent_id].append(post)
+
+        # posts are in depth-first order, so children are always counted before their parents
+        for post in reversed(posts):
+            if post.parent_id is not None:
+                self.descendant_counts[post.parent_id] += self.descendant_counts[post.pk] + 1
+
+    def _get_reaction_counts(self):
+        counts = ReactionCount.objects.filter(reaction_type=self.reaction_type, post__in=list(self.posts))
+        return counts.values("post_id", *ReactionCount.COUNT_FIELDS)
+
+    def _add_reaction_counts(self, rows):
+        for row in rows:
+            post_id = row.pop("post_id")
+            self.reactions[post_id] = ReactionSummary(**row)
+
+    def _get_own_reactions(self):
+        own_reactions = Q(session_key=self.session_key) if self.session_key else Q(pk__in=[])
+        if self.user.is_authenticated:
+            own_reactions |= Q(user=self.user)
+        reactions = Reaction.objects.filter(own_reactions, reaction_type=self.reaction_type)
+        return reactions.filter(post__in=list(self.posts)).values_list(
+            "post_id", "id", "session_key", "reaction_score"
+        )
+
+    def _add_own_reactions(self, rows):
+        for post_id, reaction_id, session_key, reaction_score in rows:
+            # a reaction made with the current session takes precedence over one matched by user
+            if post_id not in self.has_reacted or session_key == self.session_key:
+                self.has_reacted[post_id] = (True, reaction_id, reaction_score)
+
+    def _get_additional_data(self):
+        return AdditionalData.objects.filter(post__in=list(self.posts))
+
+    def _add_additional_data(self, additional_data_list):
+        for additional_data in additional_data_list:
+            self.additional_data[additional_data.post_id][additional_data.data_type] = additional_data
+
+    def get_post(self, pk):
+        try:
+            return self.posts[pk]
+        except KeyError as e:
+            msg = f"Post {pk} is not part of this snapshot"
+            raise Post.DoesNotExist(msg) from e
+
+    def get_topic_posts(self, topic):
+        return self.topic_posts[topic.pk]
+
+    def get_next_cursor(self, topic):
+        return self.cursors.get(topic.pk)
+
+    def get_replies(self, post):
+        return self.replies[post.pk]
+
+    def get_descendant_count(self, post):
+        return self.descendant_counts[post.pk]
+
+    def get_reactions(self, post):
+        return self.reactions.get(post.pk, ReactionSummary())
+
+    def get_has_reacted(self, post):
+        return self.has_reacted.get(post.pk, (False, None, 1))
+
+    def get_reaction_score(self, post):
+        reactions = self.get_reactions(post)
+        return get_reaction_score(
+            self.reaction_type,
+            count=reactions.count,
+            positive_count=reactions.positive_count,
+            negative_count=reactions.negative_count,
+            score_sum=reactions.score_sum,
+        )
+
+    def get_is_owner(self, post):
+        return (self.session_key is not None and post.session_key == self.session_key) or (
+            self.user.is_authenticated and post.user_id == self.user.pk
+        )
+
+    def get_additional_data(self, post, additional_data_type=None):
+        if additional_data_type is None:
+            return list(self.additional_data[post.pk].values())
+        return self.additional_data[post.pk].get(additional_data_type)
@@ -9,6 +9,7 @@ var enable_chemdoodle = JSON.parse(
 );
 var board_slug = JSON.parse(document.getElementById("board_slug").textContent);
 var boardSocket = null;
+var heartbeatInterval = null;
 var baseUrl =
   window.location.pathname.split("/")[1] == "boards"
     ? window.location.host
@@ -18,6 +19,97 @@ var pathName =
     ? ""
     : "/" + window.location.pathname.split("/")[1];
 
+function handleBoardEvent(data) {
+  var boardDiv = "#board-" + board_slug;
+
+  switch (data.type) {
+    case "session_connected":
+    case "session_disconnected":
+    case "sessions_updated":
+      if (data.heartbeat_interval) {
+        clearInterval(heartbeatInterval);
+        heartbeatInterval = setInterval(function () {
+          if (boardSocket.readyState === WebSocket.OPEN) {
+            boardSocket.send(JSON.stringify({ type: "heartbeat" }));
+          }
+        }, data.heartbeat_interval * 1000);
+      }
+      try {
+        htmx.find("#board-online-sessions").textContent = data.sessions;
+        break;
+      } catch (e) {
+        break;
+      }
+    case "board_preferences_changed":
+    case "board_updated":
+      htmx.trigger(htmx.find(boardDiv), "boardUpdated");
+      break;
+    case "topic_created":
+      htmx.trigger(htmx.find(boardDiv), "topicCreated");
+      break;
+    case "topic_updated":
+      var topicDiv = "#topic-" + data.topic_pk;
+      htmx.trigger(htmx.find(topicDiv), "topicUpdated");
+      break;
+    case "topic_deleted":
+      htmx.find("#topic-" + data.topic_pk).remove();
+      break;
+    case "post_created":
+      var newCardDiv =
+        data.parent == null
+          ? "#newCard-topic-" + data.topic_pk + "-div"
+          : "#newCard-post-" + data.parent + "-div";
+      // the shared html lacks the owner and moderator controls, so those viewers fetch their own
+      var isOwner =
+        data.identity_hash ==
+        JSON.parse(document.getElementById("identity_hash").textContent);
+      var isModerator = JSON.parse(
+        document.getElementById("is_moderator").textContent
+      );
+      if (data.html && !isOwner && !isModerator) {
+        htmx.swap(newCardDiv, data.html, { swapStyle: "beforebegin" });
+      } else {
+        htmx.ajax("GET", data.fetch_url, {
+          target: newCardDiv,
+          swap: "beforebegin",
+        });
+      }
+      htmx.trigger(htmx.find(boardDiv), "postCreated");
+      break;
+    case "post_updated":
+      var postDiv = "#container-post-" + data.post_pk;
+      htmx.trigger(htmx.find(postDiv), "postUpdated");
+      break;
+    case "post_deleted":
+      var topicDiv = "#topic-" + data.topic_pk;
+      htmx.find("#container-post-" + data.post_pk).remove();
+      htmx.trigger(htmx.find(topicDiv), "postDeleted");
+      break;
+    case "reaction_updated":
+      var postFooterDiv = "#post-" + data.post_pk + "-footer-htmx-div";
+      htmx.trigger(htmx.find(postFooterDiv), "reactionUpdated");
+      break;
+    case "export_progress":
+      var exportsDiv = htmx.find("#board-exports");
+      if (exportsDiv) {
+        htmx.trigger(exportsDiv, "exportUpdated");
+      }
+      break;
+    case "board_events":
+      data.events.forEach(function (event) {
+        try {
+          handleBoardEvent(event);
+        } catch (e) {
+          console.error(e);
+        }
+      });
+      break;
+    default:
+      console.error("Unknown message type: " + data);
+      break;
+  }
+}
+
 function connectWebsocket() {
   var ws_scheme = window.location.protocol == "https:" ? "wss" : "ws";
   boardSocket = new RobustWebSocket(
@@ -40,60 +132,7 @@ function connectWebsocket() {
   };
 
   boardSocket.onmessage = function (e) {
-    const data = JSON.parse(e.data);
-    var boardDiv = "#board-" + board_slug;
-
-    switch (data.type) {
-      case "session_connected":
-      case "session_disconnected":
-        try {
-          htmx.find("#board-online-sessions").textContent = data.sessions;
-          break;
-        } catch (e) {
-          break;
-        }
-      case "board_preferences_changed":
-      case "board_updated":
-        htmx.trigger(htmx.find(boardDiv), "boardUpdated");
-        break;
-      case "topic_created":
-        htmx.trigger(htmx.find(boardDiv), "topicCreated");
-        break;
-      case "topic_updated":
-        var topicDiv = "#topic-" + data.topic_pk;
-        htmx.trigger(htmx.find(topicDiv), "topicUpdated");
-        break;
-      case "topic_deleted":
-        htmx.find("#topic-" + data.topic_pk).remove();
-        break;
-      case "post_created":
-        var newCardDiv =
-          data.parent == null
-            ? "#newCard-topic-" + data.topic_pk + "-div"
-            : "#newCard-post-" + data.parent + "-div";
-        htmx.ajax("GET", data.fetch_url, {
-          target: newCardDiv,
-          swap: "beforebegin",
-        });
-        htmx.trigger(htmx.find(boardDiv), "postCreated");
-        break;
-      case "post_updated":
-        var postDiv = "#container-post-" + data.post_pk;
-        htmx.trigger(htmx.find(postDiv), "postUpdated");
-        break;
-      case "post_deleted":
-        var topicDiv = "#topic-" + data.topic_pk;
-        htmx.find("#container-post-" + data.post_pk).remove();
-        htmx.trigger(htmx.find(topicDiv), "postDeleted");
-        break;
-      case "reaction_updated":
-        var postFooterDiv = "#post-" + data.post_pk + "-footer-htmx-div";
-        htmx.trigger(htmx.find(postFooterDiv), "reactionUpdated");
-        break;
-      default:
-        console.error("Unknown message type: " + data);
-        break;
-    }
+    handleBoardEvent(JSON.parse(e.data));
   };
 
   boardSocket.onerror = function (err) {
@@ -104,12 +143,6 @@ function connectWebsocket() {
 }
 
 document.addEventListener("alpine:init", () => {
-  function img_srcset_res(pathfilename, res) {
-    var filepath = pathfilename.substr(0, pathfilename.lastIndexOf("."));
-    var ext = pathfilename.split(".").pop();
-    return `${filepath}@${res}x.${ext}`;
-  }
-
   Alpine.store("board", {
     is_overflow: false,
     deleteConfirm: false,
@@ -121,18 +154,13 @@ document.addEventListener("alpine:init", () => {
     img_id: "",
     img_srcset_webp: "",
     img_srcset_jpeg: "",
+    img_src: "",
     get colorVisible() {
       return this.bg_type == "c" ? true : false;
     },
     get imageVisible() {
       return this.bg_type == "i" ? true : false;
     },
-    img_srcset_jpeg_res(res) {
-      return img_srcset_res(this.img_srcset_jpeg, res);
-    },
-    img_srcset_webp_res(res) {
-      return img_srcset_res(this.img_srcset_webp, res);
-    },
   });
 
   Alpine.store("postForm", {
@@ -1,20 +1,75 @@
+from pathlib import Path
+
 from django.apps import apps
+from django.conf import settings
 from django.core import management
 from huey import crontab
 from huey.contrib.djhuey import db_periodic_task, db_task, lock_task
 from sorl.thumbnail import delete as sorl_delete
+from sorl.thumbnail.images import ImageFile
 
 from jotlet.utils import offset_date
 
+from .renditions import ORIGINAL, create_renditions, get_manifest_entry
+from .utils import convert_image_format, get_random_string, invalidate_queryset, open_image, resize_image, save_image
+
 
 @db_task()
 def create_thumbnails(img):
-    # need to "get" thumbnails to create them
-    _ = img.get_large_thumbnail
-    _ = img.get_large_thumbnail_webp
-    _ = img.get_small_thumbnail
-    _ = img.get_small_thumbnail_webp
-    return f"created thumbnails for {img}"
+    """
+    Process a background image as uploaded and create all of its renditions.
+
+    The image is converted and resized as `process_image` would, and saved again if that changed it. The images
+    sharing its file (uploaded with the same content) are updated along with it.
+    """
+    image_model = apps.get_model("boards.Image")
+    old_name = img.image.name
+    with img.image.open("rb") as file:
+        pil_image = open_image(file, settings.MAX_IMAGE_WIDTH, settings.MAX_IMAGE_HEIGHT)
+        pil_image.load()
+    pil_image, output_format, format_changed = convert_image_format(pil_image, img.image)
+    pil_image, size_changed = resize_image(pil_image, settings.MAX_IMAGE_WIDTH, settings.MAX_IMAGE_HEIGHT)
+    if format_changed or size_changed:
+        with save_image(pil_image, img.image, output_format) as file:
+            img.image.save(Path(img.image.name).name, file, save=False)
+        img.image.storage.delete(old_name)
+
+    renditions = create_renditions(
+        pil_image, img.image, f"renditions/{img.image_type}/{img.pk}/{get_random_string(8)}"
+    )
+    renditions[ORIGINAL] = get_manifest_entry(
+        img.image.storage, img.image.name, pil_image.width, pil_image.height, img.image.size
+    )
+    image_model.objects.filter(image=old_name).invalidated_update(image=img.image.name, renditions=renditions)
+    old_renditions, img.renditions = img.renditions, renditions
+    img.reset_tracked_fields()
+    delete_renditions(old_renditions)()
+    return f"created {len(renditions)} renditions for {img}"
+
+
+def get_image_storage():
+    """The storage of the image files, where their renditions are saved too."""
+    return apps.get_model("boards.Image").image.field.storage
+
+
+@db_task()
+def delete_renditions(renditions):
+    renditions = {key: rendition for key, rendition in renditions.items() if key != ORIGINAL}
+    storage = get_image_storage()
+    for rendition in renditions.values():
+        storage.delete(rendition["name"])
+    return f"deleted {len(renditions)} renditions"
+
+
+@db_task()
+def delete_image_files(name, renditions):
+    """Delete an image file, with its renditions and sorl thumbnails, unless another image still shares it."""
+    image_model = apps.get_model("boards.Image")
+    if not name or image_model.objects.filter(image=name).exists():
+        return f"{name} is still used"
+    sorl_delete(ImageFile(name, get_image_storage()))
+    delete_renditions(renditions)()
+    return f"deleted {name}"
 
 
 @db_task()
@@ -23,6 +78,26 @@ def delete_thumbnails(file):
     return f"deleted thumbnails for {file}"
 
 
+@db_task()
+def invalidate_board_tree_cache(board_pk):
+    topic_model = apps.get_model("boards.Topic")
+    post_model = apps.get_model("boards.Post")
+    topics = invalidate_queryset(topic_model.objects.filter(board_id=board_pk))
+    posts = invalidate_queryset(post_model.objects.filter(topic__board_id=board_pk))
+    return f"invalidated {topics} topics and {posts} posts for board {board_pk}"
+
+
+@db_task()
+def generate_export(export_pk):
+    export_model = apps.get_model("boards.Export")
+    try:
+        export = export_model.objects.get(pk=export_pk)
+    except export_model.DoesNotExist:
+        return f"export {export_pk} was deleted before it was generated"
+    export.generate()
+    return f"generated export {export} with {export.post_count} posts"
+
+
 @db_periodic_task(crontab(minute="0", hour="3"))
 @lock_task("export_cleanup-lock")
 def export_cleanup():
@@ -33,20 +108,20 @@ def export_cleanup():
 
 @db_task()
 @lock_task("post_image_cleanup-lock")
-def post_image_cleanup(post, imgs=None):
-    matched = 0
+def post_image_cleanup(post):
+    """
+    Attach the images referenced by the post to it unless already attached to another post, and delete those of its
+    images that no post references anymore.
+
+    An image can be referenced by several posts (e.g. uploaded again with the same content), so it stays attached to
+    the first one and is only deleted once none of them references it.
+    """
+    post_image_model = apps.get_model("boards.PostImage")
+    matched = post.referenced_images.filter(post=None).invalidated_update(post=post)
     deleted = 0
-    if imgs is None:
-        msg = "Post images must be provided"
-        raise ValueError(msg)
-    for img in imgs:
-        if img.image.url in post.content and img.post != post:
-            img.post = post
-            img.save()
-            matched += 1
-        elif img.image.url not in post.content and img.post == post:
-            img.delete()
-            deleted += 1
+    for img in post_image_model.objects.filter(post=post, referencing_posts=None):
+        img.delete()
+        deleted += 1
     return f"{matched} matched, {deleted} deleted"
 
 
@@ -25,3 +25,27 @@ def get_split_string(string):
 @register.simple_tag
 def get_settings_value(name):
     return getattr(settings, name, "")
+
+
+@register.filter
+def rendition(image, key):
+    """The rendition `key` of an image, or the image itself if it has none"""
+    return image.get_rendition(key)
+
+
+@register.filter
+def rendition_set(image, key):
+    """The renditions `key` of an image at each resolution, as (resolution, rendition) pairs"""
+    return image.get_rendition_set(key)
+
+
+@register.filter
+def srcset(image, key):
+    """The srcset of the renditions `key` of an image, e.g. `small.webp 1x, small@2x.webp 2x`"""
+    return image.get_srcset(key)
+
+
+@register.filter
+def sources(image, size_name):
+    """The renditions `size_name` of an image in each of its formats, e.g. for the <source> tags of a <picture>"""
+    return image.get_sources(size_name)
@@ -1,29 +1,78 @@
 from django import template
 
+from boards.permissions import get_board_permissions
+
 register = template.Library()
 
 
-@register.simple_tag
-def get_is_owner(post, request):
-    return post.get_is_owner(request)
+@register.simple_tag(takes_context=True)
+def get_is_owner(context, post, request):
+    if permissions := context.get("permissions"):
+        return permissions.is_post_owner(post)
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_is_owner(post)
+    return get_board_permissions(request, post.topic.board).is_post_owner(post)
 
 
-@register.simple_tag
-def get_additional_data(post, additional_data_type):
+@register.simple_tag(takes_context=True)
+def get_additional_data(context, post, additional_data_type):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_additional_data(post, additional_data_type)
     return post.get_additional_data(additional_data_type)
 
 
-@register.simple_tag
-def get_reactions(post, reaction_type):
+@register.simple_tag(takes_context=True)
+def get_post_additional_data(context, post):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_additional_data(post)
+    return post.additional_data.all()
+
+
+@register.simple_tag(takes_context=True)
+def get_reactions(context, post, reaction_type):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_reactions(post)
     return post.get_reactions(reaction_type)
 
 
-@register.simple_tag
-def get_has_reacted(post, request, reactions):
+@register.simple_tag(takes_context=True)
+def get_has_reacted(context, post, request, reactions):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_has_reacted(post)
     has_reacted, reaction_id, reaction_score = post.get_has_reacted(request, reactions)
     return has_reacted, reaction_id, reaction_score
 
 
-@register.simple_tag
-def get_reaction_score(post, reactions, reaction_type):
-    return post.get_reaction_score(reactions, reaction_type)
+@register.simple_tag(takes_context=True)
+def get_reaction_score(context, post, reaction_type):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_reaction_score(post)
+    return post.get_reaction_score(reaction_type)
+
+
+@register.simple_tag(takes_context=True)
+def get_topic_posts(context, topic):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_topic_posts(topic)
+    return topic.get_posts
+
+
+@register.simple_tag(takes_context=True)
+def get_topic_posts_cursor(context, topic):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_next_cursor(topic)
+    return None
+
+
+@register.simple_tag(takes_context=True)
+def get_post_replies(context, post):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_replies(post)
+    return post.children.all()
+
+
+@register.simple_tag(takes_context=True)
+def get_descendant_count(context, post):
+    if snapshot := context.get("snapshot"):
+        return snapshot.get_descendant_count(post)
+    return post.get_descendant_count
@@ -15,6 +15,7 @@ from boards.models import (
     Post,
     PostImage,
     Reaction,
+    ReactionCount,
     Topic,
 )
 from jotlet.tests.factories import JotletDict, JSONFactory
@@ -62,6 +63,13 @@ class ReactionFactory(factory.django.DjangoModelFactory):
     post: Post = factory.SubFactory(PostFactory)
     session_key = factory.Sequence(lambda _n: fake.unique.sha1())
 
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        # keep the denormalized counts in sync, as PostReactionView does
+        reaction = super()._create(model_class, *args, **kwargs)
+        ReactionCount.record(reaction.post, reaction.reaction_type, new_score=int(reaction.reaction_score))
+        return reaction
+
 
 class AdditionalDataFactory(factory.django.DjangoModelFactory):
     class Meta:
@@ -94,9 +102,15 @@ class ChemdoodleDataFactory(JSONDataFactory):
 class ExportFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = Export
+        skip_postgeneration_save = True
 
     board: Board = factory.SubFactory(BoardFactory)
 
+    @factory.post_generation
+    def generate(obj, create, extracted, **kwargs):  # noqa: N805
+        if create:
+            obj.generate()
+
 
 class ImageFactory(factory.django.DjangoModelFactory):
     class Meta:
@@ -104,6 +118,8 @@ class ImageFactory(factory.django.DjangoModelFactory):
 
     title = factory.Sequence(lambda n: f"Test Image {n}")
     image = factory.django.ImageField(filename="example.png", format="png", width=100, height=100)
+    # distinct content, as images uploaded with the same content share their file
+    image__color = factory.Sequence(lambda n: (n % 256, n // 256 % 256, n // 65536 % 256))
 
 
 class BgImageFactory(ImageFactory):
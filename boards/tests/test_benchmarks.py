@@ -0,0 +1,120 @@
+from io import StringIO
+
+import pytest
+import redis
+import redis.client
+from django.core.management import call_command
+from django.urls import reverse
+
+from boards.models import Export, Post, Reaction
+from boards.tests.factories import PostFactory, ReactionFactory, TopicFactory
+
+# deselected by default, run with `pytest -m benchmark -p no:xdist`
+pytestmark = pytest.mark.benchmark
+
+POST_COUNTS = [10, 100, 1000, 10000]
+TOPIC_COUNT = 5
+ROUNDS = 3
+
+
+def create_board_posts(board, post_count):
+    """
+    Bulk create `post_count` posts over the topics of the board, every other one a reply, each with a reaction.
+
+    The posts are built with the factories but saved with bulk_create, so signals (cache invalidation, websocket
+    messages) do not make building a large board take minutes.
+    """
+    board.preferences.board_type = "r"
+    board.preferences.reaction_type = "l"
+    board.preferences.save()
+    topics = TopicFactory.create_batch(TOPIC_COUNT, board=board)
+
+    top_level_count = post_count // 2
+    posts = Post.objects.bulk_create(
+        PostFactory.build(topic=topics[i % TOPIC_COUNT]) for i in range(post_count - top_level_count)
+    )
+    posts += Post.objects.bulk_create(
+        PostFactory.build(topic=parent.topic, parent=parent) for parent in posts[:top_level_count]
+    )
+    Reaction.objects.bulk_create(ReactionFactory.build(post=post, reaction_type="l") for post in posts)
+    call_command("rebuild_reaction_counts", stdout=StringIO())
+    call_command("rebuild_post_tree_stats", stdout=StringIO())
+    return topics, posts
+
+
+@pytest.fixture
+def redis_calls(monkeypatch):
+    """Every redis round trip (a command, or a whole pipeline) made by the cache, cacheops and the channel layer."""
+    calls = []
+    execute_command = redis.Redis.execute_command
+    execute_pipeline = redis.client.Pipeline.execute
+
+    def counted_execute_command(self, *args, **options):
+        calls.append(args[0])
+        return execute_command(self, *args, **options)
+
+    def counted_execute_pipeline(self, *args, **kwargs):
+        calls.append("PIPELINE")
+        return execute_pipeline(self, *args, **kwargs)
+
+    monkeypatch.setattr(redis.Redis, "execute_command", counted_execute_command)
+    monkeypatch.setattr(redis.client.Pipeline, "execute", counted_execute_pipeline)
+    return calls
+
+
+@pytest.fixture
+def run_benchmark(benchmark, redis_calls, django_assert_max_num_queries):
+    """
+    Benchmark `func`, failing if its first call makes more than `max_num_queries` queries, whatever the board size.
+
+    The query and redis call counts of that call are recorded in the benchmark's extra info.
+    """
+
+    def _run_benchmark(func, max_num_queries):
+        redis_calls.clear()
+        with django_assert_max_num_queries(max_num_queries) as captured:
+            func()
+        benchmark.extra_info["queries"] = len(captured)
+        benchmark.extra_info["redis_calls"] = len(redis_calls)
+        # a few fixed rounds, as a single call takes seconds on the largest boards
+        return benchmark.pedantic(func, rounds=ROUNDS)
+
+    return _run_benchmark
+
+
+@pytest.mark.parametrize("post_count", POST_COUNTS)
+class TestBoardBenchmarks:
+    @pytest.fixture(autouse=True)
+    def _setup_method(self, board, post_count):
+        self.topics, self.posts = create_board_posts(board, post_count)
+
+    def test_board_view(self, client, board, run_benchmark):
+        url = reverse("boards:board", kwargs={"slug": board.slug})
+        client.get(url)  # create the session
+        run_benchmark(lambda: client.get(url), max_num_queries=12)
+
+    def test_topic_fetch_view(self, client, board, run_benchmark):
+        url = reverse("boards:topic-fetch", kwargs={"slug": board.slug, "pk": self.topics[0].pk})
+        client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        run_benchmark(lambda: client.get(url), max_num_queries=10)
+
+    def test_post_fetch_view(self, client, board, run_benchmark):
+        post = self.posts[0]
+        url = reverse("boards:post-fetch", kwargs={"slug": board.slug, "topic_pk": post.topic_id, "pk": post.pk})
+        client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        run_benchmark(lambda: client.get(url), max_num_queries=10)
+
+    def test_post_reaction_view(self, client, board, run_benchmark):
+        post = self.posts[0]
+        url = reverse("boards:post-reaction", kwargs={"slug": board.slug, "topic_pk": post.topic_id, "pk": post.pk})
+        client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        # every call toggles the reaction, so rounds alternate between creating and deleting it
+        run_benchmark(lambda: client.post(url), max_num_queries=12)
+
+    def test_export(self, board, run_benchmark):
+        run_benchmark(lambda: Export.objects.create(board=board).generate(), max_num_queries=16)
+
+    def test_board_list_view(self, client, board, run_benchmark):
+        url = reverse("boards:board-list", kwargs={"board_list_type": "own"})
+        client.force_login(board.owner)
+        run_benchmark(lambda: client.get(url), max_num_queries=9)
@@ -1,51 +1,97 @@
-import re
+import time
+from types import SimpleNamespace
 
 import pytest
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
-from django.core.cache import cache
 
+from boards.presence import BoardPresence
 from boards.routing import websocket_urlpatterns
 
 
+def with_session(application, session_key):
+    async def app(scope, receive, send):
+        return await application({**scope, "session": SimpleNamespace(session_key=session_key)}, receive, send)
+
+    return app
+
+
 @pytest.mark.asyncio
 class TestBoardConsumer:
-    async def handle_communicator_connect(
-        self, application, board_slug, expected_sessions, existing_communicator=None
-    ):
-        new_communicator = WebsocketCommunicator(application, f"/ws/boards/{board_slug}/")
-        await new_communicator.connect()
-        message = await self.assert_receive_message(
-            board_slug,
-            expected_sessions,
-            existing_communicator or new_communicator,
-        )
-        assert "session_connected" in message
-        return new_communicator
-
-    async def handle_communicator_disconnect(self, board_slug, expected_sessions, communicator):
-        await communicator.disconnect()
-        message = await self.assert_receive_message(board_slug, expected_sessions, communicator)
-        assert "session_disconnected" in message
+    @pytest.fixture(autouse=True)
+    def _setup_method(self, board):
+        self.application = URLRouter(websocket_urlpatterns)
+        self.presence = BoardPresence(board.slug)
 
-    async def assert_receive_message(self, board_slug, expected_sessions, communicator):
-        message = await communicator.receive_from()
-        assert f'"sessions": {expected_sessions}' in message
-        connected = int(re.findall(r"\d+", message)[0])
-        assert await cache.aget(f"board-{board_slug}") == connected
-        return message
+    async def connect(self, board, session_key=None):
+        application = self.application if session_key is None else with_session(self.application, session_key)
+        communicator = WebsocketCommunicator(application, f"/ws/boards/{board.slug}/")
+        connected, _ = await communicator.connect()
+        assert connected, "Could not connect"
+        return communicator
 
     async def test_session_connect_disconnect_websocket_message(self, board):
-        application = URLRouter(websocket_urlpatterns)
-        board_group_name = f"board-{board.slug}"
-        assert await cache.aget(board_group_name) is None
+        communicator1 = await self.connect(board)
+        message = await communicator1.receive_json_from()
+        assert message["type"] == "session_connected"
+        assert message["sessions"] == 1
+        assert message["heartbeat_interval"] > 0
 
-        communicator1 = await self.handle_communicator_connect(application, board.slug, 1)
-        communicator2 = await self.handle_communicator_connect(application, board.slug, 2, communicator1)
+        communicator2 = await self.connect(board)
+        assert (await communicator2.receive_json_from())["sessions"] == 2  # noqa: PLR2004
+        message = await communicator1.receive_json_from()
+        assert message == {"type": "session_connected", "sessions": 2}
 
         await communicator2.disconnect()
-        await self.assert_receive_message(board.slug, 1, communicator1)
-        assert await cache.aget(board_group_name) == 1
+        message = await communicator1.receive_json_from()
+        assert message == {"type": "session_disconnected", "sessions": 1}
+        assert await self.presence.get_session_count() == 1
+
+        await communicator1.disconnect()
+        assert await self.presence.client.exists(self.presence.key) == 0
+
+    async def test_unique_sessions(self, board):
+        communicator1 = await self.connect(board, "session1")
+        assert (await communicator1.receive_json_from())["sessions"] == 1
+        communicator2 = await self.connect(board, "session1")
+        assert (await communicator2.receive_json_from())["sessions"] == 1
+        assert await communicator1.receive_nothing()  # count did not change
+
+        communicator3 = await self.connect(board, "session2")
+        assert (await communicator3.receive_json_from())["sessions"] == 2  # noqa: PLR2004
+        assert (await communicator1.receive_json_from())["sessions"] == 2  # noqa: PLR2004
 
+        for communicator in [communicator1, communicator2, communicator3]:
+            await communicator.disconnect()
+
+    async def test_expired_connections_not_counted(self, board):
+        await self.presence.client.zadd(self.presence.key, {"crashed|channel": time.time() - 1})
+        communicator = await self.connect(board)
+        assert (await communicator.receive_json_from())["sessions"] == 1
+        await communicator.disconnect()
+
+    async def test_heartbeat(self, board):
+        communicator = await self.connect(board, "session1")
+        await communicator.receive_json_from()
+        client = self.presence.client
+        ((_, expiry),) = await client.zrange(self.presence.key, 0, -1, withscores=True)
+
+        await client.zadd(self.presence.key, {"other|channel": time.time() + 60})
+        await communicator.send_json_to({"type": "heartbeat"})
+        message = await communicator.receive_json_from()
+        assert message == {"type": "sessions_updated", "sessions": 2}
+        await client.zrem(self.presence.key, "other|channel")
+        ((_, new_expiry),) = await client.zrange(self.presence.key, 0, -1, withscores=True)
+        assert new_expiry > expiry
+        await communicator.disconnect()
+
+    async def test_broadcast_throttled(self, board, settings):
+        settings.BOARD_PRESENCE_BROADCAST_INTERVAL = 60
+        communicator1 = await self.connect(board)
+        assert (await communicator1.receive_json_from())["sessions"] == 1
+        communicator2 = await self.connect(board)
+        assert (await communicator2.receive_json_from())["sessions"] == 2  # noqa: PLR2004
+        assert await communicator1.receive_nothing()
+
+        await communicator2.disconnect()
         await communicator1.disconnect()
-        assert await cache.aget(board_group_name) is None
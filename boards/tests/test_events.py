@@ -0,0 +1,136 @@
+import contextlib
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import transaction
+
+from boards import events
+from boards.events import BoardEventBuffer, send_board_event
+from boards.models import Post
+from boards.routing import websocket_urlpatterns
+
+
+class TestBoardEventBuffer:
+    @pytest.fixture
+    def sent(self, monkeypatch):
+        sent = []
+        monkeypatch.setattr(events, "send_board_events", lambda group_name, events: sent.append((group_name, events)))
+        return sent
+
+    def test_events_coalesced(self, sent):
+        buffer = BoardEventBuffer(60)
+        buffer.add("board-a", {"type": "post_updated", "post_pk": "1"})
+        buffer.add("board-a", {"type": "reaction_updated", "post_pk": "1"})
+        buffer.add("board-a", {"type": "post_updated", "post_pk": "1"})
+        buffer.add("board-a", {"type": "post_updated", "post_pk": "2"})
+        buffer.add("board-a", {"type": "post_deleted", "post_pk": "3"})
+        buffer.add("board-a", {"type": "post_deleted", "post_pk": "3"})
+        buffer.add("board-a", {"type": "export_progress", "export_pk": "4", "progress": 10})
+        buffer.add("board-a", {"type": "export_progress", "export_pk": "4", "progress": 20})
+        buffer.add("board-b", {"type": "board_updated"})
+        buffer.add("board-b", {"type": "board_updated"})
+        assert sent == []
+
+        buffer.flush()
+        assert sent == [
+            (
+                "board-a",
+                [
+                    {"type": "post_updated", "post_pk": "1"},
+                    {"type": "reaction_updated", "post_pk": "1"},
+                    {"type": "post_updated", "post_pk": "2"},
+                    {"type": "post_deleted", "post_pk": "3"},
+                    {"type": "post_deleted", "post_pk": "3"},
+                    {"type": "export_progress", "export_pk": "4", "progress": 20},
+                ],
+            ),
+            ("board-b", [{"type": "board_updated"}]),
+        ]
+        assert buffer.timer is None
+
+        sent.clear()
+        buffer.flush()
+        assert sent == []
+
+    def test_events_flushed_after_window(self, sent):
+        buffer = BoardEventBuffer(0.01)
+        buffer.add("board-a", {"type": "post_updated", "post_pk": "1"})
+        timer = buffer.timer
+        buffer.add("board-a", {"type": "post_updated", "post_pk": "2"})
+        assert buffer.timer is timer
+        timer.join(1)
+        assert sent == [
+            ("board-a", [{"type": "post_updated", "post_pk": "1"}, {"type": "post_updated", "post_pk": "2"}])
+        ]
+
+    @pytest.mark.asyncio
+    async def test_board_events_websocket_message(self, board):
+        application = URLRouter(websocket_urlpatterns)
+        communicator = WebsocketCommunicator(application, f"/ws/boards/{board.slug}/")
+        connected, _ = await communicator.connect()
+        assert connected, "Could not connect"
+        message = await communicator.receive_json_from()
+        assert message["type"] == "session_connected"
+
+        board_events = [{"type": "post_updated", "post_pk": "1"}, {"type": "topic_updated", "topic_pk": "2"}]
+        await get_channel_layer().group_send(f"board-{board.slug}", {"type": "board_events", "events": board_events})
+        message = await communicator.receive_json_from()
+        assert message == {"type": "board_events", "events": board_events}
+        await communicator.disconnect()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestOutboundEventQueue:
+    @pytest.fixture
+    def published(self, monkeypatch):
+        published = []
+        monkeypatch.setattr(events, "publish_board_events", published.append)
+        return published
+
+    def test_published_on_commit(self, published):
+        with transaction.atomic():
+            send_board_event("board-a", {"type": "post_deleted", "post_pk": "1"})
+            send_board_event("board-b", {"type": "post_deleted", "post_pk": "2"})
+            assert published == []
+        assert published == [
+            [
+                ("board-a", {"type": "post_deleted", "post_pk": "1"}),
+                ("board-b", {"type": "post_deleted", "post_pk": "2"}),
+            ]
+        ]
+
+        send_board_event("board-a", {"type": "board_updated"})
+        assert published[-1] == [("board-a", {"type": "board_updated"})]
+
+    def test_not_published_on_rollback(self, published):
+        with contextlib.suppress(RuntimeError), transaction.atomic():
+            send_board_event("board-a", {"type": "post_deleted", "post_pk": "1"})
+            raise RuntimeError
+        assert published == []
+
+        with transaction.atomic():
+            send_board_event("board-a", {"type": "post_deleted", "post_pk": "2"})
+            with contextlib.suppress(RuntimeError), transaction.atomic():
+                send_board_event("board-a", {"type": "post_deleted", "post_pk": "3"})
+                raise RuntimeError
+        assert published == [[("board-a", {"type": "post_deleted", "post_pk": "2"})]]
+
+    def test_published_in_order_across_savepoints(self, published):
+        with transaction.atomic():
+            send_board_event("board-a", {"type": "post_deleted", "post_pk": "1"})
+            with transaction.atomic():
+                send_board_event("board-a", {"type": "post_deleted", "post_pk": "2"})
+            with contextlib.suppress(RuntimeError), transaction.atomic():
+                send_board_event("board-a", {"type": "post_deleted", "post_pk": "3"})
+                raise RuntimeError
+            send_board_event("board-a", {"type": "post_deleted", "post_pk": "4"})
+        assert [event["post_pk"] for batch in published for _, event in batch] == ["1", "2", "4"]
+
+    def test_bulk_delete_published_once(self, published, topic, post_factory):
+        posts = post_factory.create_batch(3, topic=topic)
+        published.clear()
+        Post.objects.filter(topic=topic).delete()
+        assert len(published) == 1
+        assert {event["post_pk"] for _, event in published[0]} == {str(post.pk) for post in posts}
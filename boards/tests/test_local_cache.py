@@ -0,0 +1,106 @@
+import json
+import time
+
+import pytest
+from cacheops import cached_as, invalidate_all
+from cacheops.redis import redis_client
+
+from boards import local_cache as local_cache_module
+from boards.local_cache import INVALIDATION_CHANNEL, LocalCache
+from boards.models import Topic
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    cache = LocalCache(max_size=3, timeout=60)
+    monkeypatch.setattr(local_cache_module, "local_cache", cache)
+    yield cache
+    cache.stop_listener()
+
+
+class TestLocalCache:
+    def test_lru_bounded(self, local_cache):
+        for key in ["a", "b", "c"]:
+            local_cache.set(key, key.encode(), {}, local_cache.generation)
+        assert local_cache.get("a") == b"a"
+        local_cache.set("d", b"d", {}, local_cache.generation)
+        assert local_cache.get("b") is None  # least recently used
+        assert local_cache.get("a") == b"a"
+        stats = local_cache.stats()
+        assert stats["size"] == local_cache.max_size
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 2  # noqa: PLR2004
+        assert stats["misses"] == 1
+
+    def test_timeout(self, monkeypatch, local_cache):
+        local_cache.set("a", b"a", {}, local_cache.generation)
+        now = time.monotonic()
+        monkeypatch.setattr(local_cache_module.time, "monotonic", lambda: now + local_cache.timeout)
+        assert local_cache.get("a") is None
+
+    def test_invalidate(self, local_cache):
+        local_cache.set("topic1", b"1", {"boards_topic": [{"id": 1}]}, local_cache.generation)
+        local_cache.set("topic2", b"2", {"boards_topic": [{"id": 2}]}, local_cache.generation)
+        local_cache.set("topics", b"all", {"boards_topic": [{}]}, local_cache.generation)
+
+        local_cache.invalidate("boards_post", {"id": "1"})
+        assert local_cache.stats()["size"] == 3  # noqa: PLR2004
+        local_cache.invalidate("boards_topic", {"id": "1", "subject": "Topic"})
+        assert local_cache.get("topic1") is None
+        assert local_cache.get("topics") is None
+        assert local_cache.get("topic2") == b"2"
+        local_cache.invalidate("boards_topic")
+        assert local_cache.get("topic2") is None
+
+    def test_not_stored_when_invalidated_during_read(self, local_cache):
+        generation = local_cache.generation
+        local_cache.invalidate("boards_topic")
+        local_cache.set("a", b"a", {"boards_topic": [{}]}, generation)
+        assert local_cache.get("a") is None
+
+    def test_invalidation_published(self, local_cache):
+        local_cache.set("a", b"a", {"boards_topic": [{"id": 1}]}, local_cache.generation)
+        # as if published by another process
+        redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"table": "boards_topic", "obj_dict": {"id": "1"}}))
+        for _ in range(50):
+            if local_cache.get("a") is None:
+                break
+            time.sleep(0.1)
+        assert local_cache.get("a") is None
+
+    def test_invalidate_all(self, monkeypatch, local_cache):
+        local_cache.set("a", b"a", {"boards_topic": [{"id": 1}]}, local_cache.generation)
+        local_cache.set("b", b"b", {"boards_post": [{}]}, local_cache.generation)
+        published = []
+        monkeypatch.setattr(redis_client, "flushdb", lambda: None)  # the redis database is shared by the tests
+        monkeypatch.setattr(redis_client, "publish", lambda *args: published.append(args))
+        invalidate_all()
+        assert local_cache.get("a") is None
+        assert local_cache.get("b") is None
+        assert published == [(INVALIDATION_CHANNEL, json.dumps({"table": None, "obj_dict": None}))]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cached_as_served_locally(monkeypatch, local_cache, topic):
+    calls = []
+
+    @cached_as(Topic.objects.filter(pk=topic.pk))
+    def get_subject():
+        calls.append(1)
+        return Topic.objects.get(pk=topic.pk).subject
+
+    mget_calls = []
+    mget = redis_client.mget
+    monkeypatch.setattr(redis_client, "mget", lambda *args: mget_calls.append(args) or mget(*args))
+
+    assert get_subject() == topic.subject
+    assert get_subject() == topic.subject  # read from redis, and kept locally
+    mget_count = len(mget_calls)
+    assert get_subject() == topic.subject
+    assert len(mget_calls) == mget_count
+    assert calls == [1]
+
+    topic.subject = "Updated"
+    topic.save()
+    assert get_subject() == "Updated"
+    assert local_cache.stats()["invalidations"] >= 1
@@ -4,8 +4,10 @@ import pytest
 from django.contrib.auth.models import Group
 from django.core.management import call_command
 from django.template.defaultfilters import pluralize
+from django.test import Client
+from django.urls import reverse
 
-from boards.models import Post, PostImage
+from boards.models import BgImage, Post, PostImage, ReactionCount
 
 # Test data
 test_data = [
@@ -24,6 +26,26 @@ test_data = [
 ]
 
 
+class TestFragmentCacheStats:
+    @pytest.mark.django_db(transaction=True)
+    def test_command(self, board, topic, post_factory):
+        post_factory.create_batch(2, topic=topic)
+
+        def get_fragment_count():
+            out = StringIO()
+            call_command("fragment_cache_stats", stdout=out)
+            (line,) = [line for line in out.getvalue().splitlines() if line.startswith(f"{board.slug}:")]
+            return int(line.split()[1])
+
+        Client().get(reverse("boards:board", kwargs={"slug": board.slug}))
+        fragment_count = get_fragment_count()
+        assert fragment_count > 0
+
+        # fragments are shared by every visitor, not kept per session
+        Client().get(reverse("boards:board", kwargs={"slug": board.slug}))
+        assert get_fragment_count() == fragment_count
+
+
 class TestGenerateBgImageThumbnails:
     @pytest.mark.parametrize("image_count", [0, 1, 2])
     def test_command(self, bg_image_factory, image_count):
@@ -34,6 +56,18 @@ class TestGenerateBgImageThumbnails:
 
         assert f"Thumbnails generated for {image_count} image{pluralize(image_count)}." in out.getvalue()
 
+    def test_missing(self, bg_image_factory):
+        bg_image_factory.create_batch(2)
+        image = bg_image_factory()
+        BgImage.objects.filter(pk=image.pk).update(renditions={})
+
+        out = StringIO()
+        call_command("generate_background_image_thumbnails", "--missing", stdout=out)
+
+        assert "Thumbnails generated for 1 image." in out.getvalue()
+        image.refresh_from_db()
+        assert "original" in image.renditions
+
 
 class TestPopulateModeratorPerms:
     @pytest.mark.parametrize("group_exists", [(True), (False)])
@@ -89,3 +123,44 @@ class TestPostImageCleanup:
         for i in range(matched_count, len(images)):
             with pytest.raises(PostImage.DoesNotExist):
                 images[i].refresh_from_db()
+
+
+class TestRebuildPostTreeStats:
+    def test_command(self, post, post_factory):
+        reply = post_factory(topic=post.topic, parent=post)
+        post_factory.create_batch(2, topic=post.topic, parent=reply)
+        Post.objects.filter(pk=post.pk).update(descendant_count=10)
+        Post.objects.filter(pk=reply.pk).update(descendant_count=0)
+
+        out = StringIO()
+        call_command("rebuild_post_tree_stats", stdout=out)
+
+        assert "Fixed the descendant count of 2 posts." in out.getvalue()
+        expected = Post.get_descendant_counts(Post.objects.all())
+        assert dict(Post.objects.values_list("pk", "descendant_count")) == expected
+        post.refresh_from_db()
+        assert post.get_descendant_count == 3  # noqa: PLR2004
+
+        out = StringIO()
+        call_command("rebuild_post_tree_stats", stdout=out)
+        assert "Fixed the descendant count of 0 posts." in out.getvalue()
+
+
+class TestRebuildReactionCounts:
+    def test_command(self, post_factory, reaction_factory):
+        posts = post_factory.create_batch(2)
+        for score in [1, -1, -1]:
+            reaction_factory(post=posts[0], reaction_type="v", reaction_score=score)
+        reaction_factory(post=posts[0], reaction_type="l")
+        reaction_factory(post=posts[1], reaction_type="s", reaction_score=4)
+        expected = list(ReactionCount.objects.order_by("post_id", "reaction_type").values())
+        ReactionCount.objects.all().delete()
+        ReactionCount.objects.create(post=posts[1], reaction_type="l", count=10)
+
+        out = StringIO()
+        call_command("rebuild_reaction_counts", stdout=out)
+
+        assert "Rebuilt 3 reaction counts." in out.getvalue()
+        rebuilt = list(ReactionCount.objects.order_by("post_id", "reaction_type").values())
+        assert [{**row, "id": None} for row in rebuilt] == [{**row, "id": None} for row in expected]
+        assert posts[0].get_reaction_score("v") == (1, 2)
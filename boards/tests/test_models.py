@@ -1,13 +1,15 @@
 import csv
+import json
 import re
-from io import StringIO
+from io import BytesIO, StringIO
 from pathlib import Path
 
 import factory
+import pyarrow.parquet as pq
 import pytest
 from django.apps import apps
 from django.conf import settings
-from django.core.files.storage import default_storage
+from django.core.files.storage import InMemoryStorage, default_storage
 from django.db import IntegrityError
 from django.template.defaultfilters import date
 from django.urls import reverse
@@ -31,6 +33,15 @@ from boards.models import (
     Reaction,
     Topic,
 )
+from boards.renditions import (
+    FORMAT_MIME_TYPES,
+    THUMBNAIL_FORMATS,
+    convert_rendition_mode,
+    get_rendition_sizes,
+    render_encoded_size,
+    render_size,
+)
+from boards.tasks import create_thumbnails
 from jotlet.tests.utils import create_session
 from jotlet.utils import offset_date
 
@@ -222,6 +233,7 @@ class TestPostModel:
         post_factory.create_batch(batch_count, topic=post.topic, parent=post)
         post_factory.create_batch(batch_count, topic=post.topic, parent=post_factory(topic=post.topic))
         assert Post.objects.count() == (batch_count + 1) * 2
+        post.refresh_from_db()
         assert post.get_descendant_count == batch_count
 
         post2 = post_factory(topic=post.topic, parent=post)
@@ -229,6 +241,26 @@ class TestPostModel:
         post.refresh_from_db()
         assert post.get_descendant_count == batch_count * 2 + 1
 
+    def test_descendant_count_on_delete(self, post, post_factory):
+        reply = post_factory(topic=post.topic, parent=post)
+        nested_reply = post_factory(topic=post.topic, parent=reply)
+        post_factory.create_batch(2, topic=post.topic, parent=nested_reply)
+        post_factory(topic=post.topic, parent=post)
+        post.refresh_from_db()
+        assert post.descendant_count == 5  # noqa: PLR2004
+
+        nested_reply.refresh_from_db()
+        nested_reply.delete()
+        post.refresh_from_db()
+        reply.refresh_from_db()
+        assert post.descendant_count == 2  # noqa: PLR2004
+        assert reply.descendant_count == 0
+
+        Post.objects.filter(parent=post).delete()
+        post.refresh_from_db()
+        assert post.descendant_count == 0
+        assert Post.get_descendant_counts(Post.objects.all()) == {post.pk: 0}
+
     def assert_and_set_reaction_type(self, post, reaction_type):
         assert post.get_reaction_score() == 0
         post.topic.board.preferences.reaction_type = reaction_type
@@ -348,6 +380,56 @@ class TestPostModel:
         post.save()
         post_image2.refresh_from_db()
         assert post_image2.post == post
+        pytest.raises(PostImage.DoesNotExist, PostImage.objects.get, pk=post_image1.pk)
+
+    def test_cleanup_only_when_images_changed(self, monkeypatch, topic, post_factory, post_image_factory):
+        topic.board.preferences.allow_image_uploads = True
+        topic.board.preferences.save()
+        post_image = post_image_factory(board=topic.board)
+        cleanups = []
+        monkeypatch.setattr("boards.models.post_image_cleanup", lambda post: cleanups.append(post) or (lambda: None))
+
+        post = post_factory(topic=topic, content="no images")
+        assert cleanups == []
+
+        post.content = f"![image]({post_image.image.url}) with an image"
+        post.save()
+        assert cleanups == [post]
+
+        post.content = f"![image]({post_image.image.url}) with the same image"
+        post.save()
+        post = Post.objects.get(pk=post.pk)
+        post.approved = False
+        post.save()
+        assert len(cleanups) == 1
+
+        post.content = "image removed"
+        post.save()
+        assert len(cleanups) == 2  # noqa: PLR2004
+
+    def test_referenced_images(self, topic, post_factory, post_image_factory):
+        post_image1, post_image2 = post_image_factory.create_batch(2, board=topic.board)
+        other_board_image = post_image_factory()
+        post = post_factory(
+            topic=topic, content=f"![image]({post_image1.image.url}) ![image]({other_board_image.image.url})"
+        )
+        assert set(post.referenced_images.all()) == {post_image1}
+
+        post.content = f"![image]({post_image2.image.url}?v=2)"
+        post.save()
+        assert set(post.referenced_images.all()) == {post_image2}
+        assert set(post_image2.referencing_posts.all()) == {post}
+
+    def test_update_does_not_fetch_post(self, post, django_assert_num_queries):
+        post = Post.objects.get(pk=post.pk)
+        assert post.get_changed_fields() == set()
+        post.content = "updated"
+        assert post.get_changed_fields() == {"content"}
+        # cacheops' copy of the old post, the update, topic, board and the root post of the post_updated message
+        with django_assert_num_queries(5):
+            post.save()
+        assert post.get_changed_fields() == set()
+        assert post.get_original_value("content") == "updated"
 
 
 class TestReactionModel:
@@ -450,25 +532,26 @@ class TestImageModel:
         )
 
     def test_get_webp(self):
-        img = Image.objects.first()
-        pilimage = PILImage.open(img.get_webp)
-        assert pilimage.format == "WEBP"
+        img = Image.objects.filter(image_type="b").first()
+        with img.get_webp.open() as file:
+            pilimage = PILImage.open(file)
+            assert pilimage.format == "WEBP"
+            assert pilimage.size == (img.image.width, img.image.height)
 
-    @pytest.mark.parametrize("image_type", [image_type[0] for image_type in IMAGE_TYPE])
     @pytest.mark.parametrize("alternate_resolution", settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS)
-    def test_thumbnail_url_and_dimensions(self, image_type, alternate_resolution):
-        img = Image.objects.filter(image_type=image_type).first()
+    def test_thumbnail_url_and_dimensions(self, alternate_resolution):
+        img = Image.objects.filter(image_type="b").first()
         small_thumb = img.get_small_thumbnail
         large_thumb = img.get_large_thumbnail
 
         def check_thumb_exists(thumb):
             assert thumb is not None
-            assert f"{settings.MEDIA_URL}cache/" in thumb.url
-            assert default_storage.exists(Path(settings.MEDIA_ROOT) / thumb.name)
+            assert f"{settings.MEDIA_URL}renditions/b/{img.pk}/" in thumb.url
+            assert default_storage.exists(thumb.name)
 
             name = Path(thumb.name).with_suffix("")
             ext = Path(thumb.name).suffix
-            assert default_storage.exists(Path(settings.MEDIA_ROOT) / f"{name}@{alternate_resolution}x{ext}")
+            assert default_storage.exists(f"{name}@{alternate_resolution}x{ext}")
 
         def check_thumb_dimensions(thumb, width, height):
             assert thumb.width <= width
@@ -481,6 +564,107 @@ class TestImageModel:
         check_thumb(small_thumb, settings.SMALL_THUMBNAIL_WIDTH, settings.SMALL_THUMBNAIL_HEIGHT)
         check_thumb(large_thumb, img.image.width / 2, img.image.height / 2)
 
+    def test_thumbnail_without_renditions(self):
+        img = Image.objects.filter(image_type="p").first()
+        assert img.renditions == {}
+        assert img.get_small_thumbnail == img.image
+        assert img.get_large_thumbnail_webp == img.image
+
+    def test_renditions(self, bg_image_factory, django_capture_on_commit_callbacks):
+        img = bg_image_factory(image__format="GIF", image__filename="test.gif")
+        img.refresh_from_db()
+        assert Path(img.image.name).suffix == ".jpg"
+        assert set(img.renditions) >= {
+            "full_webp",
+            *(f"{size}_{ext}" for size in ["large", "medium", "small"] for ext in ["jpeg", "webp"]),
+        }
+        assert img.renditions["original"]["name"] == img.image.name
+        for key, rendition in img.renditions.items():
+            assert default_storage.exists(rendition["name"])
+            assert rendition["url"] == default_storage.url(rendition["name"])
+            assert rendition["size"] == default_storage.size(rendition["name"])
+            with default_storage.open(rendition["name"]) as file:
+                assert PILImage.open(file).size == (rendition["width"], rendition["height"])
+            if key != "original":
+                assert Path(rendition["name"]).stem == key
+
+        old_renditions = img.renditions
+        create_thumbnails(img)()
+        img.refresh_from_db()
+        assert img.renditions.keys() == old_renditions.keys()
+        assert not any(
+            default_storage.exists(rendition["name"])
+            for key, rendition in old_renditions.items()
+            if key != "original"
+        )
+        assert default_storage.exists(img.image.name)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            img.delete()
+        assert not any(
+            default_storage.exists(rendition["name"])
+            for key, rendition in img.renditions.items()
+            if key != "original"
+        )
+
+    def test_renditions_in_image_storage(self, monkeypatch, bg_image_factory, django_capture_on_commit_callbacks):
+        storage = InMemoryStorage()
+        monkeypatch.setattr(Image._meta.get_field("image"), "storage", storage)
+        img = bg_image_factory(image__format="GIF", image__filename="test.gif")
+        img.refresh_from_db()
+        assert img.renditions
+        for rendition in img.renditions.values():
+            assert storage.exists(rendition["name"])
+            assert not default_storage.exists(rendition["name"])
+            assert rendition["url"] == storage.url(rendition["name"])
+        with img.get_webp.open() as file:
+            assert PILImage.open(file).format == "WEBP"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            img.delete()
+        assert not any(storage.exists(rendition["name"]) for rendition in img.renditions.values())
+
+    def test_get_srcset(self):
+        img = Image.objects.filter(image_type="b").first()
+        expected = [f"{img.renditions['small_webp']['url']} 1x"] + [
+            f"{img.renditions[f'small_webp@{resolution}x']['url']} {resolution}x"
+            for resolution in settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS
+        ]
+        assert img.get_srcset("small_webp") == ", ".join(expected)
+        post_img = Image.objects.filter(image_type="p").first()
+        assert post_img.get_srcset("small_webp") == f"{post_img.image.url} 1x"
+
+    def test_get_sources(self):
+        img = Image.objects.filter(image_type="b").first()
+        sources = img.get_sources("medium")
+        assert [source.mime_type for source in sources] == [
+            FORMAT_MIME_TYPES[output_format] for output_format in THUMBNAIL_FORMATS
+        ]
+        assert sources[-1].srcset == img.get_srcset("medium_jpeg")
+        for source in sources:
+            for resolution, rendition in source.renditions:
+                assert rendition.width <= settings.MEDIUM_THUMBNAIL_WIDTH * resolution
+        assert Image.objects.filter(image_type="p").first().get_sources("medium") == []
+
+    def test_render_encoded_size(self):
+        img = Image.objects.filter(image_type="b").first()
+        with img.image.open("rb") as file:
+            data = file.read()
+        pil_image = convert_rendition_mode(PILImage.open(BytesIO(data)))
+        for size in get_rendition_sizes(pil_image.width, pil_image.height):
+            rendered = render_size(pil_image, size)
+            encoded = render_encoded_size(data, size)
+            assert encoded.keys() == rendered.keys()
+            for output_format, (_, width, height) in encoded.items():
+                assert (width, height) == rendered[output_format][1:]
+
+    @pytest.mark.skipif("AVIF" in THUMBNAIL_FORMATS, reason="Pillow can encode AVIF")
+    def test_get_sources_without_avif(self):
+        img = Image.objects.filter(image_type="b").first()
+        assert not any(rendition["name"].endswith(".avif") for rendition in img.renditions.values())
+        for size_name in ["large", "medium"]:
+            assert [source.mime_type for source in img.get_sources(size_name)] == ["image/webp", "image/jpeg"]
+
     @pytest.mark.parametrize("image_type", [image_type[0] for image_type in IMAGE_TYPE])
     def test_image_tag(self, image_type):
         img = Image.objects.filter(image_type=image_type).first()
@@ -500,11 +684,32 @@ class TestImageModel:
         post_image_factory()
         assert PostImage.objects.count() == count_before + 1
 
+    @pytest.mark.parametrize("factory_name", ["bg_image_factory", "post_image_factory"])
+    def test_shared_content(self, request, factory_name, django_capture_on_commit_callbacks):
+        image_factory = request.getfixturevalue(factory_name)
+        img1, img2 = image_factory.create_batch(2, image__color="red")
+        img1.refresh_from_db()
+        img2.refresh_from_db()
+        assert img1.content_hash
+        assert img2.content_hash == img1.content_hash
+        assert img2.image.name == img1.image.name
+        assert img2.renditions == img1.renditions
+        assert image_factory(image__color="green").image.name != img1.image.name
+
+        names = [img1.image.name] + [rendition["name"] for rendition in img1.renditions.values()]
+        with django_capture_on_commit_callbacks(execute=True):
+            img1.delete()
+        assert all(default_storage.exists(name) for name in names)
+        with django_capture_on_commit_callbacks(execute=True):
+            img2.delete()
+        assert not any(default_storage.exists(name) for name in names)
+
 
 class TestExportModel:
     @pytest.mark.parametrize(("topic_count"), [1, 5])
     @pytest.mark.parametrize(("post_count"), [0, 1, 10])
-    def test_export_save(self, board, topic_factory, post_factory, topic_count, post_count):
+    def test_export_save(self, board, topic_factory, post_factory, topic_count, post_count, monkeypatch):
+        monkeypatch.setattr(Export, "CHUNK_SIZE", 3)
         topics = topic_factory.create_batch(topic_count, board=board)
 
         # want posts in different topics to have mixed created times
@@ -522,7 +727,15 @@ class TestExportModel:
         expected_file_content = csv_output.getvalue()
 
         export = Export.objects.create(board=board)
+        assert export.status == "p"
+        assert not export.file
+
+        export.generate()
+        export.refresh_from_db()
+        assert export.is_done
+        assert export.progress == 100  # noqa: PLR2004
         assert export.post_count == topic_count * post_count
+        assert export.file.size == len(expected_file_content.encode())
         with export.file.open() as file:
             file_content = file.read().decode()
 
@@ -553,3 +766,58 @@ class TestExportModel:
         exports = Export.objects.filter(board=board)
         assert exports.count() == Export.MAX_COUNT
         assert oldest_export not in exports
+
+    def get_typed_export(self, board, topic_factory, post_factory, reaction_factory):
+        board.preferences.reaction_type = "v"
+        board.preferences.save()
+        topic = topic_factory(board=board)
+        post = post_factory(topic=topic)
+        reply = post_factory(topic=topic, parent=post, approved=False)
+        for score in [1, 1, -1]:
+            reaction_factory(post=post, reaction_type="v", reaction_score=score)
+
+        export = Export.objects.create(board=board)
+        export.generate()
+        return export, topic, post, reply
+
+    def test_export_jsonl(self, board, topic_factory, post_factory, reaction_factory):
+        export, topic, post, reply = self.get_typed_export(board, topic_factory, post_factory, reaction_factory)
+
+        with export.jsonl_file.open() as file:
+            rows = [json.loads(line) for line in file.read().decode().splitlines()]
+        assert [row["id"] for row in rows] == [str(post.pk), str(reply.pk)]
+        assert rows[0]["parent_id"] is None
+        assert rows[1]["parent_id"] == rows[1]["root_id"] == str(post.pk)
+        assert [row["depth"] for row in rows] == [0, 1]
+        assert [row["approved"] for row in rows] == [True, False]
+        assert rows[0]["topic_subject"] == topic.subject
+        assert (rows[0]["reaction_positive_count"], rows[0]["reaction_negative_count"]) == (2, 1)
+        assert rows[1]["reaction_count"] == 0
+
+    def test_export_parquet(self, board, topic_factory, post_factory, reaction_factory):
+        export, topic, post, reply = self.get_typed_export(board, topic_factory, post_factory, reaction_factory)
+
+        with export.parquet_file.open() as file:
+            table = pq.read_table(file)
+        assert table.column_names == [name for name, _ in Export.COLUMNS.values()]
+        rows = table.to_pylist()
+        assert [row["id"] for row in rows] == [post.pk, reply.pk]
+        assert rows[1]["root_id"] == post.pk
+        assert rows[0]["approved"] is True
+        assert rows[0]["created_at"] == Post.objects.get(pk=post.pk).created_at
+        assert rows[0]["topic_created_at"] == topic.created_at
+        assert (rows[0]["reaction_count"], rows[0]["reaction_score_sum"]) == (3, 1)
+
+    def test_generate_failed(self, board, monkeypatch):
+        export = Export.objects.create(board=board)
+
+        def get_export_rows():
+            msg = "export failed"
+            raise RuntimeError(msg)
+
+        monkeypatch.setattr(export, "get_export_rows", get_export_rows)
+        with pytest.raises(RuntimeError, match="export failed"):
+            export.generate()
+        export.refresh_from_db()
+        assert export.status == "f"
+        assert not export.file
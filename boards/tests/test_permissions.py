@@ -0,0 +1,86 @@
+import pytest
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.urls import reverse
+
+from boards.models import Board
+from boards.permissions import aget_board_permissions, get_board_permissions
+from jotlet.tests.utils import create_session
+
+
+class TestBoardPermissionContext:
+    @pytest.fixture
+    def permission_request(self, rf, board):
+        request = rf.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        create_session(request)
+        request.user = AnonymousUser()
+        return request
+
+    def test_computed_once_per_request_and_board(self, permission_request, board, board_factory):
+        permissions = get_board_permissions(permission_request, board)
+        assert get_board_permissions(permission_request, board) is permissions
+        assert get_board_permissions(permission_request, board_factory()) is not permissions
+
+    def test_moderator_looked_up_once(self, permission_request, board, django_assert_num_queries):
+        permissions = get_board_permissions(permission_request, board)
+        with django_assert_num_queries(1):
+            assert not permissions.is_moderator
+            assert not permissions.is_moderator
+
+    def test_owner(self, permission_request, board, user_staff):
+        permission_request.user = board.owner
+        permissions = get_board_permissions(permission_request, board)
+        assert permissions.is_owner
+        assert permissions.is_moderator
+        assert permissions.is_board_manager
+        assert permissions.export_allowed
+
+        permission_request.user = user_staff
+        del permission_request._board_permissions
+        permissions = get_board_permissions(permission_request, board)
+        assert not permissions.is_owner
+        assert permissions.is_board_manager
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_async(self, permission_request, board, user2):
+        board = await Board.objects.prefetch_related("preferences__moderators").aget(pk=board.pk)
+
+        async def auser():
+            return permission_request.user
+
+        permission_request.auser = auser
+        permissions = await aget_board_permissions(permission_request, board)
+        assert await aget_board_permissions(permission_request, board) is permissions
+        assert not permissions.is_moderator
+
+        permission = await Permission.objects.aget(codename="can_approve_posts")
+        await sync_to_async(user2.user_permissions.add)(permission)
+        permission_request.user = user2
+        del permission_request._board_permissions
+        assert (await aget_board_permissions(permission_request, board)).is_moderator
+
+    def test_post_permissions(self, permission_request, board, topic_factory, post_factory):
+        board.preferences.board_type = "r"
+        board.preferences.allow_guest_replies = True
+        board.preferences.save()
+        topic = topic_factory(board=board)
+        own_post = post_factory(topic=topic, session_key=permission_request.session.session_key)
+        other_post = post_factory(topic=topic)
+
+        permissions = get_board_permissions(permission_request, board)
+        assert permissions.post_create_allowed(topic)
+        assert permissions.is_post_owner(own_post)
+        assert not permissions.is_post_owner(other_post)
+        assert permissions.update_allowed(own_post)
+        assert not permissions.update_allowed(other_post)
+        assert permissions.delete_allowed(own_post)
+        assert not permissions.delete_allowed(other_post)
+        assert permissions.reply_create_allowed(other_post)
+
+        topic.locked = True
+        topic.save()
+        topic.invalidate_cached_properties()
+        assert not permissions.post_create_allowed(topic)
+        assert not permissions.update_allowed(own_post)
+        assert not permissions.export_allowed
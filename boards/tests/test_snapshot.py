@@ -0,0 +1,213 @@
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from boards.models import Post
+from boards.snapshot import BoardSnapshot, PostCursor, ReactionSummary
+from jotlet.tests.utils import create_session
+
+
+class TestBoardSnapshot:
+    @pytest.fixture
+    def snapshot_request(self, rf, board):
+        request = rf.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        create_session(request)
+        request.user = board.owner
+        return request
+
+    def create_board_posts(self, board, topic_factory, post_factory, reaction_factory, post_count):
+        topics = topic_factory.create_batch(2, board=board)
+        for topic in topics:
+            for post in post_factory.create_batch(post_count, topic=topic):
+                reply = post_factory(topic=topic, parent=post)
+                post_factory(topic=topic, parent=reply)
+                reaction_factory(post=post, reaction_type=board.preferences.reaction_type)
+        return topics
+
+    def test_post_tree(self, board, snapshot_request, topic_factory, post_factory):
+        topic1, topic2 = topic_factory.create_batch(2, board=board)
+        post1 = post_factory(topic=topic1)
+        post2 = post_factory(topic=topic1)
+        reply1 = post_factory(topic=topic1, parent=post1)
+        reply2 = post_factory(topic=topic1, parent=reply1)
+        post3 = post_factory(topic=topic2)
+
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert snapshot.topics == [topic1, topic2]
+        assert snapshot.get_topic_posts(topic1) == [post1, post2]
+        assert snapshot.get_topic_posts(topic2) == [post3]
+        assert snapshot.get_replies(post1) == [reply1]
+        assert snapshot.get_replies(reply1) == [reply2]
+        assert snapshot.get_replies(post2) == []
+        assert snapshot.get_descendant_count(post1) == 2  # noqa: PLR2004
+        assert snapshot.get_descendant_count(reply1) == 1
+        assert snapshot.get_descendant_count(post3) == 0
+        assert snapshot.get_post(reply2.pk).tree_depth == 2  # noqa: PLR2004
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_aload(self, board, snapshot_request, topic_factory, post_factory, reaction_factory):
+        topics = await sync_to_async(self.create_board_posts)(board, topic_factory, post_factory, reaction_factory, 2)
+
+        async def auser():
+            return snapshot_request.user
+
+        snapshot_request.auser = auser
+        expected = await sync_to_async(BoardSnapshot)(board, snapshot_request)
+        snapshot = await BoardSnapshot.aload(board, snapshot_request)
+        assert snapshot.topics == expected.topics
+        for topic in topics:
+            assert snapshot.get_topic_posts(topic) == expected.get_topic_posts(topic)
+        assert snapshot.posts == expected.posts
+        assert snapshot.descendant_counts == expected.descendant_counts
+        assert snapshot.reactions == expected.reactions
+        assert snapshot.has_reacted == expected.has_reacted
+
+    def test_topic_scope(self, board, snapshot_request, topic_factory, post_factory):
+        topic1, topic2 = topic_factory.create_batch(2, board=board)
+        post1 = post_factory(topic=topic1)
+        post2 = post_factory(topic=topic2)
+
+        snapshot = BoardSnapshot(board, snapshot_request, topic=topic1)
+        assert snapshot.topics == [topic1]
+        assert snapshot.get_post(post1.pk) == post1
+        with pytest.raises(post2.DoesNotExist):
+            snapshot.get_post(post2.pk)
+
+    def test_pagination(self, settings, board, snapshot_request, topic_factory, post_factory):
+        settings.TOPIC_POSTS_PAGE_SIZE = 2
+        topic1, topic2 = topic_factory.create_batch(2, board=board)
+        posts = sorted(post_factory.create_batch(5, topic=topic1), key=lambda post: (post.created_at, post.pk))
+        replies = [post_factory(topic=topic1, parent=post) for post in posts]
+        topic2_post = post_factory(topic=topic2)
+
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert {post.pk for post in snapshot.get_topic_posts(topic1)} == {post.pk for post in posts[:2]}
+        assert {post.pk for post in snapshot.get_replies(posts[0])} == {replies[0].pk}
+        assert snapshot.get_topic_posts(topic2) == [topic2_post]
+        assert snapshot.get_next_cursor(topic2) is None
+
+        pages = [snapshot.get_topic_posts(topic1)]
+        cursor = snapshot.get_next_cursor(topic1)
+        while cursor is not None:
+            snapshot = BoardSnapshot(
+                board, snapshot_request, topic=topic1, cursor=PostCursor.from_string(str(cursor))
+            )
+            pages.append(snapshot.get_topic_posts(topic1))
+            cursor = snapshot.get_next_cursor(topic1)
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert {post.pk for page in pages for post in page} == {post.pk for post in posts}
+
+    def test_pagination_excludes_newer_posts(self, board, snapshot_request, topic, post_factory):
+        post = post_factory(topic=topic)
+        cursor = PostCursor(post.created_at - timedelta(seconds=1), post.pk, post.created_at - timedelta(seconds=1))
+        snapshot = BoardSnapshot(board, snapshot_request, topic=topic, cursor=cursor)
+        assert snapshot.get_topic_posts(topic) == []
+
+    def test_post_scope(self, board, snapshot_request, topic, post_factory):
+        post = post_factory(topic=topic)
+        reply = post_factory(topic=topic, parent=post)
+        other_post = post_factory(topic=topic)
+
+        snapshot = BoardSnapshot(board, snapshot_request, topic=topic, post=reply)
+        assert snapshot.get_post(reply.pk).tree_depth == 1
+        with pytest.raises(Post.DoesNotExist):
+            snapshot.get_post(other_post.pk)
+        snapshot = BoardSnapshot(board, snapshot_request, topic=topic, post=post)
+        assert snapshot.get_replies(post) == [reply]
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError, match="Invalid"):
+            PostCursor.from_string("not~a~cursor")
+
+    @pytest.mark.parametrize(
+        ("reaction_type", "scores", "expected_score"),
+        [
+            ("l", [1, 1, 1], 3),
+            ("v", [1, -1, 1], (2, 1)),
+            ("s", [1, 2, 4], f"{(7 / 3):.2g}"),
+        ],
+    )
+    def test_reactions(
+        self, board, snapshot_request, post_factory, reaction_factory, reaction_type, scores, expected_score
+    ):
+        board.preferences.reaction_type = reaction_type
+        board.preferences.save()
+        post = post_factory(topic__board=board)
+        other_post = post_factory(topic=post.topic)
+        for score in scores:
+            reaction_factory(post=post, reaction_type=reaction_type, reaction_score=score)
+        own_reaction = reaction_factory(
+            post=other_post,
+            reaction_type=reaction_type,
+            reaction_score=scores[0],
+            session_key=snapshot_request.session.session_key,
+        )
+
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert snapshot.get_reactions(post).count == len(scores)
+        assert snapshot.get_reaction_score(post) == expected_score
+        assert snapshot.get_reaction_score(other_post) == other_post.get_reaction_score(reaction_type)
+        assert snapshot.get_has_reacted(post) == (False, None, 1)
+        assert snapshot.get_has_reacted(other_post) == (True, own_reaction.pk, scores[0])
+
+    def test_reactions_disabled(self, board, snapshot_request, post):
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert snapshot.get_reactions(post) == ReactionSummary()
+        assert snapshot.get_reaction_score(post) == 0
+
+    def test_is_owner(self, board, snapshot_request, post_factory):
+        session_post = post_factory(topic__board=board, session_key=snapshot_request.session.session_key)
+        user_post = post_factory(topic=session_post.topic, user=board.owner)
+        other_post = post_factory(topic=session_post.topic)
+
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert snapshot.get_is_owner(session_post)
+        assert snapshot.get_is_owner(user_post)
+        assert not snapshot.get_is_owner(other_post)
+
+    def test_without_request(self, board, post_factory, reaction_factory):
+        board.preferences.reaction_type = "l"
+        board.preferences.save()
+        post = post_factory(topic__board=board, session_key="")
+        reaction_factory(post=post, reaction_type="l", session_key="")
+
+        snapshot = BoardSnapshot(board)
+        assert not snapshot.get_is_owner(post)
+        assert snapshot.get_has_reacted(post) == (False, None, 1)
+        assert snapshot.get_reactions(post).count == 1
+
+    def test_additional_data(self, board, snapshot_request, post, chemdoodle_data_factory):
+        board.preferences.enable_chemdoodle = True
+        board.preferences.save()
+        chemdoodle_data = chemdoodle_data_factory(post=post)
+
+        snapshot = BoardSnapshot(board, snapshot_request)
+        assert snapshot.get_additional_data(post, "c") == chemdoodle_data
+        assert snapshot.get_additional_data(post, "m") is None
+        assert snapshot.get_additional_data(post) == [chemdoodle_data]
+
+    @pytest.mark.parametrize("reaction_type", ["n", "l"])
+    def test_query_count_constant(
+        self, rf, board_factory, topic_factory, post_factory, reaction_factory, reaction_type
+    ):
+        query_counts = []
+        for post_count in [1, 10]:
+            board = board_factory()
+            board.preferences.reaction_type = reaction_type
+            board.preferences.enable_chemdoodle = True
+            board.preferences.save()
+            self.create_board_posts(board, topic_factory, post_factory, reaction_factory, post_count)
+
+            request = rf.get(reverse("boards:board", kwargs={"slug": board.slug}))
+            create_session(request)
+            request.user = board.owner
+            with CaptureQueriesContext(connection) as queries:
+                BoardSnapshot(board, request)
+            query_counts.append(len(queries))
+
+        assert query_counts[0] == query_counts[1]
@@ -3,8 +3,8 @@ import datetime
 import pytest
 from freezegun import freeze_time
 
-from boards.models import Export
-from boards.tasks import export_cleanup
+from boards.models import Export, Post, Topic
+from boards.tasks import export_cleanup, invalidate_board_tree_cache
 from jotlet.utils import offset_date
 
 
@@ -21,3 +21,24 @@ class TestTasks:
             export_factory.create_batch(exports_count, created_at=datetime.datetime.now(tz=datetime.UTC))
         export_cleanup()
         assert Export.objects.count() == expected_count
+
+    @pytest.mark.django_db(transaction=True)
+    def test_invalidate_board_tree_cache(self, board, topic_factory, post_factory):
+        topics = topic_factory.create_batch(2, board=board)
+        posts = [post for topic in topics for post in post_factory.create_batch(3, topic=topic)]
+        for post in posts:
+            Post.objects.cache().get(pk=post.pk)
+        for topic in topics:
+            Topic.objects.cache().get(pk=topic.pk)
+
+        Topic.objects.update(subject="updated")
+        Post.objects.update(content="updated")
+        invalidate_board_tree_cache(board.pk)()
+
+        assert all(Topic.objects.cache().get(pk=topic.pk).subject == "updated" for topic in topics)
+        assert all(Post.objects.cache().get(pk=post.pk).content == "updated" for post in posts)
+
+    def test_board_preferences_save_defers_invalidation(self, board, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            board.preferences.save()
+        assert len(callbacks) == 1
@@ -1,4 +1,5 @@
 import re
+from io import BytesIO
 from itertools import product
 
 import pytest
@@ -9,14 +10,18 @@ from faker import Faker
 from PIL import Image as PILImage
 from PIL import ImageFile
 
-from boards.models import IMAGE_FORMATS, IMAGE_TYPE, Export
+from boards.models import IMAGE_FORMATS, IMAGE_TYPE, Export, Post
 from boards.utils import (
     generate_csv,
     get_export_upload_path,
     get_image_upload_path,
     get_is_moderator,
+    get_post_image_names,
     get_random_string,
+    invalidate_queryset,
+    open_image,
     process_image,
+    save_image,
 )
 
 
@@ -40,6 +45,35 @@ class TestUtils:
         assert len(randstr) == length
         assert randstr.isalnum()
 
+    def test_get_post_image_names(self):
+        content = (
+            "![image](/media/images/p/board/ab/1.webp?v=2) "
+            '<img src="https://cdn.example.com/images/p/board/cd/2.jpg#top" '
+            'srcset="/media/images/p/board/ef/3.webp 1x, /media/images/p/board/ef/3@2x.webp 2x">'
+        )
+        assert get_post_image_names(content) == {
+            "images/p/board/ab/1.webp",
+            "images/p/board/cd/2.jpg",
+            "images/p/board/ef/3.webp",
+            "images/p/board/ef/3@2x.webp",
+        }
+        assert get_post_image_names(None) == set()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_invalidate_queryset(self, topic, post_factory):
+        posts = post_factory.create_batch(3, topic=topic)
+        other_post = post_factory()
+        for post in [*posts, other_post]:
+            Post.objects.cache().get(pk=post.pk)
+
+        # update() bypasses cacheops invalidation, so the cached posts are stale until invalidated
+        Post.objects.update(content="updated")
+        assert invalidate_queryset(Post.objects.filter(topic=topic)) == len(posts)
+
+        for post in posts:
+            assert Post.objects.cache().get(pk=post.pk).content == "updated"
+        assert Post.objects.cache().get(pk=other_post.pk).content == other_post.content
+
 
 class TestExportUtils:
     def test_get_export_upload_path(self, board):
@@ -60,6 +94,16 @@ class TestExportUtils:
             assert csv.charset == "utf-8"
             assert csv.read().decode("utf-8") == "head 1,head 2,head 3\r\ntest1,test2,test3\r\ntest4,test5,test6\r\n"
 
+    @pytest.mark.parametrize("chunk_size", [1, 2, 1000])
+    def test_generate_csv_chunked(self, chunk_size):
+        header = {"head": "héad"}
+        rows = ([f"row {i} ✓"] for i in range(5))
+
+        with generate_csv(header, rows, chunk_size=chunk_size) as csv:
+            content = csv.read()
+            assert csv.size == len(content)
+            assert content.decode("utf-8") == "héad\r\n" + "".join(f"row {i} ✓\r\n" for i in range(5))
+
 
 class TestImageUtils:
     @pytest.mark.parametrize(
@@ -135,3 +179,24 @@ class TestImageUtils:
         assert pilimage.mode == "RGB"
         if image_format not in ["jpeg", "png"]:
             assert pilimage.format == "JPEG"
+
+    def test_open_image_draft(self):
+        buffer = BytesIO()
+        PILImage.new("RGB", (2000, 1600)).save(buffer, format="JPEG")
+        # decoded at 1/4 scale, the smallest still covering 400x400
+        assert open_image(buffer, 400, 400).size == (500, 400)
+        assert open_image(buffer).size == (2000, 1600)
+
+    def test_open_image_pixel_limit(self, settings):
+        settings.MAX_IMAGE_PIXELS = 100 * 100
+        image = SimpleUploadedFile(name="image.png", content=Faker().image(size=(101, 100), image_format="png"))
+        with pytest.raises(PILImage.DecompressionBombError):
+            open_image(image)
+
+    def test_save_image(self):
+        img = PILImage.new("RGB", (100, 100))
+        image = SimpleUploadedFile(name="image.jpg", content=b"")
+        with save_image(img, image, "JPEG") as file:
+            data = file.read()
+            assert file.size == len(data)
+            assert PILImage.open(BytesIO(data)).size == (100, 100)
@@ -4,11 +4,15 @@ import pytest
 from asgiref.sync import sync_to_async
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from pytest_django.asserts import assertFormError
 from pytest_lazy_fixtures import lf
 
-from boards.models import IMAGE_TYPE, Board, BoardPreferences, Image, Reaction
+from boards.models import IMAGE_TYPE, Board, BoardPreferences, Image, Post, Reaction
 from boards.routing import websocket_urlpatterns
 from boards.views.board import BoardView
 from jotlet.tests.utils import create_htmx_session
@@ -67,6 +71,40 @@ class TestBoardView:
         assert response.status_code == HTTPStatus.OK
         assert list(response.context["topics"]) == [topic1, topic2, topic3]
 
+    @pytest.mark.parametrize("logged_in", [False, True])
+    def test_identity_hash(self, client, board, topic, user, logged_in):
+        if logged_in:
+            client.force_login(user)
+        response = client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        client.post(
+            reverse("boards:post-create", kwargs={"slug": board.slug, "topic_pk": topic.pk}), {"content": "x"}
+        )
+        assert response.context["identity_hash"] == Post.objects.get(content="x").identity_hash
+
+    def test_query_count_independent_of_post_count(
+        self, client, board_factory, topic_factory, post_factory, reaction_factory
+    ):
+        client.get(reverse("boards:index"))  # create the session up front so it is not counted
+        query_counts = []
+        for post_count in [2, 20]:
+            board = board_factory()
+            board.preferences.board_type = "r"
+            board.preferences.reaction_type = "v"
+            board.preferences.save()
+            topic = topic_factory(board=board)
+            for post in post_factory.create_batch(post_count, topic=topic):
+                post_factory(topic=topic, parent=post_factory(topic=topic, parent=post))
+                reaction_factory(post=post, reaction_type="v")
+
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+            assert response.status_code == HTTPStatus.OK
+            query_counts.append(len(queries))
+            for post in Post.objects.filter(topic=topic):
+                assert f"container-post-{post.pk}" in response.content.decode()
+
+        assert query_counts[0] == query_counts[1]
+
 
 class TestBoardPreferencesView:
     @pytest.fixture
@@ -297,6 +335,43 @@ class TestImageSelectView:
         else:
             assert response.url == f"/accounts/login/?next=/boards/image_select/{image_type}/"
 
+    def test_rendered_from_manifest(self, monkeypatch, client, board, user):
+        def no_storage(*args, **kwargs):
+            msg = "the storage should not be reached while rendering"
+            raise AssertionError(msg)
+
+        for method in ["exists", "open", "size"]:
+            monkeypatch.setattr(FileSystemStorage, method, no_storage)
+        image = Image.objects.filter(image_type="b").first()
+        board.preferences.background_type = "i"
+        board.preferences.background_image = image
+        board.preferences.save()
+
+        client.force_login(user)
+        response = client.get(reverse("boards:image-select", kwargs={"image_type": "b"}))
+        assert response.status_code == HTTPStatus.OK
+        assert image.get_srcset("small_webp") in response.content.decode()
+        response = client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        assert response.status_code == HTTPStatus.OK
+        content = response.content.decode()
+        assert f'url("{image.renditions["large_webp@2x"]["url"]}") 2x type("image/webp")' in content
+        assert f"@media (max-width: {settings.MEDIUM_THUMBNAIL_WIDTH}px)" in content
+        assert f'url("{image.renditions["medium_jpeg"]["url"]}") 1x type("image/jpeg")' in content
+
+    def test_rendered_without_renditions(self, client, board, user):
+        image = Image.objects.filter(image_type="b").first()
+        Image.objects.filter(pk=image.pk).update(renditions={})
+        board.preferences.background_type = "i"
+        board.preferences.background_image = image
+        board.preferences.save()
+
+        client.force_login(user)
+        response = client.get(reverse("boards:board", kwargs={"slug": board.slug}))
+        assert response.status_code == HTTPStatus.OK
+        content = response.content.decode()
+        assert f'url("{image.image.url}")' in content
+        assert "image-set(" not in content
+
 
 class TestQrView:
     @pytest.fixture(autouse=True)
@@ -1,10 +1,15 @@
+import json
 from http import HTTPStatus
 
 import pytest
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
 from django.urls import reverse
 from pytest_lazy_fixtures import lf
 
 from boards.models import Export
+from boards.routing import websocket_urlpatterns
 
 
 class TestExportView:
@@ -42,6 +47,18 @@ class TestExportTablePartialView:
         response = client.get(reverse("boards:board-export-table", kwargs={"slug": board.slug}))
         assert response.status_code == expected_response
 
+    @pytest.mark.parametrize(
+        ("status", "progress", "expected_text"),
+        [("p", 0, "Pending"), ("r", 40, "40%"), ("f", 0, "Failed")],
+    )
+    def test_export_progress(self, client, board, user, status, progress, expected_text):
+        export = Export.objects.create(board=board, status=status, progress=progress)
+        client.force_login(user)
+        response = client.get(reverse("boards:board-export-table", kwargs={"slug": board.slug}))
+        content = response.content.decode()
+        assert expected_text in content
+        assert reverse("boards:board-export-download", kwargs={"slug": board.slug, "pk": export.pk}) not in content
+
 
 class TestExportCreateView:
     @pytest.fixture
@@ -58,19 +75,55 @@ class TestExportCreateView:
             (lf("user_staff"), HTTPStatus.OK),
         ],
     )
-    def test_permissions(self, client, test_user, board, expected_response, create_url):
+    def test_permissions(
+        self, client, test_user, board, expected_response, create_url, django_capture_on_commit_callbacks
+    ):
         if test_user:
             client.force_login(test_user)
         export_qs = Export.objects.filter(board__slug=board.slug)
         assert export_qs.count() == 0
 
-        response = client.post(create_url)
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = client.post(create_url)
         assert response.status_code == expected_response
         if expected_response == HTTPStatus.OK:
             assert export_qs.count() == 1
+            # only generated once the export is committed
+            assert not export_qs.get().is_done
+            for callback in callbacks:
+                callback()
+            assert export_qs.get().is_done
         else:
             assert export_qs.count() == 0
 
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_export_progress_websocket_message(
+        self, client, board, user, topic, post_factory, create_url, monkeypatch
+    ):
+        monkeypatch.setattr(Export, "CHUNK_SIZE", 2)
+        await sync_to_async(post_factory.create_batch)(4, topic=topic)
+        application = URLRouter(websocket_urlpatterns)
+        communicator = WebsocketCommunicator(application, f"/ws/boards/{board.slug}/")
+        connected, _ = await communicator.connect()
+        assert connected, "Could not connect"
+        message = await communicator.receive_from()
+        assert "session_connected" in message
+
+        await sync_to_async(client.force_login)(user)
+        await sync_to_async(client.post)(create_url)
+        export = await Export.objects.aget(board=board)
+        messages = [json.loads(await communicator.receive_from()) for _ in range(4)]
+        assert [(message["status"], message["progress"]) for message in messages] == [
+            ("r", 0),
+            ("r", 50),
+            ("r", 99),
+            ("d", 100),
+        ]
+        assert all(message["type"] == "export_progress" for message in messages)
+        assert all(message["export_pk"] == str(export.pk) for message in messages)
+        await communicator.disconnect()
+
     @pytest.mark.parametrize("test_user", [lf("user"), lf("user_staff")])
     def test_get(self, client, test_user, create_url):
         if test_user:
@@ -153,3 +206,16 @@ class TestExportDownloadView:
         response = client.get(download_url)
         assert response.status_code == HTTPStatus.OK
         assert response["HX-Redirect"] == export.file.url
+
+    @pytest.mark.parametrize("export_format", ["csv", "jsonl", "parquet"])
+    def test_get_format(self, client, user, download_url, export, export_format):
+        client.force_login(user)
+        response = client.get(download_url, {"format": export_format})
+        assert response.status_code == HTTPStatus.OK
+        assert response["HX-Redirect"] == export.get_file(export_format).url
+        assert response["HX-Redirect"].endswith(f".{export_format}")
+
+    def test_get_unknown_format(self, client, user, download_url):
+        client.force_login(user)
+        response = client.get(download_url, {"format": "xlsx"})
+        assert response.status_code == HTTPStatus.NOT_FOUND
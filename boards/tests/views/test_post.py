@@ -7,14 +7,21 @@ from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
 from django.conf import settings
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.urls import reverse
 from pytest_django.asserts import assertContains, assertNotContains
 from pytest_lazy_fixtures import lf
 
-from boards.models import REACTION_TYPE, Image, Post
+from boards import events, utils
+from boards.models import REACTION_TYPE, Image, Post, PostImage
 from boards.routing import websocket_urlpatterns
 from boards.tests.utils import create_image
+from boards.views import post as post_views
+from boards.views.post import PostFetchView, PostFooterFetchView
 from jotlet.utils import offset_date
 
 
@@ -224,6 +231,34 @@ class TestPostCreateView:
         assert f'"topic_pk": "{topic.pk!s}"' in message
         await communicator.disconnect()
 
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize(("require_post_approval", "expected_html"), [(False, True), (True, False)])
+    async def test_post_created_websocket_message_html(
+        self, client, settings, board, topic, require_post_approval, expected_html
+    ):
+        settings.BOARD_EVENTS_RENDER_POSTS = True
+        board.preferences.require_post_approval = require_post_approval
+        await board.preferences.asave()
+        application = URLRouter(websocket_urlpatterns)
+        communicator = WebsocketCommunicator(application, f"/ws/boards/{board.slug}/")
+        connected, _ = await communicator.connect()
+        assert connected, "Could not connect"
+        message = await communicator.receive_json_from()
+        assert message["type"] == "session_connected"
+        await sync_to_async(client.post)(self.post_create_url, data={"content": "Test Post"})
+        post = await Post.objects.aget(content="Test Post")
+        message = await communicator.receive_json_from()
+        assert message["type"] == "post_created"
+        assert message["identity_hash"] == post.identity_hash
+        if expected_html:
+            assert f'id="container-post-{post.pk}"' in message["html"]
+            assert "Test Post" in message["html"]
+            assert "Delete Post" not in message["html"]
+        else:
+            assert message["html"] is None
+        await communicator.disconnect()
+
 
 class TestPostUpdateView:
     @pytest.fixture(autouse=True)
@@ -603,6 +638,138 @@ class TestDeletePostsView:
         await communicator.disconnect()
 
 
+class TestModeratePostsView:
+    @pytest.fixture
+    def published(self, monkeypatch):
+        published = []
+        monkeypatch.setattr(events, "publish_board_events", published.append)
+        return published
+
+    @pytest.fixture
+    def moderate_url(self, board):
+        return reverse("boards:board-posts-moderate", kwargs={"slug": board.slug})
+
+    @pytest.mark.parametrize(
+        ("test_user", "expected_response"),
+        [
+            (None, HTTPStatus.FOUND),
+            (lf("user2"), HTTPStatus.FORBIDDEN),
+            (lf("user3"), HTTPStatus.NO_CONTENT),
+            (lf("user"), HTTPStatus.NO_CONTENT),
+        ],
+    )
+    def test_moderate_permissions(self, client, post, test_user, expected_response, moderate_url):
+        if test_user:
+            client.force_login(test_user)
+        response = client.post(moderate_url, {"action": "approve", "posts": [post.pk]})
+        assert response.status_code == expected_response
+
+    @pytest.mark.parametrize("approved", [True, False])
+    def test_moderate_approval(
+        self,
+        client,
+        board,
+        topic,
+        user3,
+        post_factory,
+        published,
+        moderate_url,
+        approved,
+        django_capture_on_commit_callbacks,
+    ):
+        posts = post_factory.create_batch(3, topic=topic, approved=not approved)
+        client.force_login(user3)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                moderate_url,
+                {"action": "approve" if approved else "unapprove", "posts": [posts[0].pk, posts[1].pk]},
+            )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert set(Post.objects.filter(approved=approved)) == {posts[0], posts[1]}
+        assert published == [[(f"board-{board.slug}", {"type": "topic_updated", "topic_pk": str(topic.pk)})]]
+
+    def test_moderate_delete(
+        self,
+        client,
+        board,
+        topic_factory,
+        user3,
+        post_factory,
+        published,
+        moderate_url,
+        django_capture_on_commit_callbacks,
+    ):
+        topic1, topic2 = topic_factory.create_batch(2, board=board)
+        post1 = post_factory(topic=topic1)
+        reply = post_factory(topic=topic1, parent=post1)
+        post2 = post_factory(topic=topic2)
+        kept_post = post_factory(topic=topic2)
+        nested_reply = post_factory(topic=topic2, parent=post_factory(topic=topic2, parent=kept_post))
+        client.force_login(user3)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(moderate_url, {"action": "delete", "posts": [post1.pk, post2.pk, nested_reply.pk]})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not Post.objects.filter(pk__in=[post1.pk, reply.pk, post2.pk, nested_reply.pk]).exists()
+        kept_post.refresh_from_db()
+        assert kept_post.descendant_count == 1
+        assert published == [[(f"board-{board.slug}", {"type": "board_updated"})]]
+
+    @pytest.fixture
+    def invalidated_in_atomic_block(self, monkeypatch):
+        invalidated_in_atomic_block = []
+
+        def invalidate_dicts(*args, **kwargs):
+            invalidated_in_atomic_block.append(connection.in_atomic_block)
+            return utils.invalidate_dicts(*args, **kwargs)
+
+        monkeypatch.setattr(post_views, "invalidate_dicts", invalidate_dicts)
+        return invalidated_in_atomic_block
+
+    @pytest.mark.django_db(transaction=True)
+    def test_moderate_approval_invalidates_cache(
+        self, client, topic, user3, post_factory, moderate_url, invalidated_in_atomic_block
+    ):
+        posts = post_factory.create_batch(2, topic=topic, approved=False)
+        assert set(Post.objects.filter(topic=topic, approved=False).cache()) == set(posts)
+        assert not Post.objects.filter(topic=topic, approved=True).cache().exists()
+        client.force_login(user3)
+        response = client.post(moderate_url, {"action": "approve", "posts": [posts[0].pk]})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert invalidated_in_atomic_block == [False]
+        assert set(Post.objects.filter(topic=topic, approved=False).cache()) == {posts[1]}
+        assert set(Post.objects.filter(topic=topic, approved=True).cache()) == {posts[0]}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_moderate_delete_invalidates_cache(
+        self, client, board, topic, user3, post_factory, moderate_url, invalidated_in_atomic_block
+    ):
+        kept_post = post_factory(topic=topic)
+        reply = post_factory(topic=topic, parent=kept_post)
+        nested_reply = post_factory(topic=topic, parent=reply)
+        assert Post.objects.cache().get(pk=kept_post.pk).descendant_count == 2  # noqa: PLR2004
+        assert Post.objects.cache().get(pk=reply.pk).descendant_count == 1
+        post_count_key = make_template_fragment_key("board-list-post-count", [str(board.pk)])
+        cache.set(post_count_key, "3")
+        client.force_login(user3)
+        response = client.post(moderate_url, {"action": "delete", "posts": [nested_reply.pk]})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert invalidated_in_atomic_block == [False] * 4
+        assert Post.objects.cache().get(pk=kept_post.pk).descendant_count == 1
+        assert Post.objects.cache().get(pk=reply.pk).descendant_count == 0
+        assert not Post.objects.filter(pk=nested_reply.pk).cache().exists()
+        assert cache.get(post_count_key) is None
+
+    def test_moderate_invalid(self, client, user3, post_factory, published, moderate_url):
+        other_board_post = post_factory()
+        client.force_login(user3)
+        response = client.post(moderate_url, {"action": "delete", "posts": [other_board_post.pk]})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = client.post(moderate_url, {"action": "lock", "posts": []})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert Post.objects.filter(pk=other_board_post.pk).exists()
+        assert published == []
+
+
 class TestPostFetchView:
     @pytest.fixture(autouse=True)
     def _setup_method(self, board, topic, post):
@@ -622,6 +789,24 @@ class TestPostFetchView:
         assert response.context["post"] == post
         assertContains(response, post.content, html=True)
 
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_post_fetch_async(self, async_client, board, post, user):
+        assert PostFetchView.view_is_async
+        assert PostFooterFetchView.view_is_async
+        await sync_to_async(async_client.force_login)(user)
+        response = await async_client.get(self.post_fetch_url)
+        assert response.status_code == HTTPStatus.OK
+        assert response.context["post"] == post
+        assert response.context["is_moderator"]
+        assertContains(response, post.content, html=True)
+
+        response = await async_client.get(
+            reverse("boards:post-footer-fetch", kwargs={"slug": board.slug, "topic_pk": post.topic.pk, "pk": post.pk})
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.context["post"] == post
+
     def test_post_fetch_approved(self, client, board, post):
         board.preferences.require_post_approval = True
         board.preferences.save()
@@ -899,6 +1084,76 @@ class TestPostImageUploadView:
             else:
                 assert data["error"] == "Board image quota exceeded"
 
+    def test_upload_same_image(self, client, settings, board, board_factory, user_staff, upload_url):
+        client.force_login(user_staff)
+        content = create_image("png")
+
+        def upload(upload_url):
+            response = client.post(
+                upload_url, {"image": SimpleUploadedFile("test.png", content, content_type="image/png")}
+            )
+            return json.loads(response.content)
+
+        file_path = upload(upload_url)["data"]["filePath"]
+        settings.MAX_POST_IMAGE_COUNT = 1
+        # already in the board, so neither stored again nor counted against its quota
+        assert upload(upload_url)["data"]["filePath"] == file_path
+        assert board.images.count() == 1
+
+        other_board = board_factory(owner=user_staff)
+        other_board.preferences.allow_image_uploads = True
+        other_board.preferences.save()
+        assert upload(reverse("boards:post-image-upload", kwargs={"slug": other_board.slug}))["data"] == {
+            "filePath": file_path
+        }
+        assert other_board.images.get().image.url == file_path
+
+    def test_posts_sharing_same_upload(self, client, board, topic, post_factory, user_staff, upload_url):
+        client.force_login(user_staff)
+        content = create_image("png")
+
+        def upload():
+            response = client.post(
+                upload_url, {"image": SimpleUploadedFile("test.png", content, content_type="image/png")}
+            )
+            return json.loads(response.content)["data"]["filePath"]
+
+        post_a = post_factory(topic=topic, content=f"![image]({upload()})")
+        post_b = post_factory(topic=topic, content=f"![image]({upload()})")
+        image = PostImage.objects.get(board=board)
+        assert set(image.referencing_posts.all()) == {post_a, post_b}
+        image.refresh_from_db()
+        assert image.post == post_a
+
+        # kept while the other post still references it
+        post_b.content = "image removed"
+        post_b.save()
+        assert PostImage.objects.filter(pk=image.pk).exists()
+        assert default_storage.exists(image.image.name)
+
+        post_a.content = "image removed"
+        post_a.save()
+        assert not PostImage.objects.filter(pk=image.pk).exists()
+
+    def test_deleted_post_keeps_shared_upload(self, board, topic, post_factory, post_image_factory):
+        image = post_image_factory(board=board)
+        post_a = post_factory(topic=topic, content=f"![image]({image.image.url})")
+        post_b = post_factory(topic=topic, content=f"![image]({image.image.url})")
+        post_a.delete()
+        image.refresh_from_db()
+        assert image.post is None
+        assert set(image.referencing_posts.all()) == {post_b}
+
+    def test_upload_image_over_max_pixels(self, client, settings, user_staff, upload_url):
+        settings.MAX_IMAGE_PIXELS = 100
+        client.force_login(user_staff)
+        response = client.post(
+            upload_url, {"image": SimpleUploadedFile("test.png", create_image("png"), content_type="image/png")}
+        )
+        data = json.loads(response.content)
+        assert data["error"].startswith("Image is too large")
+        assert not Image.objects.exists()
+
     def test_upload_invalid_image(self, client, user_staff, upload_url):
         client.force_login(user_staff)
         response = client.post(
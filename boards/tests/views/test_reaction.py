@@ -7,7 +7,7 @@ from channels.testing import WebsocketCommunicator
 from django.urls import reverse
 from pytest_factoryboy import LazyFixture
 
-from boards.models import REACTION_TYPE, BoardPreferences, Post, Reaction
+from boards.models import REACTION_TYPE, BoardPreferences, Post, Reaction, ReactionCount
 from boards.routing import websocket_urlpatterns
 
 
@@ -28,10 +28,14 @@ class TestPostReactionView:
         response = client.post(self.post_reaction_url, {"score": 1})
         assert response.status_code == HTTPStatus.NO_CONTENT
         assert Reaction.objects.count() == 1
+        counts = ReactionCount.objects.get(post=post, reaction_type=reaction_type[0])
+        assert (counts.count, counts.positive_count, counts.negative_count, counts.score_sum) == (1, 1, 0, 1)
 
         response = client.post(self.post_reaction_url, {"score": 1})
         assert response.status_code == HTTPStatus.NO_CONTENT
         assert Reaction.objects.count() == 0
+        counts.refresh_from_db()
+        assert (counts.count, counts.positive_count, counts.negative_count, counts.score_sum) == (0, 0, 0, 0)
 
     @pytest.mark.parametrize(
         "reaction_type",
@@ -43,8 +47,8 @@ class TestPostReactionView:
         post.topic.board.preferences.reaction_type = reaction_type[0]
         post.topic.board.preferences.save()
 
-        first_score = 1
-        second_score = 2
+        first_score = -1 if reaction_type[0] == "v" else 1
+        second_score = 1 if reaction_type[0] == "v" else 2
         response = client.post(self.post_reaction_url, {"score": first_score})
         assert response.status_code == HTTPStatus.NO_CONTENT
         assert Reaction.objects.count() == 1
@@ -54,9 +58,31 @@ class TestPostReactionView:
         assert response.status_code == HTTPStatus.NO_CONTENT
         assert Reaction.objects.count() == 1
         assert Reaction.objects.first().reaction_score == second_score
+        counts = ReactionCount.objects.get(post=post, reaction_type=reaction_type[0])
+        assert (counts.count, counts.negative_count, counts.score_sum) == (1, 0, second_score)
 
         Reaction.objects.filter(post=post).delete()
 
+    def test_post_reaction_ignores_cached_state(self, monkeypatch, client, post):
+        post.topic.board.preferences.reaction_type = "s"
+        post.topic.board.preferences.save()
+        # as if the cached reactions of the post were stale, and did not include the reaction yet
+        monkeypatch.setattr(Post, "get_has_reacted", lambda *args, **kwargs: (False, None, 1))
+
+        response = client.post(self.post_reaction_url, {"score": 2})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        response = client.post(self.post_reaction_url, {"score": 3})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert Reaction.objects.get(post=post).reaction_score == 3  # noqa: PLR2004
+        counts = ReactionCount.objects.get(post=post, reaction_type="s")
+        assert (counts.count, counts.score_sum) == (1, 3)
+
+        response = client.post(self.post_reaction_url, {"score": 3})
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not Reaction.objects.filter(post=post).exists()
+        counts.refresh_from_db()
+        assert (counts.count, counts.score_sum) == (0, 0)
+
     def test_post_reaction_disabled(self, client):
         assert Reaction.objects.count() == 0
 
@@ -153,6 +179,9 @@ class TestReactionsDeleteView:
         response = client.post(self.reactions_delete_url)
         assert response.status_code == HTTPStatus.NO_CONTENT
         assert Reaction.objects.count() == 25 * (len(REACTION_TYPE) - 1) - 5
+        post = Post.objects.first()
+        assert post.reaction_counts.get(reaction_type="l").count == 0
+        assert post.reaction_counts.get(reaction_type="v").count == 5  # noqa: PLR2004
 
     def test_owner_permissions(self, client, user):
         client.force_login(user)
@@ -1,4 +1,5 @@
 from http import HTTPStatus
+from urllib.parse import quote
 
 import pytest
 from asgiref.sync import sync_to_async
@@ -10,6 +11,7 @@ from pytest_lazy_fixtures.lazy_fixture import lf
 
 from boards.models import Topic
 from boards.routing import websocket_urlpatterns
+from boards.views.topic import TopicFetchView, TopicPostsFetchView
 
 
 class TestTopicCreateView:
@@ -184,3 +186,35 @@ class TestTopicFetchView:
         response = client.get(reverse("boards:topic-fetch", kwargs={"slug": topic.board.slug, "pk": topic.pk}))
         assert response.status_code == HTTPStatus.OK
         assert response.context["topic"] == topic
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_topic_fetch_async(self, async_client, topic):
+        assert TopicFetchView.view_is_async
+        assert TopicPostsFetchView.view_is_async
+        response = await async_client.get(
+            reverse("boards:topic-fetch", kwargs={"slug": topic.board.slug, "pk": topic.pk})
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.context["topic"] == topic
+
+    def test_posts_fetch(self, client, settings, topic, post_factory):
+        settings.TOPIC_POSTS_PAGE_SIZE = 1
+        post_factory.create_batch(2, topic=topic)
+        response = client.get(reverse("boards:topic-fetch", kwargs={"slug": topic.board.slug, "pk": topic.pk}))
+        (first_post,) = response.context["snapshot"].get_topic_posts(topic)
+        cursor = response.context["snapshot"].get_next_cursor(topic)
+        assert f"?cursor={quote(str(cursor))}" in response.content.decode()
+
+        url = reverse("boards:topic-posts-fetch", kwargs={"slug": topic.board.slug, "pk": topic.pk})
+        response = client.get(url, {"cursor": str(cursor)})
+        assert response.status_code == HTTPStatus.OK
+        (second_post,) = response.context["snapshot"].get_topic_posts(topic)
+        assert second_post != first_post
+        assert f'id="container-post-{second_post.pk}"' in response.content.decode()
+        assert "load-more" not in response.content.decode()
+
+    def test_posts_fetch_invalid_cursor(self, client, topic):
+        url = reverse("boards:topic-posts-fetch", kwargs={"slug": topic.board.slug, "pk": topic.pk})
+        assert client.get(url).status_code == HTTPStatus.BAD_REQUEST
+        assert client.get(url, {"cursor": "invalid"}).status_code == HTTPStatus.BAD_REQUEST
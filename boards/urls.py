@@ -15,6 +15,7 @@ urlpatterns = [
     path("<slug:slug>/image/post/upload/", views.post.PostImageUploadView.as_view(), name="post-image-upload"),
     path("<slug:slug>/posts/approve/", views.post.ApprovePostsView.as_view(), name="board-posts-approve"),
     path("<slug:slug>/posts/delete/", views.post.DeletePostsView.as_view(), name="board-posts-delete"),
+    path("<slug:slug>/posts/moderate/", views.post.ModeratePostsView.as_view(), name="board-posts-moderate"),
     path("<slug:slug>/qr/", views.board.QrView.as_view(), name="board-qr"),
     path("<slug:slug>/exports/", views.export.ExportView.as_view(), name="board-export"),
     path("<slug:slug>/exports/create/", views.export.ExportCreateView.as_view(), name="board-export-create"),
@@ -35,6 +36,11 @@ urlpatterns = [
     path("<slug:slug>/topics/<uuid:pk>/update/", views.topic.UpdateTopicView.as_view(), name="topic-update"),
     path("<slug:slug>/topics/<uuid:pk>/delete/", views.topic.DeleteTopicView.as_view(), name="topic-delete"),
     path("<slug:slug>/topics/<uuid:pk>/fetch/", views.topic.TopicFetchView.as_view(), name="topic-fetch"),
+    path(
+        "<slug:slug>/topics/<uuid:pk>/posts/fetch/",
+        views.topic.TopicPostsFetchView.as_view(),
+        name="topic-posts-fetch",
+    ),
     path(
         "<slug:slug>/topics/<uuid:topic_pk>/posts/approve/",
         views.post.ApprovePostsView.as_view(),
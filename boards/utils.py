@@ -1,22 +1,28 @@
-import csv
 import datetime
+import hashlib
+import re
 import secrets
 import string
-import sys
-from io import BytesIO, StringIO
+from itertools import batched
 from pathlib import Path
 from uuid import uuid4
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from cacheops.conf import settings as cacheops_settings
+from cacheops.invalidation import get_obj_dict, invalidate_dict, no_invalidation
+from cacheops.redis import handle_connection_failure, redis_client
+from cacheops.sharding import get_prefix
+from cacheops.signals import cache_invalidated
 from django.conf import settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import DEFAULT_DB_ALIAS
 from PIL import Image as PILImage
 
+from .events import send_board_event
+from .exporters import CSVExportWriter
+
 
 def channel_group_send(group_name, message):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(group_name, message)
+    send_board_event(group_name, message)
 
 
 def get_export_upload_path(export, filename):
@@ -25,22 +31,33 @@ def get_export_upload_path(export, filename):
     return f"exports/boards/{get_random_string(2)}/{uuid4()}/{export.board.slug}_{timestamp}{ext}"
 
 
-def generate_csv(header, rows):
-    with StringIO(newline="") as csv_buffer:
-        csv_writer = csv.writer(csv_buffer)
-        csv_writer.writerow(header.values())
-        csv_writer.writerows(iter(rows))
+def generate_csv(header, rows, chunk_size=1000):
+    """
+    Write the CSV to a temporary file on disk, encoding and flushing it every `chunk_size` rows.
 
-        bytes_buffer = BytesIO(csv_buffer.getvalue().encode("utf-8"))
+    `rows` can be any iterable (e.g. a server-side cursor), so memory use does not depend on the number of rows.
+    """
+    writer = CSVExportWriter(header)
+    for chunk in batched(rows, chunk_size):
+        writer.write([dict(zip(header, row, strict=True)) for row in chunk])
+    return writer.close()
 
-    return InMemoryUploadedFile(
-        bytes_buffer,
-        "FileField",
-        "export.csv",
-        "text/csv",
-        sys.getsizeof(bytes_buffer),
-        "utf-8",
-    )
+
+def get_post_image_names(content):
+    """
+    Storage names of the post images (see get_image_upload_path) whose urls appear in a post's content, without the
+    query string or fragment of the urls.
+    """
+    return set(re.findall(r"images/p/[^\s'\"()<>?#]+", content or ""))
+
+
+def get_content_hash(file):
+    """SHA-256 of the content of `file`, read in chunks."""
+    content_hash = hashlib.sha256()
+    for chunk in file.chunks():
+        content_hash.update(chunk)
+    file.seek(0)
+    return content_hash.hexdigest()
 
 
 def get_image_upload_path(image, filename):
@@ -50,6 +67,79 @@ def get_image_upload_path(image, filename):
     return f"images/{image.image_type}/{sub1}/{sub2}/{image.pk}{ext}"
 
 
+def get_invalidation_schemes(model, using):
+    """The field lists of the conjunction schemes cacheops has recorded for the model's cached queries."""
+    db_table = model._meta.concrete_model._meta.db_table
+    prefix = get_prefix(tables=[db_table], dbs=[using])
+    return [
+        [field for field in scheme.decode().split(",") if field]
+        for scheme in redis_client.smembers(f"{prefix}schemes:{db_table}")
+    ]
+
+
+@handle_connection_failure
+def get_invalidation_dicts(queryset, chunk_size=1000):
+    """
+    Snapshot the current rows of the queryset as the dicts invalidate_dicts needs to invalidate them later.
+
+    Taken before rows are updated or deleted, the dicts still invalidate the cached queries that matched the old
+    values once the change is committed.
+    """
+    if not cacheops_settings.CACHEOPS_ENABLED:
+        return []
+    if not cacheops_settings.CACHEOPS_INSIDEOUT:
+        model = queryset.model._meta.concrete_model
+        return [get_obj_dict(model, obj) for obj in queryset.nocache()]
+
+    schemes = get_invalidation_schemes(queryset.model, queryset.db)
+    if not schemes:
+        return []
+    fields = sorted({field for scheme in schemes for field in scheme})
+    return [
+        {field: str(value) for field, value in values.items()}
+        for values in queryset.nocache().values("pk", *fields).iterator(chunk_size=chunk_size)
+    ]
+
+
+@handle_connection_failure
+def invalidate_dicts(model, obj_dicts, using=DEFAULT_DB_ALIAS):
+    """Invalidate the rows snapshotted by get_invalidation_dicts, in one pipelined redis round trip."""
+    if not cacheops_settings.CACHEOPS_ENABLED or no_invalidation.active or not obj_dicts:
+        return 0
+    model = model._meta.concrete_model
+    if not cacheops_settings.CACHEOPS_INSIDEOUT:
+        for obj_dict in obj_dicts:
+            invalidate_dict(model, obj_dict, using=using)
+        return len(obj_dicts)
+
+    db_table = model._meta.db_table
+    prefix = get_prefix(tables=[db_table], dbs=[using])
+    schemes = get_invalidation_schemes(model, using)
+    pipeline = redis_client.pipeline(transaction=False)
+    for obj_dict in obj_dicts:
+        conj_keys = [
+            f"{prefix}conj:{db_table}:" + "&".join(f"{field}={obj_dict.get(field)}" for field in scheme)
+            for scheme in schemes
+        ]
+        if conj_keys:
+            pipeline.unlink(*conj_keys)
+    pipeline.execute()
+    cache_invalidated.send(sender=model, obj_dict=None)
+    return len(obj_dicts)
+
+
+def invalidate_queryset(queryset, chunk_size=1000):
+    """
+    Equivalent of calling cacheops' invalidate_obj on every object of the queryset, in one pipelined redis round trip.
+
+    Only the fields used by the cached conjunction schemes of the model are fetched, so the objects themselves are
+    never loaded.
+    """
+    if not cacheops_settings.CACHEOPS_ENABLED or no_invalidation.active:
+        return 0
+    return invalidate_dicts(queryset.model, get_invalidation_dicts(queryset, chunk_size), using=queryset.db)
+
+
 def get_is_moderator(user, board):
     return (
         user.has_perm("boards.can_approve_posts")
@@ -63,6 +153,20 @@ def get_random_string(length):
     return "".join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(length))
 
 
+def get_reaction_score(reaction_type, count=0, positive_count=0, negative_count=0, score_sum=0):
+    match reaction_type:
+        case "l":
+            return count
+        case "v":
+            return positive_count, negative_count
+        case "s":
+            if count != 0:
+                return f"{(score_sum / count):.2g}"
+            return ""
+        case _:
+            return 0
+
+
 def post_reaction_send_update_message(post):
     channel_group_send(
         f"board-{post.topic.board.slug}",
@@ -74,8 +178,20 @@ def post_reaction_send_update_message(post):
     )
 
 
-def open_image(image):
-    return PILImage.open(image)
+def open_image(image, width=None, height=None):
+    """
+    Open `image` without decoding its pixels, which are only decoded (and held in memory) on first access.
+
+    Images of more than MAX_IMAGE_PIXELS are refused from their header alone. If the image will be resized to fit
+    `width` x `height`, a JPEG is decoded at the smallest scale (1/2, 1/4 or 1/8) that still covers that size.
+    """
+    img = PILImage.open(image)
+    if img.width * img.height > settings.MAX_IMAGE_PIXELS:
+        msg = f"Image has {img.width * img.height} pixels, more than the {settings.MAX_IMAGE_PIXELS} allowed"
+        raise PILImage.DecompressionBombError(msg)
+    if width is not None and height is not None:
+        img.draft(img.mode, (width, height))
+    return img
 
 
 def convert_image_format(img, image):
@@ -100,9 +216,12 @@ def resize_image(img, width, height):
 
 
 def save_image(img, image, output_format):
-    buffer = BytesIO()
-    img.save(buffer, format=output_format, quality=80, optimize=True)
-    return InMemoryUploadedFile(buffer, "ImageField", image.name, output_format, sys.getsizeof(buffer), None)
+    # encoded to a temporary file rather than in memory, and streamed from it to the storage
+    file = TemporaryUploadedFile(image.name, PILImage.MIME[output_format], 0, None)
+    img.save(file, format=output_format, quality=80, optimize=True)
+    file.size = file.tell()
+    file.seek(0)
+    return file
 
 
 def process_image(image, image_type="b", width=settings.MAX_IMAGE_WIDTH, height=settings.MAX_IMAGE_HEIGHT):
@@ -110,7 +229,7 @@ def process_image(image, image_type="b", width=settings.MAX_IMAGE_WIDTH, height=
         width = settings.MAX_POST_IMAGE_WIDTH
         height = settings.MAX_POST_IMAGE_HEIGHT
 
-    img = open_image(image)
+    img = open_image(image, width, height)
     img, output_format, format_changed = convert_image_format(img, image)
     img, size_changed = resize_image(img, width, height)
 
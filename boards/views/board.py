@@ -9,7 +9,8 @@ from django_htmx.http import HttpResponseClientRedirect, HttpResponseClientRefre
 
 from boards.forms import BoardCreateForm, BoardPreferencesForm
 from boards.models import Board, BoardPreferences, Image
-from boards.utils import get_is_moderator
+from boards.permissions import get_board_permissions
+from boards.snapshot import BoardSnapshot
 
 
 class BoardView(generic.DetailView):
@@ -32,9 +33,6 @@ class BoardView(generic.DetailView):
             .prefetch_related("owner")
             .prefetch_related("preferences")
             .prefetch_related("preferences__moderators")
-            .prefetch_related("topics")
-            .prefetch_related("topics__posts")
-            .prefetch_related("topics__posts__children")
         )
 
     def get_context_data(self, **kwargs):
@@ -47,9 +45,13 @@ class BoardView(generic.DetailView):
         if board.preferences.background_type == "i":
             context["bg_image"] = board.preferences.background_image
 
-        context["topics"] = board.topics.all()
-        context["support_webp"] = self.request.META.get("HTTP_ACCEPT", "").find("image/webp") > -1
-        context["is_moderator"] = get_is_moderator(self.request.user, board)
+        context["snapshot"] = snapshot = BoardSnapshot(board, self.request)
+        context["topics"] = snapshot.topics
+        context["permissions"] = permissions = get_board_permissions(self.request, board)
+        context["is_moderator"] = permissions.is_moderator
+        context["identity_hash"] = board.get_identity_hash(
+            self.request.user if self.request.user.is_authenticated else None, self.request.session.session_key
+        )
         return context
 
 
@@ -67,7 +69,7 @@ class BoardPreferencesView(LoginRequiredMixin, UserPassesTestMixin, generic.Upda
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def get_object(self, queryset=None):  # needed to prevent 'slug' FieldError
         board = self.board
@@ -126,8 +128,7 @@ class UpdateBoardView(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateVie
         board = self.get_object()
         return (
             self.request.user.has_perm("boards.change_board")
-            or self.request.user == board.owner
-            or self.request.user.is_staff
+            or get_board_permissions(self.request, board).is_board_manager
         )
 
     def get_object(self, queryset=None):
@@ -152,8 +153,7 @@ class DeleteBoardView(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteVie
         board = self.get_object()
         return (
             self.request.user.has_perm("boards.delete_board")
-            or self.request.user == board.owner
-            or self.request.user.is_staff
+            or get_board_permissions(self.request, board).is_board_manager
         )
 
     def get_object(self, queryset=None):
@@ -183,7 +183,7 @@ class QrView(UserPassesTestMixin, generic.TemplateView):
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return get_is_moderator(self.request.user, self.board)
+        return get_board_permissions(self.request, self.board).is_moderator
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
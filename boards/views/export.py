@@ -1,4 +1,5 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.db import transaction
 from django.db.models import Count
 from django.http import HttpResponse
 from django.template.defaultfilters import pluralize
@@ -7,6 +8,8 @@ from django.views import generic
 from django_htmx.http import HttpResponseClientRedirect, trigger_client_event
 
 from boards.models import Board, Export
+from boards.permissions import get_board_permissions
+from boards.tasks import generate_export
 
 
 class ExportView(UserPassesTestMixin, generic.TemplateView):
@@ -20,7 +23,7 @@ class ExportView(UserPassesTestMixin, generic.TemplateView):
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return self.board.is_export_allowed(self.request)
+        return get_board_permissions(self.request, self.board).export_allowed
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -41,7 +44,7 @@ class ExportTablePartialView(UserPassesTestMixin, generic.TemplateView):
             .annotate(num_exports=Count("exports"))
             .get(slug=self.kwargs["slug"])
         )
-        return self.board.is_export_allowed(self.request)
+        return get_board_permissions(self.request, self.board).export_allowed
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -62,17 +65,19 @@ class ExportCreateView(UserPassesTestMixin, generic.View):
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return self.board.is_export_allowed(self.request)
+        return get_board_permissions(self.request, self.board).export_allowed
 
     def post(self, *args, **kwargs):
-        Export.objects.create(board=self.board)
+        export = Export.objects.create(board=self.board)
+        # the worker may pick the task up before the export is committed otherwise
+        transaction.on_commit(lambda: generate_export(export.pk))
 
         return trigger_client_event(
             trigger_client_event(
                 HttpResponse(),
                 "showMessage",
                 {
-                    "message": "Export Created",
+                    "message": "Export Started",
                     "color": "success",
                 },
             ),
@@ -93,7 +98,7 @@ class ExportDeleteView(UserPassesTestMixin, generic.View):
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return self.board.is_export_allowed(self.request)
+        return get_board_permissions(self.request, self.board).export_allowed
 
     def post(self, request, *args, **kwargs):
         if request.path == reverse_lazy("boards:board-export-delete-all", kwargs={"slug": self.board.slug}):
@@ -129,8 +134,13 @@ class ExportDownloadView(UserPassesTestMixin, generic.View):
             .prefetch_related("preferences__moderators")
             .get(slug=self.kwargs["slug"])
         )
-        return self.board.is_export_allowed(self.request)
+        return get_board_permissions(self.request, self.board).export_allowed
 
-    def get(self, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
         export = Export.objects.get(pk=self.kwargs["pk"])
-        return trigger_client_event(HttpResponseClientRedirect(export.file.url), "exportDownloaded", None)
+        export_format = request.GET.get("format", "csv")
+        if export_format not in export.available_formats:
+            return HttpResponse(status=404)
+        return trigger_client_event(
+            HttpResponseClientRedirect(export.get_file(export_format).url), "exportDownloaded", None
+        )
@@ -1,15 +1,29 @@
 import json
 
+from cacheops import no_invalidation
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.exceptions import BadRequest
+from django.db import transaction
 from django.http import HttpResponse
 from django.urls import reverse_lazy
 from django.views import generic
 from django_htmx.http import trigger_client_event
-
-from boards.forms import PostCreateForm
-from boards.models import Board, Post, PostImage, Topic
-from boards.utils import channel_group_send, get_is_moderator
+from PIL import Image as PILImage
+
+from boards.events import no_board_events
+from boards.forms import PostCreateForm, PostModerationForm
+from boards.models import AdditionalData, Board, Post, PostImage, Reaction, ReactionCount, Topic
+from boards.permissions import aget_board_permissions, get_board_permissions
+from boards.signals import invalidate_topic_cache
+from boards.snapshot import BoardSnapshot
+from boards.utils import (
+    channel_group_send,
+    get_content_hash,
+    get_invalidation_dicts,
+    invalidate_dicts,
+    invalidate_queryset,
+)
 
 
 class PostFormMixin:
@@ -44,14 +58,15 @@ class CreatePostView(UserPassesTestMixin, PostFormMixin, generic.CreateView):
             .get(pk=self.kwargs["topic_pk"])
         )
 
-        is_allowed = topic.post_create_allowed(self.request)
+        permissions = get_board_permissions(self.request, topic.board)
+        is_allowed = permissions.post_create_allowed(topic)
 
         if "post_pk" in self.kwargs and is_allowed:
             self.is_reply = True
             # check if the user is allowed to reply to the post
             self.parent = Post.objects.get(pk=self.kwargs["post_pk"])
 
-            is_allowed = self.parent.reply_create_allowed(self.request)
+            is_allowed = permissions.reply_create_allowed(self.parent)
 
         if is_allowed:
             self.board = topic.board
@@ -73,7 +88,7 @@ class CreatePostView(UserPassesTestMixin, PostFormMixin, generic.CreateView):
             form.instance.user = self.request.user
 
         if form.instance.topic.board.preferences.require_post_approval:
-            form.instance.approved = get_is_moderator(self.request.user, form.instance.topic.board)
+            form.instance.approved = get_board_permissions(self.request, self.board).is_moderator
 
         response = super().form_valid(form)
         response.status_code = 204
@@ -104,7 +119,7 @@ class UpdatePostView(UserPassesTestMixin, PostFormMixin, generic.UpdateView):
     def test_func(self):
         post = self.get_object()
 
-        is_allowed = post.update_allowed(self.request)
+        is_allowed = get_board_permissions(self.request, post.topic.board).update_allowed(post)
 
         if is_allowed:
             self.board = post.topic.board
@@ -159,11 +174,7 @@ class DeletePostView(UserPassesTestMixin, generic.DeleteView):
         if not self.request.session.session_key:  # if session is not set yet (i.e. anonymous user)
             self.request.session.create()
         post = self.get_object()
-        return (
-            self.request.session.session_key == post.session_key
-            or self.request.user.has_perm("boards.delete_post")
-            or get_is_moderator(self.request.user, post.topic.board)
-        )
+        return get_board_permissions(self.request, post.topic.board).delete_allowed(post)
 
     def get_object(self):
         if not self.board_post:
@@ -202,7 +213,7 @@ class ApprovePostsView(LoginRequiredMixin, UserPassesTestMixin, generic.Template
 
     def test_func(self):
         board = Board.objects.get(slug=self.kwargs["slug"])
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -257,7 +268,7 @@ class DeletePostsView(LoginRequiredMixin, UserPassesTestMixin, generic.TemplateV
 
     def test_func(self):
         board = Board.objects.get(slug=self.kwargs["slug"])
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -292,47 +303,150 @@ class DeletePostsView(LoginRequiredMixin, UserPassesTestMixin, generic.TemplateV
         )
 
 
+class ModeratePostsView(LoginRequiredMixin, UserPassesTestMixin, generic.View):
+    """
+    Approve, unapprove or delete a list of posts of a board at once.
+
+    The posts are changed with one UPDATE (or one delete), their cache entries invalidated as a set rather than post
+    by post once the change is committed, and a single event is broadcast for all of them.
+    """
+
+    http_method_names = ["post"]
+    board = None
+
+    def test_func(self):
+        self.board = (
+            Board.objects.prefetch_related("owner")
+            .prefetch_related("preferences")
+            .prefetch_related("preferences__moderators")
+            .get(slug=self.kwargs["slug"])
+        )
+        return get_board_permissions(self.request, self.board).is_moderator
+
+    def post(self, request, *args, **kwargs):
+        form = PostModerationForm(request.POST, board=self.board)
+        if not form.is_valid():
+            raise BadRequest(form.errors.as_text())
+        action = form.cleaned_data["action"]
+        post_pks = [post.pk for post in form.cleaned_data["posts"]]
+        topic_pks = {post.topic_id for post in form.cleaned_data["posts"]}
+
+        with transaction.atomic():
+            if action == "delete":
+                self.delete_posts(post_pks)
+            else:
+                self.update_approved(post_pks, approved=action == "approve")
+
+            if len(topic_pks) == 1:
+                channel_group_send(
+                    f"board-{self.board.slug}", {"type": "topic_updated", "topic_pk": str(topic_pks.pop())}
+                )
+            else:
+                channel_group_send(f"board-{self.board.slug}", {"type": "board_updated"})
+
+        response = HttpResponse(status=204)
+        return trigger_client_event(
+            response,
+            "showMessage",
+            {
+                "message": f"{len(post_pks)} post(s) {action}d",
+                "color": "danger" if action == "delete" else "success",
+            },
+        )
+
+    def update_approved(self, post_pks, *, approved):
+        posts = Post.objects.without_tree_fields().filter(pk__in=post_pks)
+        # cached queries may depend on the old or the new value, so both are invalidated once the new one is committed
+        old_values = get_invalidation_dicts(posts)
+        posts.update(approved=approved)
+
+        def invalidate():
+            invalidate_dicts(Post, old_values)
+            invalidate_queryset(posts)
+
+        transaction.on_commit(invalidate)
+
+    def delete_posts(self, post_pks):
+        # replies are deleted along with the posts
+        tree = Post.objects.tree_filter(topic__board=self.board).extra(
+            where=["__tree.tree_path && %s"], params=[post_pks]
+        )
+        rows = list(tree.extra(select={"root_pk": "__tree.tree_path[1]"}).values_list("pk", "topic_id", "root_pk"))
+        tree_pks = [pk for pk, _, _ in rows]
+        topics = list(Topic.objects.filter(pk__in={topic_pk for _, topic_pk, _ in rows}).select_related("board"))
+        # the trees the deleted replies were part of remain, with different descendants
+        root_pks = list({root_pk for _, _, root_pk in rows} - set(tree_pks))
+        old_values = [
+            (queryset.model, get_invalidation_dicts(queryset))
+            for queryset in [
+                Post.objects.without_tree_fields().filter(pk__in=tree_pks),
+                Reaction.objects.filter(post__in=tree_pks),
+                ReactionCount.objects.filter(post__in=tree_pks),
+                AdditionalData.objects.filter(post__in=tree_pks),
+            ]
+        ]
+
+        def invalidate():
+            for model, obj_dicts in old_values:
+                invalidate_dicts(model, obj_dicts)
+            if root_pks:
+                invalidate_queryset(
+                    Post.objects.tree_filter(topic__board=self.board).extra(
+                        where=["__tree.tree_path && %s"], params=[root_pks]
+                    )
+                )
+            for topic in topics:
+                invalidate_topic_cache(topic)
+
+        # the post_delete signals would invalidate post by post, and before the deletion is committed
+        with no_invalidation, no_board_events:
+            Post.objects.without_tree_fields().filter(pk__in=post_pks).delete()
+        transaction.on_commit(invalidate)
+
+
 class PostFetchView(generic.TemplateView):
     template_name = "boards/components/post.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
 
-        context["board"] = board = (
+        context["board"] = board = await (
             Board.objects.prefetch_related("owner")
             .prefetch_related("preferences")
             .prefetch_related("preferences__moderators")
-            .prefetch_related("topics")
-            .prefetch_related("topics__posts")
-            .prefetch_related("topics__posts__children")
-            .get(slug=self.kwargs["slug"])
+            .aget(slug=self.kwargs["slug"])
+        )
+        context["topic"] = topic = await board.topics.aget(pk=self.kwargs["topic_pk"])
+        context["snapshot"] = snapshot = await BoardSnapshot.aload(
+            board, self.request, topic=topic, post=self.kwargs["pk"]
         )
-        context["topic"] = topic = board.topics.get(pk=self.kwargs["topic_pk"])
-        context["post"] = post = topic.posts.get(pk=self.kwargs["pk"])
+        context["post"] = post = snapshot.get_post(self.kwargs["pk"])
         if not board.preferences.require_post_approval and not post.approved:
             context["post"].approved = True
-        context["is_owner"] = post.get_is_owner(self.request)
-        context["is_moderator"] = get_is_moderator(self.request.user, board)
-        return context
+        context["permissions"] = permissions = await aget_board_permissions(self.request, board)
+        context["is_owner"] = permissions.is_post_owner(post)
+        context["is_moderator"] = permissions.is_moderator
+        return self.render_to_response(context)
 
 
 class PostFooterFetchView(generic.TemplateView):
     template_name = "boards/components/post_footer.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
 
-        context["board"] = board = (
+        context["board"] = board = await (
             Board.objects.prefetch_related("owner")
             .prefetch_related("preferences")
             .prefetch_related("preferences__moderators")
-            .get(slug=self.kwargs["slug"])
+            .aget(slug=self.kwargs["slug"])
         )
-        context["topic"] = topic = board.topics.get(pk=self.kwargs["topic_pk"])
-        context["post"] = post = topic.posts.get(pk=self.kwargs["pk"])
-        context["is_owner"] = post.get_is_owner(self.request)
-        context["is_moderator"] = get_is_moderator(self.request.user, board)
-        return context
+        context["topic"] = topic = await board.topics.aget(pk=self.kwargs["topic_pk"])
+        context["post"] = post = await topic.posts.aget(pk=self.kwargs["pk"])
+        context["permissions"] = permissions = await aget_board_permissions(self.request, board)
+        context["is_owner"] = permissions.is_post_owner(post)
+        context["is_moderator"] = permissions.is_moderator
+        return self.render_to_response(context)
 
 
 class PostToggleApprovalView(LoginRequiredMixin, UserPassesTestMixin, generic.View):
@@ -346,8 +460,9 @@ class PostToggleApprovalView(LoginRequiredMixin, UserPassesTestMixin, generic.Vi
             .get(pk=self.kwargs["pk"])
         )
         return (
-            get_is_moderator(self.request.user, post.topic.board)
-        ) and post.topic.board.preferences.require_post_approval
+            get_board_permissions(self.request, post.topic.board).is_moderator
+            and post.topic.board.preferences.require_post_approval
+        )
 
     def post(self, request, *args, **kwargs):
         post = self.board_post
@@ -363,7 +478,10 @@ class PostImageUploadView(UserPassesTestMixin, generic.View):
 
     def test_func(self):
         self.board = Board.objects.get(slug=self.kwargs["slug"])
-        return get_is_moderator(self.request.user, self.board) and self.board.preferences.allow_image_uploads
+        return (
+            get_board_permissions(self.request, self.board).is_moderator
+            and self.board.preferences.allow_image_uploads
+        )
 
     def post(self, request, *args, **kwargs):
         response_data = {}
@@ -373,14 +491,25 @@ class PostImageUploadView(UserPassesTestMixin, generic.View):
         if image.content_type not in valid_image_types:
             response_data["error"] = "Invalid image type (only PNG, JPEG, GIF, BMP, and WEBP are allowed)"
         elif image.size > settings.MAX_POST_IMAGE_FILE_SIZE:
-            response_data[
-                "error"
-            ] = f"Image is too large (max size is {settings.MAX_POST_IMAGE_FILE_SIZE // (1024*1024)}MB)"
-        elif self.board.images.count() >= settings.MAX_POST_IMAGE_COUNT:
-            response_data["error"] = "Board image quota exceeded"
+            response_data["error"] = (
+                f"Image is too large (max size is {settings.MAX_POST_IMAGE_FILE_SIZE // (1024*1024)}MB)"
+            )
         else:
-            im = PostImage.objects.create(image=image, board=self.board)
-            file_path = {"filePath": im.image.url}
-            response_data["data"] = file_path
+            response_data = self.upload_image(image)
 
         return HttpResponse(json.dumps(response_data), content_type="application/json")
+
+    def upload_image(self, image):
+        content_hash = get_content_hash(image)
+        # the same image uploaded again to the board (e.g. pasted twice) is neither stored nor counted again
+        shared_image = self.board.images.filter(image_type="p", content_hash=content_hash).first()
+        if shared_image is not None:
+            return {"data": {"filePath": shared_image.image.url}}
+        if self.board.images.count() >= settings.MAX_POST_IMAGE_COUNT:
+            return {"error": "Board image quota exceeded"}
+        try:
+            im = PostImage.objects.create(image=image, board=self.board, content_hash=content_hash)
+        except PILImage.DecompressionBombError:
+            max_megapixels = settings.MAX_IMAGE_PIXELS // 1_000_000
+            return {"error": f"Image is too large (max resolution is {max_megapixels} megapixels)"}
+        return {"data": {"filePath": im.image.url}}
@@ -1,12 +1,14 @@
 import json
 
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.db import transaction
 from django.http import HttpResponse
 from django.views import generic
 from django_htmx.http import trigger_client_event
 
-from boards.models import Post, Reaction
-from boards.utils import get_is_moderator, post_reaction_send_update_message
+from boards.models import Post, Reaction, ReactionCount
+from boards.permissions import get_board_permissions
+from boards.utils import post_reaction_send_update_message
 
 
 class ReactionsDeleteView(UserPassesTestMixin, generic.TemplateView):
@@ -16,7 +18,7 @@ class ReactionsDeleteView(UserPassesTestMixin, generic.TemplateView):
     def test_func(self):
         post = self.get_object()
         return (
-            get_is_moderator(self.request.user, post.topic.board)
+            get_board_permissions(self.request, post.topic.board).is_moderator
             and post.topic.board.preferences.reaction_type != "n"
         )
 
@@ -39,7 +41,12 @@ class ReactionsDeleteView(UserPassesTestMixin, generic.TemplateView):
 
     def post(self, request, *args, **kwargs):
         post = self.get_object()
-        post.reactions.filter(reaction_type=post.topic.board.preferences.reaction_type).delete()
+        reaction_type = post.topic.board.preferences.reaction_type
+        with transaction.atomic():
+            reactions = post.reactions.filter(reaction_type=reaction_type)
+            deleted_counts = reactions.aggregate(**ReactionCount.get_aggregates())
+            reactions.delete()
+            ReactionCount.add(post, reaction_type, **{field: -value for field, value in deleted_counts.items()})
         post_reaction_send_update_message(post)
 
         response = HttpResponse(status=204)
@@ -81,25 +88,28 @@ class PostReactionView(generic.View):
         else:
             reaction_score = 1 if reaction_type == "l" else int(request.POST.get("score"))
 
-            has_reacted, reaction_id, reacted_score = post.get_has_reacted(request, post.reactions.all())
-
-            if has_reacted:
-                reaction = Reaction.objects.get(id=reaction_id)
-                if reaction_score == reacted_score:
-                    reaction.delete()
+            with transaction.atomic():
+                reaction = self.get_reaction(request, post, reaction_type)
+                if reaction is not None:
+                    reacted_score = reaction.reaction_score
+                    if reaction_score == reacted_score:
+                        reaction.delete()
+                        ReactionCount.record(post, reaction_type, old_score=reacted_score)
+                    else:
+                        reaction.reaction_score = reaction_score
+                        reaction.save()
+                        ReactionCount.record(post, reaction_type, old_score=reacted_score, new_score=reaction_score)
                 else:
-                    reaction.reaction_score = reaction_score
-                    reaction.save()
-            else:
-                reaction_user = request.user if request.user.is_authenticated else None
-
-                Reaction.objects.create(
-                    session_key=request.session.session_key,
-                    user=reaction_user,
-                    post=post,
-                    reaction_type=reaction_type,
-                    reaction_score=reaction_score,
-                )
+                    reaction_user = request.user if request.user.is_authenticated else None
+
+                    Reaction.objects.create(
+                        session_key=request.session.session_key,
+                        user=reaction_user,
+                        post=post,
+                        reaction_type=reaction_type,
+                        reaction_score=reaction_score,
+                    )
+                    ReactionCount.record(post, reaction_type, new_score=reaction_score)
 
         to_json = {
             "showMessage": {
@@ -114,3 +124,16 @@ class PostReactionView(generic.View):
             status=204,
             headers={"HX-Trigger": json.dumps(to_json)},
         )
+
+    def get_reaction(self, request, post, reaction_type):
+        """
+        The requester's reaction to the post, locked until the end of the transaction.
+
+        It is read from the database rather than from the cache: the counts are updated from its score, and a stale or
+        concurrently changed reaction would make them drift.
+        """
+        reactions = Reaction.objects.nocache().select_for_update().filter(post=post, reaction_type=reaction_type)
+        reaction = reactions.filter(session_key=request.session.session_key).first()
+        if reaction is None and request.user.is_authenticated:
+            reaction = reactions.filter(user=request.user).first()
+        return reaction
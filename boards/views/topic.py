@@ -1,10 +1,12 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.exceptions import BadRequest
 from django.urls import reverse_lazy
 from django.views import generic
 from django_htmx.http import trigger_client_event
 
 from boards.models import Board, Topic
-from boards.utils import get_is_moderator
+from boards.permissions import aget_board_permissions, get_board_permissions
+from boards.snapshot import BoardSnapshot, PostCursor
 
 
 class CreateTopicView(LoginRequiredMixin, UserPassesTestMixin, generic.CreateView):
@@ -14,7 +16,7 @@ class CreateTopicView(LoginRequiredMixin, UserPassesTestMixin, generic.CreateVie
 
     def test_func(self):
         board = Board.objects.get(slug=self.kwargs["slug"])
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def form_valid(self, form):
         form.instance.board_id = Board.objects.get(slug=self.kwargs["slug"]).id
@@ -42,7 +44,7 @@ class UpdateTopicView(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateVie
 
     def test_func(self):
         board = Board.objects.get(slug=self.kwargs["slug"])
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def form_valid(self, form):
         response = super().form_valid(form)
@@ -68,7 +70,7 @@ class DeleteTopicView(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteVie
 
     def test_func(self):
         board = Board.objects.get(slug=self.kwargs["slug"])
-        return self.request.user == board.owner or self.request.user.is_staff
+        return get_board_permissions(self.request, board).is_board_manager
 
     def form_valid(self, form):
         topic_subject = self.object.subject
@@ -95,21 +97,36 @@ class DeleteTopicView(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteVie
 class TopicFetchView(generic.TemplateView):
     template_name = "boards/components/topic.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
 
-        context["board"] = board = (
+        context["board"] = board = await (
             Board.objects.prefetch_related("owner")
             .prefetch_related("preferences")
             .prefetch_related("preferences__moderators")
-            .prefetch_related("topics")
-            .prefetch_related("topics__posts")
-            .prefetch_related("topics__posts__children")
-            .get(slug=self.kwargs["slug"])
+            .aget(slug=self.kwargs["slug"])
         )
-        context["topic"] = board.topics.get(pk=self.kwargs["pk"])
-        context["is_moderator"] = get_is_moderator(self.request.user, board)
-        return context
+        context["topic"] = topic = await board.topics.aget(pk=self.kwargs["pk"])
+        context["snapshot"] = await BoardSnapshot.aload(board, self.request, topic=topic, cursor=self.get_cursor())
+        context["permissions"] = permissions = await aget_board_permissions(self.request, board)
+        context["is_moderator"] = permissions.is_moderator
+        return self.render_to_response(context)
+
+    def get_cursor(self):
+        return None
+
+
+class TopicPostsFetchView(TopicFetchView):
+    """The next page of top-level posts of a topic, after the `cursor` of the previous one."""
+
+    template_name = "boards/components/topic_posts.html"
+
+    def get_cursor(self):
+        try:
+            return PostCursor.from_string(self.request.GET["cursor"])
+        except (KeyError, ValueError) as e:
+            msg = "Invalid or missing cursor"
+            raise BadRequest(msg) from e
 
 
 class TopicLockView(UserPassesTestMixin, generic.View):
@@ -0,0 +1,39 @@
+class TrackFieldChangesMixin:
+    """
+    Records the values of `tracked_fields` when an instance is loaded or saved, so that changes to them can be
+    detected without fetching the row again.
+    """
+
+    tracked_fields: tuple[str, ...] = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.reset_tracked_fields()
+        return instance
+
+    def reset_tracked_fields(self):
+        # deferred fields are not loaded just to be tracked
+        values = self.__dict__
+        self._original_values = {field: values[field] for field in self.tracked_fields if field in values}
+
+    def get_changed_fields(self):
+        """Tracked fields that changed since the instance was loaded or saved; all of them for a new instance."""
+        original_values = getattr(self, "_original_values", {})
+        values = self.__dict__
+        return {
+            field
+            for field in self.tracked_fields
+            if field in values and (field not in original_values or original_values[field] != values[field])
+        }
+
+    def get_original_value(self, field, default=None):
+        return getattr(self, "_original_values", {}).get(field, default)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.reset_tracked_fields()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.reset_tracked_fields()
@@ -319,14 +319,20 @@ else:
 
 MAX_IMAGE_WIDTH = env.int("MAX_IMAGE_WIDTH", default=500 if TESTING else 3840)
 MAX_IMAGE_HEIGHT = env.int("MAX_IMAGE_HEIGHT", default=500 if TESTING else 2160)
+# images of more pixels are refused before being decoded, e.g. 50 megapixels take 150 MB once decoded to RGB
+MAX_IMAGE_PIXELS = env.int("MAX_IMAGE_PIXELS", default=50_000_000)
 SMALL_THUMBNAIL_WIDTH = env.int("SMALL_THUMBNAIL_WIDTH", default=300)
 SMALL_THUMBNAIL_HEIGHT = env.int("SMALL_THUMBNAIL_HEIGHT", default=200)
+# width of the board background on screens up to that wide, e.g. phones
+MEDIUM_THUMBNAIL_WIDTH = env.int("MEDIUM_THUMBNAIL_WIDTH", default=640)
 MAX_POST_IMAGE_FILE_SIZE = env.int("MAX_IMAGE_FILE_SIZE", default=1024 * 1024 * 2)
 MAX_POST_IMAGE_COUNT = env.int("MAX_POST_IMAGE_COUNT", default=100)
 MAX_POST_IMAGE_WIDTH = env.int("MAX_POST_IMAGE_WIDTH", default=400)
 MAX_POST_IMAGE_HEIGHT = env.int("MAX_POST_IMAGE_HEIGHT", default=MAX_POST_IMAGE_WIDTH)
 
 THUMBNAIL_ALTERNATIVE_RESOLUTIONS = env.list("THUMBNAIL_ALTERNATIVE_RESOLUTIONS", default=[2])
+# processes rendering the sizes of a background image in parallel, 0 to render them in the task's own thread
+THUMBNAIL_PROCESSES = env.int("THUMBNAIL_PROCESSES", default=0 if TESTING else 2)
 
 STATIC_URL = "static/"
 STATIC_ROOT = Path(BASE_DIR) / "static"
@@ -376,6 +382,16 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# seconds over which board websocket events are batched into one message, 0 to send every event immediately
+BOARD_EVENTS_COALESCE_WINDOW = env.float("BOARD_EVENTS_COALESCE_WINDOW", default=0 if TESTING else 0.1)
+# seconds between websocket heartbeats, connections that miss three in a row are no longer counted as present
+BOARD_PRESENCE_HEARTBEAT_INTERVAL = env.int("BOARD_PRESENCE_HEARTBEAT_INTERVAL", default=30)
+# minimum seconds between two broadcasts of the number of sessions connected to a board
+BOARD_PRESENCE_BROADCAST_INTERVAL = env.float("BOARD_PRESENCE_BROADCAST_INTERVAL", default=0 if TESTING else 5)
+# top-level posts of a topic rendered at once, the next ones are loaded as the viewer scrolls
+TOPIC_POSTS_PAGE_SIZE = env.int("TOPIC_POSTS_PAGE_SIZE", default=50)
+# render new posts once and push their html to every viewer, instead of each viewer fetching them
+BOARD_EVENTS_RENDER_POSTS = env.bool("BOARD_EVENTS_RENDER_POSTS", default=not TESTING)
 
 CACHEOPS_ENABLED = env.bool("CACHEOPS_ENABLED", default=True)
 CACHEOPS_DEFAULTS = {"timeout": env.int("CACHEOPS_TIMEOUT", default=60 * 60 * 24 * 7)}
@@ -396,6 +412,14 @@ CACHEOPS = {
 }
 CACHEOPS_INSIDEOUT = env.bool("CACHEOPS_INSIDEOUT", default=True)
 
+# entries of the in-process LRU copy of cacheops reads (0 to disable), and seconds they are kept at most: a FLUSHDB
+# of the cacheops redis database not done through cacheops' invalidate_all is only seen once they expire
+CACHEOPS_LOCAL_MAX_SIZE = env.int("CACHEOPS_LOCAL_MAX_SIZE", default=0 if TESTING else 10000)
+CACHEOPS_LOCAL_TIMEOUT = env.int("CACHEOPS_LOCAL_TIMEOUT", default=60 * 5)
+if CACHEOPS_LOCAL_MAX_SIZE > 0 and CACHEOPS_LOCAL_TIMEOUT <= 0:
+    msg = "CACHEOPS_LOCAL_TIMEOUT must be positive when CACHEOPS_LOCAL_MAX_SIZE is"
+    raise ImproperlyConfigured(msg)
+
 CACHEOPS_REDIS = {"host": REDIS_HOST, "port": REDIS_PORT, "db": 13, "socket_timeout": 3} if TESTING else REDIS_URL
 
 HUEY = {